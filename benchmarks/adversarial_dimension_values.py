@@ -0,0 +1,65 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Worst-case inputs for dimension value escaping and serialization.
+
+Each input is escaped with Normalize.escape_dimension_value and serialized as
+the dimension value of a gauge. The time per call should not grow with the
+length of the input, since only the first characters can end up in the line.
+
+    python benchmarks/adversarial_dimension_values.py
+"""
+
+import timeit
+
+from dynatrace.metric.utils import (
+    DynatraceMetricsFactory,
+    DynatraceMetricsSerializer,
+)
+from dynatrace.metric.utils._normalize import Normalize
+
+INPUTS = {
+    "plain, 250 chars": "a" * 250,
+    "backslashes, 250": "\\" * 250,
+    "backslashes, 1M": "\\" * 1_000_000,
+    "char + backslashes, 1M": "a" + "\\" * 1_000_000,
+    "alternating a\\, 1M": "a\\" * 500_000,
+    "special chars, 1M": "= ,\"" * 250_000,
+    "odd trailing backslashes": "a" * 247 + "\\" * 3,
+}
+
+
+def main() -> None:
+    normalize = Normalize()
+    factory = DynatraceMetricsFactory()
+    serializer = DynatraceMetricsSerializer(
+        enrich_with_dynatrace_metadata=False)
+
+    print("{:<28} {:>14} {:>14}".format("input", "escape (us)",
+                                        "serialize (us)"))
+    for name, value in INPUTS.items():
+        metric = factory.create_int_gauge("metric", 1, {"dim": value})
+        number = 200
+        escape = timeit.timeit(
+            lambda: normalize.escape_dimension_value(value),
+            number=number) / number
+        serialize = timeit.timeit(lambda: serializer.serialize(metric),
+                                  number=number) / number
+        print("{:<28} {:>14.2f} {:>14.2f}".format(name, escape * 1e6,
+                                                  serialize * 1e6))
+
+
+if __name__ == '__main__':
+    main()
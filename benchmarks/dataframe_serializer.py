@@ -0,0 +1,80 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Serializing a table of analytics results: the DataFrameSerializer compared to
+creating and serializing a gauge per value. The table is a dictionary of
+lists, or of numpy arrays with --numpy (requires numpy).
+
+    python benchmarks/dataframe_serializer.py --rows 200000
+"""
+
+import argparse
+import logging
+import time
+
+from dynatrace.metric.utils import DataFrameSerializer, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--distinct-values", type=int, default=1_000,
+                        help="distinct values per dimension")
+    parser.add_argument("--numpy", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rows = range(args.rows)
+    data = {
+        "route": ["/api/items/{}".format(i % args.distinct_values)
+                  for i in rows],
+        "region": [("eu", "us", "ap")[i % 3] for i in rows],
+        "latency": [i * 0.25 for i in rows],
+        "time": [1616416882000 + i for i in rows],
+    }
+    if args.numpy:
+        import numpy
+        data = {key: numpy.array(value) for key, value in data.items()}
+
+    serializer = DynatraceMetricsSerializer(
+        enrich_with_dynatrace_metadata=False)
+    factory = DynatraceMetricsFactory()
+
+    start = time.perf_counter()
+    for route, region, latency, timestamp in zip(
+            data["route"], data["region"], data["latency"], data["time"]):
+        serializer.serialize(factory.create_float_gauge(
+            "analytics.latency", float(latency),
+            {"route": str(route), "region": str(region)}, int(timestamp)))
+    per_row_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in DataFrameSerializer(serializer).serialize_payloads(
+            data, ["latency"], name="analytics.latency",
+            dimension_columns=["route", "region"], timestamp_column="time"):
+        pass
+    bulk_time = time.perf_counter() - start
+
+    print("{:>24} {:>14}".format("", "rows/s"))
+    print("{:>24} {:>14,.0f}".format("create_float_gauge",
+                                     args.rows / per_row_time))
+    print("{:>24} {:>14,.0f}".format("DataFrameSerializer",
+                                     args.rows / bulk_time))
+
+
+if __name__ == '__main__':
+    main()
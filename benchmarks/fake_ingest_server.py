@@ -0,0 +1,208 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+A stdlib-only stand-in for the Dynatrace metrics ingest endpoint.
+
+The server accepts POST requests on the path of the default OneAgent
+endpoint, enforces the payload line limit, counts valid and invalid lines
+and answers with the same JSON document as the real API. Latency and error
+rates can be configured to simulate a slow or flaky endpoint.
+
+Run it standalone with:
+
+    python benchmarks/fake_ingest_server.py --port 14499 --latency-ms 5
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from dynatrace.metric.utils import (
+    DynatraceMetricsApiConstants,
+    DynatraceMetricsSerializer,
+)
+
+INGEST_PATH = urlparse(
+    DynatraceMetricsApiConstants.default_oneagent_endpoint()).path
+
+
+class IngestStatistics:
+    """
+    Thread-safe counters collected by the fake ingest server.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected_requests = 0
+        self.lines_ok = 0
+        self.lines_invalid = 0
+
+    def record(self, lines_ok: int, lines_invalid: int,
+               rejected: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.lines_ok += lines_ok
+            self.lines_invalid += lines_invalid
+            if rejected:
+                self.rejected_requests += 1
+
+
+def _is_valid_line(line: str) -> bool:
+    # a very coarse approximation of the server side validation: a line
+    # consists of a metric key (with optional dimensions), a value and an
+    # optional timestamp, and must not exceed the maximum line length.
+    if len(line) > DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH:
+        return False
+    parts = line.rsplit(" ", 2)
+    if len(parts) == 3 and not parts[2].isdigit():
+        return False
+    return len(parts) >= 2 and bool(parts[0]) and bool(parts[-1])
+
+
+class _IngestHandler(BaseHTTPRequestHandler):
+    server: "FakeIngestServer"
+
+    def do_POST(self) -> None:  # noqa: N802
+        if self.path != INGEST_PATH:
+            self._respond(404, {"error": {"code": 404,
+                                          "message": "Not found"}})
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        lines = [line for line in body.decode("utf-8").split("\n") if line]
+
+        server = self.server
+        if server.latency_s:
+            time.sleep(server.latency_s
+                       + random.uniform(0, server.latency_jitter_s))
+
+        if server.error_rate and random.random() < server.error_rate:
+            server.statistics.record(0, 0, True)
+            self._respond(503, {"error": {"code": 503,
+                                          "message": "Service unavailable"}})
+            return
+
+        limit = DynatraceMetricsApiConstants.payload_lines_limit()
+        if len(lines) > limit:
+            server.statistics.record(0, len(lines), True)
+            self._respond(400, {"error": {
+                "code": 400,
+                "message": "Payload exceeds the limit of {} lines".format(
+                    limit)}})
+            return
+
+        lines_ok = sum(1 for line in lines if _is_valid_line(line))
+        lines_invalid = len(lines) - lines_ok
+        server.statistics.record(lines_ok, lines_invalid, False)
+        self._respond(202 if not lines_invalid else 400, {
+            "linesOk": lines_ok,
+            "linesInvalid": lines_invalid,
+            "error": None,
+            "warnings": None,
+        })
+
+    def _respond(self, status: int, document: dict) -> None:
+        payload = json.dumps(document).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        # keep the benchmark output readable.
+        pass
+
+
+class FakeIngestServer(ThreadingHTTPServer):
+    """
+    HTTP server mimicking the metrics ingest endpoint.
+    :param address: The (host, port) tuple to bind to. Port 0 picks a free
+     port.
+    :param latency_ms: Artificial latency added to every request.
+    :param latency_jitter_ms: Random jitter added on top of the latency.
+    :param error_rate: Fraction (0..1) of requests answered with a 503.
+    """
+    daemon_threads = True
+
+    def __init__(self,
+                 address: Tuple[str, int] = ("127.0.0.1", 0),
+                 latency_ms: float = 0.0,
+                 latency_jitter_ms: float = 0.0,
+                 error_rate: float = 0.0,
+                 ) -> None:
+        super().__init__(address, _IngestHandler)
+        self.latency_s = latency_ms / 1000
+        self.latency_jitter_s = latency_jitter_ms / 1000
+        self.error_rate = error_rate
+        self.statistics = IngestStatistics()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return "http://{}:{}{}".format(host, port, INGEST_PATH)
+
+    def start(self) -> "FakeIngestServer":
+        """
+        Serve requests on a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name="fake-ingest-server",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=14499)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeIngestServer((args.host, args.port), args.latency_ms,
+                              args.latency_jitter_ms, args.error_rate)
+    print("fake ingest endpoint listening on", server.endpoint)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = server.statistics
+        print("requests: {}, rejected: {}, lines ok: {}, "
+              "lines invalid: {}".format(stats.requests,
+                                         stats.rejected_requests,
+                                         stats.lines_ok,
+                                         stats.lines_invalid))
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
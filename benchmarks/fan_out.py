@@ -0,0 +1,78 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Serializing the same metrics for several tenants: the FanOutSerializer,
+which normalizes every metric once, compared to calling serialize on the
+serializer of every tenant.
+
+    python benchmarks/fan_out.py --metrics 10000 --tenants 1 4 16
+"""
+
+import argparse
+import time
+
+from dynatrace.metric.utils import DynatraceMetricsFactory, \
+    FanOutSerializer, SerializerConfig
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--metrics", type=int, default=10_000)
+    parser.add_argument("--tenants", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--distinct-values", type=int, default=1_000,
+                        help="distinct values per dimension")
+    args = parser.parse_args()
+
+    factory = DynatraceMetricsFactory()
+    metrics = [
+        factory.create_float_gauge(
+            "http.server.duration", i * 0.5, {
+                "route": "/api/items/{}".format(i % args.distinct_values),
+                "method": "GET",
+                "status": str(200 + i % 5),
+            }, 1616416882000)
+        for i in range(args.metrics)
+    ]
+
+    config = SerializerConfig(enrich_with_dynatrace_metadata=False,
+                              metrics_source="benchmark")
+
+    print("{:>8} {:>22} {:>22}".format("tenants", "serialize (lines/s)",
+                                       "fan-out (lines/s)"))
+    for tenants in args.tenants:
+        serializers = [config.serializer("tenant{}".format(i),
+                                         {"tenant": str(i)})
+                       for i in range(tenants)]
+        fan_out = FanOutSerializer(serializers)
+        # fill the normalization caches.
+        fan_out.serialize_lines(metrics)
+
+        start = time.perf_counter()
+        for serializer in serializers:
+            for metric in metrics:
+                serializer.serialize(metric)
+        serialize_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fan_out.serialize_lines(metrics)
+        fan_out_time = time.perf_counter() - start
+
+        lines = len(metrics) * tenants
+        print("{:>8} {:>22,.0f} {:>22,.0f}".format(
+            tenants, lines / serialize_time, lines / fan_out_time))
+
+
+if __name__ == '__main__':
+    main()
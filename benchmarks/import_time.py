@@ -0,0 +1,111 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Import time of the library, as reported by "python -X importtime".
+
+Each scenario runs in a fresh interpreter, several times, and the median of
+the cumulative import time of the scenario's top-level imports is reported,
+together with the slowest modules imported by the scenario.
+
+    python benchmarks/import_time.py --runs 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+SCENARIOS = {
+    "package": "import dynatrace.metric.utils",
+    "factory": "from dynatrace.metric.utils import DynatraceMetricsFactory",
+    "serializer":
+        "from dynatrace.metric.utils import DynatraceMetricsSerializer",
+    "batch serializer":
+        "from dynatrace.metric.utils import DynatraceMetricsBatchSerializer",
+}
+
+
+def import_times(code: str) -> List[Tuple[str, int, int, bool]]:
+    """
+    :return: The name, the self time and the cumulative time in microseconds
+     of every module imported by the interpreter running the code, and
+     whether it was imported at the top level.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            check=True, capture_output=True, text=True)
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            # the header line.
+            continue
+        # nested imports are indented by two more spaces per level.
+        top_level = not name.startswith("  ")
+        times.append((name.strip(), int(self_us), int(cumulative_us),
+                      top_level))
+    return times
+
+
+def measure(code: str, startup_modules: Set[str]
+            ) -> Tuple[int, Dict[str, int]]:
+    """
+    :return: The cumulative import time of the top-level imports of the code
+     and the self time of every module it imported, in microseconds.
+    """
+    total = 0
+    self_times = {}
+    for name, self_us, cumulative_us, top_level in import_times(code):
+        if name in startup_modules:
+            continue
+        self_times[name] = self_us
+        if top_level:
+            total += cumulative_us
+    return total, self_times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5,
+                        help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    # modules imported by the interpreter itself, e.g. by the site module.
+    startup_modules = {name for name, _, _, _ in import_times("pass")}
+
+    for scenario, code in SCENARIOS.items():
+        totals: List[int] = []
+        self_times: Dict[str, List[int]] = {}
+        for _ in range(args.runs):
+            total, times = measure(code, startup_modules)
+            totals.append(total)
+            for module, self_us in times.items():
+                self_times.setdefault(module, []).append(self_us)
+
+        print("{}: {:.1f} ms".format(scenario,
+                                     statistics.median(totals) / 1000))
+        slowest = sorted(self_times.items(),
+                         key=lambda item: -statistics.median(item[1]))
+        for module, times in slowest[:args.top]:
+            print("    {:<50} {:>8.2f} ms".format(
+                module, statistics.median(times) / 1000))
+
+
+if __name__ == '__main__':
+    main()
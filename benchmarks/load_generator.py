@@ -0,0 +1,173 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Drive the export path (factory, serializer and HTTP POST) at a target rate.
+
+Every flush interval, one metric per series is created with the
+DynatraceMetricsFactory, serialized with the DynatraceMetricsSerializer and
+posted in chunks of at most payload_lines_limit() lines. The script reports
+the achieved lines per second and the p50/p99/max latency of a whole flush.
+If no endpoint is given, a FakeIngestServer is started in-process.
+
+    python benchmarks/load_generator.py --rate 50000 --duration 10
+"""
+
+import argparse
+import math
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Sequence
+
+from dynatrace.metric.utils import (
+    DynatraceMetricsApiConstants,
+    DynatraceMetricsFactory,
+    DynatraceMetricsSerializer,
+    MetricError,
+)
+
+from fake_ingest_server import FakeIngestServer
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    index = min(len(sorted_values) - 1,
+                max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def post_payload(endpoint: str, lines: List[str],
+                 api_token: Optional[str] = None) -> int:
+    request = urllib.request.Request(
+        endpoint, data="\n".join(lines).encode("utf-8"), method="POST")
+    request.add_header("Content-Type", "text/plain; charset=utf-8")
+    if api_token:
+        request.add_header("Authorization", "Api-Token " + api_token)
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as err:
+        return err.code
+
+
+def run(endpoint: str, rate: int, duration: float, series: int,
+        dimensions: int, api_token: Optional[str] = None) -> None:
+    factory = DynatraceMetricsFactory()
+    serializer = DynatraceMetricsSerializer(
+        metric_key_prefix="loadgen",
+        default_dimensions={"generator": "load_generator"},
+        enrich_with_dynatrace_metadata=False,
+    )
+    limit = DynatraceMetricsApiConstants.payload_lines_limit()
+
+    series_dims = [
+        {"dim{}".format(d): "value-{}-{}".format(s, d)
+         for d in range(dimensions)}
+        for s in range(series)
+    ]
+    # one line per series per flush, so the rate determines the interval.
+    flush_interval = series / rate
+
+    flush_latencies = []
+    lines_sent = 0
+    failed_requests = 0
+    started = time.perf_counter()
+    next_flush = started
+    iteration = 0
+
+    while time.perf_counter() - started < duration:
+        sleep_for = next_flush - time.perf_counter()
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+        next_flush += flush_interval
+
+        flush_start = time.perf_counter()
+        timestamp = time.time() * 1000
+        lines = []
+        for index, dims in enumerate(series_dims):
+            try:
+                lines.append(serializer.serialize(
+                    factory.create_float_gauge(
+                        "request.duration", index + iteration * 0.5, dims,
+                        timestamp)))
+            except MetricError:
+                continue
+
+        for offset in range(0, len(lines), limit):
+            status = post_payload(endpoint, lines[offset:offset + limit],
+                                  api_token)
+            if status >= 300:
+                failed_requests += 1
+
+        flush_latencies.append(time.perf_counter() - flush_start)
+        lines_sent += len(lines)
+        iteration += 1
+
+    elapsed = time.perf_counter() - started
+    flush_latencies.sort()
+    print("flushes:            {}".format(len(flush_latencies)))
+    print("lines sent:         {}".format(lines_sent))
+    print("failed requests:    {}".format(failed_requests))
+    print("lines/second:       {:.0f} (target {})".format(
+        lines_sent / elapsed, rate))
+    for label, q in (("p50", 0.5), ("p99", 0.99), ("max", 1.0)):
+        print("flush latency {}: {:.2f} ms".format(
+            label, percentile(flush_latencies, q) * 1000))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoint", default=None,
+                        help="ingest endpoint; starts a local fake server "
+                             "if omitted")
+    parser.add_argument("--api-token", default=None)
+    parser.add_argument("--rate", type=int, default=20_000,
+                        help="target lines per second")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="duration of the run in seconds")
+    parser.add_argument("--series", type=int, default=5_000)
+    parser.add_argument("--dimensions", type=int, default=3,
+                        help="number of dimensions per series")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="latency of the local fake server")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="error rate of the local fake server")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server = FakeIngestServer(latency_ms=args.latency_ms,
+                                  error_rate=args.error_rate).start()
+        endpoint = server.endpoint
+
+    try:
+        run(endpoint, args.rate, args.duration, args.series,
+            args.dimensions, args.api_token)
+    finally:
+        if server:
+            stats = server.statistics
+            print("server: {} requests, {} lines ok, {} lines invalid, "
+                  "{} rejected requests".format(stats.requests,
+                                                stats.lines_ok,
+                                                stats.lines_invalid,
+                                                stats.rejected_requests))
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Measure how DynatraceMetricsBatchSerializer scales with the number of worker
+processes for a large end-of-interval flush.
+
+    python benchmarks/parallel_serialization.py --metrics 500000
+"""
+
+import argparse
+import os
+import time
+
+from dynatrace.metric.utils import (
+    DynatraceMetricsBatchSerializer,
+    DynatraceMetricsFactory,
+    DynatraceMetricsSerializer,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--metrics", type=int, default=500_000)
+    parser.add_argument("--dimensions", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    factory = DynatraceMetricsFactory()
+    serializer = DynatraceMetricsSerializer(
+        metric_key_prefix="bench",
+        default_dimensions={"service": "benchmark"},
+        enrich_with_dynatrace_metadata=False,
+    )
+    metrics = [
+        factory.create_float_gauge(
+            "series.value", i * 0.25,
+            {"dim{}".format(d): "value-{}".format((i + d) % 10_000)
+             for d in range(args.dimensions)})
+        for i in range(args.metrics)
+    ]
+
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+        workers.append(workers[-1] * 2)
+
+    baseline = None
+    print("{:>8} {:>12} {:>14} {:>8}".format(
+        "workers", "seconds", "lines/second", "speedup"))
+    for count in workers:
+        with DynatraceMetricsBatchSerializer(
+                serializer, max_workers=count,
+                parallel_threshold=0) as batch_serializer:
+            # warm up the pool, so process start-up is not measured.
+            batch_serializer.serialize_batch(metrics[:count * 1000])
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                batch_serializer.serialize_batch(metrics)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+        baseline = baseline if baseline else best
+        print("{:>8} {:>12.3f} {:>14.0f} {:>7.2f}x".format(
+            count, best, args.metrics / best, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
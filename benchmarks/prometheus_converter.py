@@ -0,0 +1,93 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Converting a large Prometheus scrape: the throughput of the
+PrometheusConverter and, with --memory, its peak memory use. The scrape is
+generated line by line and never held in memory; after the first scrape,
+which creates the state of all series, the memory use stays well below the
+size of the scrape.
+
+    python benchmarks/prometheus_converter.py --series 200000
+"""
+
+import argparse
+import logging
+import time
+import tracemalloc
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, \
+    PrometheusConverter
+
+
+def scrape(series: int, scrape_number: int):
+    """
+    Generate the lines of a scrape without holding them in memory.
+    """
+    yield "# TYPE http_requests_total counter\n"
+    for i in range(series):
+        yield ('http_requests_total{{route="/api/items/{}",method="GET",'
+               'code="{}"}} {}\n').format(i, 200 + i % 5,
+                                          i * 10 + scrape_number)
+    yield "# TYPE request_duration_seconds histogram\n"
+    for i in range(series // 10):
+        labels = 'route="/api/items/{}"'.format(i)
+        count = 100 + scrape_number * 7
+        for bound, share in (("0.1", 0.5), ("0.5", 0.9), ("+Inf", 1)):
+            yield 'request_duration_seconds_bucket{{{},le="{}"}} {}\n'.format(
+                labels, bound, int(count * share))
+        yield "request_duration_seconds_sum{{{}}} {}\n".format(
+            labels, count * 0.2)
+        yield "request_duration_seconds_count{{{}}} {}\n".format(
+            labels, count)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=200_000)
+    parser.add_argument("--scrapes", type=int, default=3)
+    parser.add_argument("--memory", action="store_true",
+                        help="trace the peak memory use (slows down the "
+                             "conversion)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    size = sum(len(line) for line in scrape(args.series, 0))
+    converter = PrometheusConverter(DynatraceMetricsSerializer(
+        enrich_with_dynatrace_metadata=False))
+
+    print("scrape size: {:,.1f} MB".format(size / 1e6))
+    print("{:>8} {:>16} {:>14} {:>18}".format(
+        "scrape", "input lines/s", "output lines", "peak memory (MB)"))
+    for scrape_number in range(args.scrapes):
+        lines = 0
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        for _ in converter.convert_lines(scrape(args.series, scrape_number)):
+            lines += 1
+        elapsed = time.perf_counter() - start
+        peak = "-"
+        if args.memory:
+            peak = "{:,.1f}".format(tracemalloc.get_traced_memory()[1] / 1e6)
+            tracemalloc.stop()
+
+        input_lines = args.series + args.series // 10 * 5 + 2
+        print("{:>8} {:>16,.0f} {:>14,} {:>18}".format(
+            scrape_number + 1, input_lines / elapsed, lines, peak))
+
+
+if __name__ == '__main__':
+    main()
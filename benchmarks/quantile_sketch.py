@@ -0,0 +1,100 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Cost of recording observations in quantile sketches, memory per series and
+accuracy of the estimated percentiles.
+
+Observations are drawn from a log-normal distribution, similar to request
+latencies in milliseconds.
+
+    python benchmarks/quantile_sketch.py --series 10000 --observations 100
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from dynatrace.metric.utils import (
+    DimensionSet,
+    QuantileSketch,
+    QuantileSketchAggregator,
+)
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def record_cost(values) -> None:
+    sketch = QuantileSketch()
+    start = time.perf_counter()
+    for value in values:
+        sketch.add(value)
+    sketch_ns = (time.perf_counter() - start) / len(values) * 1e9
+
+    aggregator = QuantileSketchAggregator()
+    dimensions = DimensionSet({"route": "/api/items"})
+    start = time.perf_counter()
+    for value in values:
+        aggregator.record("request.duration", value, dimensions)
+    aggregator_ns = (time.perf_counter() - start) / len(values) * 1e9
+
+    print("QuantileSketch.add:                {:>8.0f} ns".format(sketch_ns))
+    print("QuantileSketchAggregator.record:   {:>8.0f} ns".format(
+        aggregator_ns))
+
+    exact = sorted(values)
+    print("\n{:>10} {:>12} {:>12} {:>10}".format(
+        "percentile", "exact", "estimate", "error"))
+    for q, estimate in zip(PERCENTILES, sketch.quantiles(PERCENTILES)):
+        expected = exact[int(q * (len(exact) - 1))]
+        print("{:>10} {:>12.3f} {:>12.3f} {:>9.3f}%".format(
+            q, expected, estimate, abs(estimate - expected) / expected * 100))
+
+
+def memory_per_series(rng, series: int, observations: int) -> None:
+    dimension_sets = [DimensionSet({"route": "/api/{}".format(i)})
+                      for i in range(series)]
+    tracemalloc.start()
+    aggregator = QuantileSketchAggregator()
+    for dimensions in dimension_sets:
+        for _ in range(observations):
+            aggregator.record("request.duration",
+                              rng.lognormvariate(3, 1), dimensions)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("\n{} series with {} observations each: {:.0f} bytes per "
+          "series".format(series, observations, used / series))
+
+    start = time.perf_counter()
+    metrics = aggregator.collect()
+    print("collect: {:.1f} ms for {} metrics".format(
+        (time.perf_counter() - start) * 1e3, len(metrics)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=10_000)
+    parser.add_argument("--observations", type=int, default=100,
+                        help="observations per series")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    record_cost([rng.lognormvariate(3, 1) for _ in range(500_000)])
+    memory_per_series(rng, args.series, args.observations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Throughput of the SidecarClient send path, compared to creating and
+serializing a metric in the application process for every value.
+
+The daemon runs in a separate process, so it does not compete with the
+client for the GIL. The client rate includes packing the records and
+writing them to the socket, but not the work of the daemon.
+
+    python benchmarks/sidecar_client.py --operations 200000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from dynatrace.metric.utils import DynatraceMetricsFactory, \
+    DynatraceMetricsSerializer, SidecarClient, SidecarDaemon
+
+
+def run_daemon(path: str, datagram: bool, ready, stop) -> None:
+    daemon = SidecarDaemon(
+        path, DynatraceMetricsSerializer(enrich_with_dynatrace_metadata=False),
+        export=lambda payload: None, flush_interval=1.0, datagram=datagram)
+    daemon.start()
+    ready.set()
+    stop.wait()
+    daemon.close()
+
+
+def client_rate(path: str, datagram: bool, operations: int) -> float:
+    dimensions = {"route": "/api/items", "method": "GET"}
+    with SidecarClient(path, datagram=datagram) as client:
+        add = client.add
+        start = time.perf_counter()
+        for _ in range(operations):
+            add("http.requests", 1, dimensions)
+        client.flush()
+        elapsed = time.perf_counter() - start
+        if client.dropped_records:
+            print("    dropped {} records".format(client.dropped_records))
+    return operations / elapsed
+
+
+def in_process_rate(operations: int) -> float:
+    dimensions = {"route": "/api/items", "method": "GET"}
+    factory = DynatraceMetricsFactory()
+    serializer = DynatraceMetricsSerializer(
+        enrich_with_dynatrace_metadata=False)
+    start = time.perf_counter()
+    for _ in range(operations):
+        serializer.serialize(factory.create_int_counter_delta(
+            "http.requests", 1, dimensions))
+    return operations / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print("{:<32} {:>14}".format("", "ops/s"))
+    print("{:<32} {:>14,.0f}".format("create and serialize",
+                                     in_process_rate(args.operations)))
+
+    directory = tempfile.mkdtemp(prefix="dt")
+    for datagram in (False, True):
+        path = os.path.join(directory, "sidecar.sock")
+        ready = multiprocessing.Event()
+        stop = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=run_daemon, args=(path, datagram, ready, stop))
+        process.start()
+        try:
+            ready.wait()
+            rate = client_rate(path, datagram, args.operations)
+        finally:
+            stop.set()
+            process.join()
+        print("{:<32} {:>14,.0f}".format(
+            "sidecar client ({})".format(
+                "datagram" if datagram else "stream"), rate))
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Saving and restoring the state of a ThreadLocalRecorder with a snapshot,
+compared to pickling the collected counters and summaries.
+
+    python benchmarks/snapshot.py --series 100000
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+from dynatrace.metric.utils import ThreadLocalRecorder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=100_000)
+    parser.add_argument("--distinct-values", type=int, default=1_000,
+                        help="distinct values per dimension")
+    args = parser.parse_args()
+
+    recorder = ThreadLocalRecorder()
+    for i in range(args.series // 2):
+        dimensions = {"route": "/api/items/{}".format(i),
+                      "status": str(200 + i % 5),
+                      "region": "region-{}".format(i % args.distinct_values)}
+        recorder.add("http.requests", i, dimensions)
+        recorder.record("http.duration", i * 0.5, dimensions)
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, "state.snapshot")
+        pickle_path = os.path.join(directory, "state.pickle")
+
+        start = time.perf_counter()
+        recorder.save_snapshot(snapshot_path)
+        snapshot_save = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(pickle_path, "wb") as f:
+            pickle.dump(recorder._collect_raw(reset=False), f,
+                        pickle.HIGHEST_PROTOCOL)
+        pickle_save = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ThreadLocalRecorder().restore_snapshot(snapshot_path)
+        snapshot_restore = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(pickle_path, "rb") as f:
+            pickle.load(f)
+        pickle_restore = time.perf_counter() - start
+
+        print("{:>10} {:>12} {:>12} {:>12}".format(
+            "", "size (MB)", "save (ms)", "restore (ms)"))
+        for name, path, save, restore in (
+                ("snapshot", snapshot_path, snapshot_save, snapshot_restore),
+                ("pickle", pickle_path, pickle_save, pickle_restore)):
+            print("{:>10} {:>12.1f} {:>12.0f} {:>12.0f}".format(
+                name, os.path.getsize(path) / 1e6, save * 1000,
+                restore * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Packet throughput of the StatsdListener over localhost UDP.
+
+A separate process sends single-line StatsD packets as fast as it can (or at
+a fixed rate), while the listener receives, parses and aggregates them in a
+background thread of this process. The number of packets received per
+second and the share of packets lost (dropped by the kernel because the
+listener did not keep up) are reported.
+
+    python benchmarks/statsd_listener.py --packets 500000 --rate 100000
+"""
+
+import argparse
+import multiprocessing
+import socket
+import time
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, \
+    StatsdListener
+
+PACKETS = [
+    b"http.requests:1|c|#route:/api/items,method:GET",
+    b"http.duration:12.5|ms|@0.5|#route:/api/items",
+    b"queue.size:42|g",
+    b"users:alice|s",
+]
+
+
+def send(address, packets: int, rate: int) -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(address)
+    start = time.perf_counter()
+    batch = 1000
+    for offset in range(0, packets, batch):
+        for i in range(offset, min(offset + batch, packets)):
+            sock.send(PACKETS[i % len(PACKETS)])
+        if rate:
+            # sleep until the batch is due.
+            delay = start + (offset + batch) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=500_000)
+    parser.add_argument("--rate", type=int, default=0,
+                        help="packets per second, 0 to send at full speed")
+    args = parser.parse_args()
+
+    listener = StatsdListener(
+        port=0,
+        serializer=DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False),
+        export=lambda payload: None, flush_interval=1.0).start()
+
+    sender = multiprocessing.Process(
+        target=send, args=(listener.address, args.packets, args.rate))
+    start = time.perf_counter()
+    sender.start()
+    sender.join()
+    send_time = time.perf_counter() - start
+
+    # wait until the listener has drained the socket.
+    received = -1
+    while received != listener.snapshot()["packets_received"]:
+        received = listener.snapshot()["packets_received"]
+        time.sleep(0.2)
+    listener.close()
+
+    print("sent:     {:>10,} packets in {:.2f} s ({:,.0f}/s)".format(
+        args.packets, send_time, args.packets / send_time))
+    print("received: {:>10,} packets ({:.1%} lost)".format(
+        received, 1 - received / args.packets))
+    print("invalid:  {:>10,}".format(
+        listener.snapshot()["metrics_invalid"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Recording throughput with many threads: the ThreadLocalRecorder, where each
+thread writes into its own table, compared to a dict shared by all threads
+and guarded by a single lock.
+
+With the CPython GIL, only one thread runs Python code at a time, so neither
+variant scales with the number of cores. What this measures is the cost of
+contention: with a single lock, threads that are switched out while holding
+the lock block all other threads, and the throughput drops as threads are
+added. With per-thread tables, the total throughput should stay close to the
+single-thread throughput. On free-threaded builds, the per-thread tables
+allow scaling with the number of cores.
+
+    python benchmarks/thread_contention.py --operations 200000
+"""
+
+import argparse
+import threading
+import time
+
+from dynatrace.metric.utils import DimensionSet, ThreadLocalRecorder
+
+THREAD_COUNTS = (1, 4, 16, 64)
+
+
+class SingleLockRecorder:
+    """
+    The baseline: all threads add to one dict, guarded by one lock.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, key, value) -> None:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+def run_threads(thread_count: int, operations: int, work) -> float:
+    per_thread = operations // thread_count
+    start_barrier = threading.Barrier(thread_count + 1)
+
+    def run():
+        start_barrier.wait()
+        work(per_thread)
+
+    threads = [threading.Thread(target=run) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return per_thread * thread_count / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=200_000,
+                        help="total operations per run")
+    args = parser.parse_args()
+
+    dimensions = DimensionSet({"route": "/api/items"})
+
+    def thread_local(count: int) -> None:
+        counter = recorder.counter("requests", dimensions)
+        add = counter.add
+        for _ in range(count):
+            add(1)
+
+    def single_lock(count: int) -> None:
+        key = ("requests", dimensions)
+        add = baseline.add
+        for _ in range(count):
+            add(key, 1)
+
+    print("{:>8} {:>22} {:>22}".format("threads", "thread-local (ops/s)",
+                                       "single lock (ops/s)"))
+    for thread_count in THREAD_COUNTS:
+        recorder = ThreadLocalRecorder()
+        baseline = SingleLockRecorder()
+        local_rate = run_threads(thread_count, args.operations, thread_local)
+        lock_rate = run_threads(thread_count, args.operations, single_lock)
+
+        # no updates were lost.
+        expected = args.operations // thread_count * thread_count
+        [metric] = recorder.collect()
+        assert metric.get_value().serialize_value() == \
+            "count,delta={}".format(expected)
+        print("{:>8} {:>22,.0f} {:>22,.0f}".format(thread_count, local_rate,
+                                                   lock_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,13 +13,93 @@
 #  limitations under the License.
 
 
-# Ignore "imported but not used" errors. This is here, so all the types
-# can directly be imported from the module, without specifying the files.
-from .dynatrace_metrics_factory import DynatraceMetricsFactory  # noqa: F401
-from .dynatrace_metrics_serializer import \
-    DynatraceMetricsSerializer  # noqa: F401
-from .metric_error import MetricError  # noqa: F401
-from .dynatrace_metrics_api_constants import \
-    DynatraceMetricsApiConstants  # noqa: F401
+# not imported from typing, which takes longer to import than the rest of
+# this module. Type checkers treat this name the same way.
+TYPE_CHECKING = False
+
+# The public types can be imported directly from this package, without
+# specifying the files. The submodules are only imported when one of their
+# types is accessed for the first time, which keeps importing the package
+# cheap for short-lived processes.
+_LAZY_IMPORTS = {
+    "DynatraceMetricsFactory": ".dynatrace_metrics_factory",
+    "DynatraceMetricsSerializer": ".dynatrace_metrics_serializer",
+    "MetricError": ".metric_error",
+    "DynatraceMetricsApiConstants": ".dynatrace_metrics_api_constants",
+    "SelfMonitoring": ".self_monitoring",
+    "SerializerConfig": ".serializer_config",
+    "FanOutSerializer": ".fan_out_serializer",
+    "DimensionSet": ".dimension_set",
+    "AmbientDimensions": ".ambient_dimensions",
+    "current_ambient_dimensions": ".ambient_dimensions",
+    "DynatraceMetricsBatchSerializer": ".dynatrace_metrics_batch_serializer",
+    "CumulativeToDeltaConverter": ".cumulative_to_delta_converter",
+    "QuantileSketch": ".quantile_sketch",
+    "QuantileSketchAggregator": ".quantile_sketch",
+    "ThreadLocalRecorder": ".thread_local_recorder",
+    "Timed": ".timing",
+    "TimingRegistry": ".timing",
+    "timed": ".timing",
+    "SidecarClient": ".sidecar_client",
+    "SidecarDaemon": ".sidecar_daemon",
+    "StatsdListener": ".statsd_listener",
+    "PrometheusConverter": ".prometheus_converter",
+    "DataFrameSerializer": ".dataframe_serializer",
+    "SnapshotError": "._snapshot",
+    "SeriesExpiry": ".series_expiry",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+if TYPE_CHECKING:
+    # Ignore "imported but not used" errors, these imports are only here
+    # for type checkers and IDEs.
+    from .dynatrace_metrics_factory import \
+        DynatraceMetricsFactory  # noqa: F401
+    from .dynatrace_metrics_serializer import \
+        DynatraceMetricsSerializer  # noqa: F401
+    from .metric_error import MetricError  # noqa: F401
+    from .dynatrace_metrics_api_constants import \
+        DynatraceMetricsApiConstants  # noqa: F401
+    from .self_monitoring import SelfMonitoring  # noqa: F401
+    from .serializer_config import SerializerConfig  # noqa: F401
+    from .fan_out_serializer import FanOutSerializer  # noqa: F401
+    from .dimension_set import DimensionSet  # noqa: F401
+    from .ambient_dimensions import AmbientDimensions, \
+        current_ambient_dimensions  # noqa: F401
+    from .dynatrace_metrics_batch_serializer import \
+        DynatraceMetricsBatchSerializer  # noqa: F401
+    from .cumulative_to_delta_converter import \
+        CumulativeToDeltaConverter  # noqa: F401
+    from .quantile_sketch import QuantileSketch, \
+        QuantileSketchAggregator  # noqa: F401
+    from .thread_local_recorder import ThreadLocalRecorder  # noqa: F401
+    from .timing import Timed, TimingRegistry, timed  # noqa: F401
+    from .sidecar_client import SidecarClient  # noqa: F401
+    from .sidecar_daemon import SidecarDaemon  # noqa: F401
+    from .statsd_listener import StatsdListener  # noqa: F401
+    from .prometheus_converter import PrometheusConverter  # noqa: F401
+    from .dataframe_serializer import DataFrameSerializer  # noqa: F401
+    from ._snapshot import SnapshotError  # noqa: F401
+    from .series_expiry import SeriesExpiry  # noqa: F401
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+
+    import importlib
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # later accesses do not go through __getattr__.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 
 VERSION = "0.2.1"
@@ -0,0 +1,53 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Callable, Dict, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class BoundedCache:
+    """
+    A size-bounded memo for the results of pure functions (e.g.
+    normalization). When the cache is full, it is cleared instead of evicting
+    single entries, which keeps lookups as cheap as a dict access. Hits and
+    misses are counted for self-monitoring.
+    """
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        self._entries: Dict[Hashable, object] = {}
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: K, compute: Callable[[K], V]) -> V:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = compute(key)
+            if len(self._entries) >= self._max_size:
+                self._entries.clear()
+            self._entries[key] = value
+            return value
+
+        self.hits += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
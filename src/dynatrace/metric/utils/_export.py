@@ -0,0 +1,48 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import urllib.error
+import urllib.request
+from typing import Optional
+
+
+def post_payload(endpoint: str,
+                 payload: str,
+                 api_token: Optional[str] = None,
+                 timeout: float = 10.0,
+                 ) -> int:
+    """
+    Send a payload of newline-separated metric lines to a metrics ingest
+    endpoint.
+    :param endpoint: The URL of the endpoint, e.g. the default OneAgent
+     endpoint.
+    :param payload: The metric lines.
+    :param api_token: An optional API token, required for endpoints other
+     than the local OneAgent endpoint.
+    :param timeout: The timeout of the request, in seconds.
+    :return: The HTTP status code of the response.
+    :raises OSError: If the endpoint cannot be reached.
+    """
+    request = urllib.request.Request(
+        endpoint, data=payload.encode("utf-8"), method="POST")
+    request.add_header("Content-Type", "text/plain; charset=utf-8")
+    if api_token:
+        request.add_header("Authorization", "Api-Token " + api_token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as err:
+        return err.code
@@ -0,0 +1,239 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import logging
+import selectors
+import socket
+import threading
+from typing import Callable, Iterable, List, Mapping, Optional
+
+from ._export import post_payload
+from ._metric import Metric
+from ._payload import chunk_lines
+from .dynatrace_metrics_api_constants import DynatraceMetricsApiConstants
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+
+
+class _Listener:
+    """
+    The base of daemons that receive metrics on sockets, aggregate them and
+    periodically serialize and export them. Runs a selector loop that calls
+    the callback registered for every readable socket, and flushes the
+    aggregated metrics every flush interval on a separate thread, so
+    receiving continues while a slow endpoint is exported to. Subclasses
+    register their sockets and implement :meth:`_collect_metrics`.
+    """
+
+    def __init__(self,
+                 serializer: Optional[DynatraceMetricsSerializer],
+                 export: Optional[Callable[[str], None]],
+                 endpoint: Optional[str],
+                 api_token: Optional[str],
+                 flush_interval: float,
+                 logger: logging.Logger,
+                 statistics: Iterable[str],
+                 ) -> None:
+        if flush_interval <= 0:
+            raise ValueError("The flush interval must be positive.")
+
+        self._logger = logger
+        self.__serializer = serializer if serializer else \
+            DynatraceMetricsSerializer(logger.getChild(
+                DynatraceMetricsSerializer.__name__))
+        self._factory = DynatraceMetricsFactory(logger.getChild(
+            DynatraceMetricsFactory.__name__))
+        if export is None:
+            endpoint = endpoint if endpoint else \
+                DynatraceMetricsApiConstants.default_oneagent_endpoint()
+            export = self.__post_payload
+        self.__export = export
+        self.__endpoint = endpoint
+        self.__api_token = api_token
+        self.__flush_interval = flush_interval
+
+        # guards the aggregated metrics of the subclass and the statistics.
+        self._lock = threading.Lock()
+        self._statistics = dict.fromkeys(statistics, 0)
+        self._statistics.update(lines_exported=0, lines_invalid=0,
+                                export_errors=0)
+
+        self.__closed = False
+        self.__thread: Optional[threading.Thread] = None
+        # the thread running serve_forever, and whether it returned.
+        self.__serving_thread: Optional[threading.Thread] = None
+        self.__stopped = threading.Event()
+        self.__selector = selectors.DefaultSelector()
+        # wakes up the selector when the daemon is closed.
+        self.__wakeup_receiver, self.__wakeup_sender = socket.socketpair()
+        self.__wakeup_receiver.setblocking(False)
+        self.__selector.register(self.__wakeup_receiver,
+                                 selectors.EVENT_READ, None)
+
+    def _register(self,
+                  sock: socket.socket,
+                  callback: Callable[[], None],
+                  ) -> None:
+        """
+        Call the callback whenever the socket is readable.
+        """
+        self.__selector.register(sock, selectors.EVENT_READ, callback)
+
+    def _unregister(self, sock: socket.socket) -> None:
+        self.__selector.unregister(sock)
+
+    def snapshot(self) -> Mapping[str, int]:
+        """
+        Get the statistics of the daemon, e.g. the number of exported and
+        invalid metric lines, and the number of payloads that could not be
+        exported.
+        """
+        with self._lock:
+            return dict(self._statistics)
+
+    def start(self):
+        """
+        Run the daemon in a background thread.
+        :return: The daemon itself.
+        """
+        self.__thread = threading.Thread(target=self.serve_forever,
+                                         name=type(self).__name__,
+                                         daemon=True)
+        self.__thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """
+        Receive and export metrics until :meth:`close` is called. The
+        metrics are exported by a second thread, which runs as long as this
+        method.
+        """
+        self.__serving_thread = threading.current_thread()
+        flusher = threading.Thread(target=self.__flush_periodically,
+                                   name=type(self).__name__ + "-flush",
+                                   daemon=True)
+        flusher.start()
+        try:
+            while not self.__closed:
+                for key, _ in self.__selector.select():
+                    # the callback registered with the socket, None for the
+                    # wakeup socket.
+                    if key.data is not None:
+                        key.data()
+        finally:
+            self.__stopped.set()
+            flusher.join()
+
+    def __flush_periodically(self) -> None:
+        while not self.__stopped.wait(self.__flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                self._logger.exception("Could not flush metrics")
+
+    def _collect_metrics(self) -> List[Metric]:
+        """
+        Create the metrics aggregated since the last flush and reset the
+        aggregation.
+        """
+        raise NotImplementedError()
+
+    def _append_metric(self,
+                       metrics: List[Metric],
+                       create_metric: Callable[..., Metric],
+                       *args) -> None:
+        """
+        Create a metric with one of the methods of the factory and append
+        it, or log and drop it if it is invalid.
+        """
+        try:
+            metrics.append(create_metric(*args))
+        except MetricError as err:
+            # e.g. timestamps outside of the accepted range.
+            self._logger.debug("Invalid metric %s: %s", args[0], err)
+            with self._lock:
+                self._statistics["lines_invalid"] += 1
+
+    def flush(self) -> int:
+        """
+        Serialize and export the metrics aggregated since the last flush.
+        :return: The number of exported metric lines.
+        """
+        serialize = self.__serializer.serialize
+        lines = []
+        invalid = 0
+        for metric in self._collect_metrics():
+            try:
+                lines.append(serialize(metric))
+            except MetricError:
+                invalid += 1
+
+        export_errors = 0
+        for payload in chunk_lines(lines):
+            try:
+                self.__export(payload)
+            except Exception as err:
+                self._logger.warning("Could not export metrics: %s", err)
+                export_errors += 1
+
+        with self._lock:
+            self._statistics["lines_exported"] += len(lines)
+            self._statistics["lines_invalid"] += invalid
+            self._statistics["export_errors"] += export_errors
+        if invalid:
+            self._logger.warning("Dropped %d metrics that could not be "
+                                 "serialized.", invalid)
+        return len(lines)
+
+    def __post_payload(self, payload: str) -> None:
+        status = post_payload(self.__endpoint, payload, self.__api_token)
+        if not 200 <= status < 300:
+            raise OSError("The endpoint returned status {}".format(status))
+
+    def _on_close(self) -> None:
+        """
+        Called when the daemon is closed, after all sockets are closed.
+        """
+
+    def close(self) -> None:
+        """
+        Stop the daemon, close its sockets and export the metrics received
+        so far.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__wakeup_sender.send(b"\0")
+        serving_thread = self.__serving_thread
+        if (serving_thread is not None
+                and serving_thread is not threading.current_thread()):
+            self.__stopped.wait()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+        for key in list(self.__selector.get_map().values()):
+            key.fileobj.close()
+        self.__selector.close()
+        self.__wakeup_sender.close()
+        self._on_close()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -15,6 +15,7 @@
 from typing import Optional, Mapping
 
 from ._metric_values import MetricValue
+from .dimension_set import DimensionSet
 from .metric_error import MetricError
 
 
@@ -38,7 +39,8 @@ class Metric:
         :param timestamp: Optional timestamp in milliseconds (Unix time * 1000)
         """
         if not metric_name:
-            raise MetricError("Metric name cannot be empty")
+            raise MetricError("Metric name cannot be empty",
+                              reason="empty_metric_name")
 
         self.__metric_name = metric_name
         self.__value = value
@@ -51,10 +53,20 @@ class Metric:
             else:
                 raise MetricError('timestamp needs to be between the years '
                                   '2000 and 3000 and specified in '
-                                  'milliseconds.')
+                                  'milliseconds.',
+                                  reason="invalid_timestamp")
         else:
             self.__timestamp = None
 
+    def __reduce__(self):
+        # pickle metrics as a compact tuple of their already validated
+        # fields, e.g. when sending them to worker processes.
+        dimensions = self.__dimensions
+        if not isinstance(dimensions, (dict, DimensionSet)):
+            dimensions = dict(dimensions)
+        return _restore_metric, (self.__metric_name, self.__value,
+                                 dimensions or None, self.__timestamp)
+
     def get_metric_name(self) -> str:
         return self.__metric_name
 
@@ -66,3 +78,15 @@ class Metric:
 
     def get_timestamp(self) -> Optional[str]:
         return self.__timestamp
+
+
+def _restore_metric(metric_name: str,
+                    value: MetricValue,
+                    dimensions: Optional[Mapping[str, str]],
+                    timestamp: Optional[str]) -> Metric:
+    metric = Metric.__new__(Metric)
+    metric._Metric__metric_name = metric_name
+    metric._Metric__value = value
+    metric._Metric__dimensions = dimensions if dimensions else {}
+    metric._Metric__timestamp = timestamp
+    return metric
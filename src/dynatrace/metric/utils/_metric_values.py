@@ -23,12 +23,43 @@ from . import (
 
 def _raise_if_nan_or_inf(value: Union[int, float]):
     if math.isnan(value):
-        raise metric_error.MetricError("Value is NaN")
+        raise metric_error.MetricError("Value is NaN", reason="nan")
     if math.isinf(value):
-        raise metric_error.MetricError("Value is Infinite")
+        raise metric_error.MetricError("Value is Infinite",
+                                       reason="infinite")
+
+
+# pre-formatted small non-negative integers, which are the most common values
+# (e.g. counter deltas and summary counts).
+_SMALL_INT_STRINGS = tuple(str(i) for i in range(1024))
 
 
 def _format_number(value: Union[int, float]):
+    # fast paths for the common cases, which produce the same output as
+    # _format_number_generic without the exponent and trailing zero checks.
+    value_type = type(value)
+    if value_type is int:
+        if 0 <= value < 1024:
+            return _SMALL_INT_STRINGS[value]
+        if -1e15 <= value <= 1e15:
+            return str(value)
+    elif value_type is float:
+        if value.is_integer():
+            if -1e15 <= value <= 1e15:
+                # str() of an integral float ends with ".0", which is
+                # dropped. int() also turns -0.0 into "0".
+                value = int(value)
+                if 0 <= value < 1024:
+                    return _SMALL_INT_STRINGS[value]
+                return str(value)
+        elif 1e-4 <= abs(value) <= 1e15:
+            # str() only uses exponential notation below 1e-4 or from 1e16.
+            return str(value)
+
+    return _format_number_generic(value)
+
+
+def _format_number_generic(value: Union[int, float]):
     if abs(value) > 1e15:
         as_string = "{:.8e}".format(value)
     elif 0 < abs(value) < 1e-15:
@@ -67,6 +98,9 @@ class GaugeValue(MetricValue):
 
         self._value = value
 
+    def __reduce__(self):
+        return GaugeValue, (self._value,)
+
     def serialize_value(self) -> str:
         return "gauge,{}".format(_format_number(self._value))
 
@@ -78,6 +112,9 @@ class CounterValueDelta(MetricValue):
         _raise_if_nan_or_inf(value)
         self._value = value
 
+    def __reduce__(self):
+        return CounterValueDelta, (self._value,)
+
     def serialize_value(self) -> str:
         return "count,delta={}".format(_format_number(self._value))
 
@@ -94,16 +131,21 @@ class SummaryValue(MetricValue):
         _raise_if_nan_or_inf(total)
 
         if count < 0:
-            raise metric_error.MetricError("Count must be 0 or above.")
+            raise metric_error.MetricError("Count must be 0 or above.",
+                                           reason="negative_count")
 
         if minimum > maximum:
-            raise metric_error.MetricError("Min cannot be larger than max.")
+            raise metric_error.MetricError("Min cannot be larger than max.",
+                                           reason="min_greater_than_max")
 
         self._min = minimum
         self._max = maximum
         self._sum = total
         self._count = count
 
+    def __reduce__(self):
+        return SummaryValue, (self._min, self._max, self._sum, self._count)
+
     def serialize_value(self) -> str:
         return "gauge,min={},max={},sum={},count={}".format(
             _format_number(self._min),
@@ -13,33 +13,59 @@
 #  limitations under the License.
 
 import logging
-import re
-import unicodedata
-from typing import Mapping, Optional
+from typing import Mapping, Optional, Tuple
+
+from ._cache import BoundedCache
+from ._profiling import ProfilingHook, ProfilingHooks
 from .metric_error import MetricError
 
 
+class _LazyPattern:
+    """
+    A class attribute holding a regular expression that is compiled on first
+    access. The compiled pattern then replaces the descriptor on the class,
+    so later accesses cost the same as a plain class attribute.
+    """
+
+    def __init__(self, pattern: str) -> None:
+        self.__pattern = pattern
+        self.__name = None
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.__name = name
+
+    def __get__(self, instance: object, owner: type):
+        import re
+
+        compiled = re.compile(self.__pattern)
+        setattr(owner, self.__name, compiled)
+        return compiled
+
+
 class Normalize:
+    # regular expressions are compiled when they are used for the first time,
+    # which keeps importing the library cheap.
+
     # Metric keys (mk)
     # characters not valid to start the first identifier key section
-    __re_mk_first_identifier_section_start = (re.compile(r"^[^a-zA-Z_]+"))
+    __re_mk_first_identifier_section_start = _LazyPattern(r"^[^a-zA-Z_]+")
 
     # characters not valid to start subsequent identifier key sections
-    __re_mk_identifier_section_start = re.compile(r"^[^a-zA-Z0-9_]+")
+    __re_mk_identifier_section_start = _LazyPattern(r"^[^a-zA-Z0-9_]+")
 
     # for the rest of the metric key characters, alphanumeric characters as
     # well as hyphens and underscores are allowed.
-    __re_mk_invalid_characters = re.compile(r"[^a-zA-Z0-9_\-]+")
+    __re_mk_invalid_characters = _LazyPattern(r"[^a-zA-Z0-9_\-]+")
 
     __mk_max_length = 250
 
     # Dimension keys (dk)
     # dimension keys have to start with a lowercase letter or an underscore.
-    __re_dk_start = re.compile(r"^[^a-z_]+")
+    __re_dk_start = _LazyPattern(r"^[^a-z_]+")
 
     # other valid characters in dimension keys are lowercase letters, numbers,
     # colons, underscores and hyphens.
-    __re_dk_invalid_chars = re.compile(r"[^a-z0-9_\-:]+")
+    __re_dk_invalid_chars = _LazyPattern(r"[^a-z0-9_\-:]+")
 
     __dk_max_length = 100
 
@@ -47,13 +73,11 @@ class Normalize:
     # in order to delete control characters, all control chars are replaced
     # with the null character (\u0000), and then all consecutive null chars
     # are replaced with one underscore.
-    __re_dv_null_characters = re.compile(r"\u0000+")
+    __re_dv_null_characters = _LazyPattern(r"\u0000+")
 
-    # characters to be escaped in the dimension value
-    __re_dv_characters_to_escape = re.compile(r"([= ,\\\"])")
-    # will match if the string has an odd number of escaped trailing
-    # backslashes
-    __re_dv_odd_number_of_trailing_slashes = re.compile(r"[^\\](?:\\\\)*\\$")
+    # characters to be escaped in the dimension value are prefixed with a
+    # backslash.
+    __dv_escape_table = str.maketrans({c: "\\" + c for c in "= ,\\\""})
 
     __dv_max_length = 250
 
@@ -61,6 +85,51 @@ class Normalize:
                  logger: Optional[logging.Logger] = None
                  ) -> None:
         self.__logger = logger if logger else logging.getLogger(__name__)
+        # dimension keys and (to a lesser extent) values repeat on most
+        # lines, so their normalized form is memoized.
+        self.__dimension_key_cache = BoundedCache()
+        self.__dimension_value_cache = BoundedCache()
+        self.__profiling_hooks = ProfilingHooks(self, {
+            stage: (stage, getattr(self, stage), False)
+            for stage in ("normalize_metric_key",
+                          "normalize_metric_key_suffix",
+                          "normalize_dimension_key",
+                          "normalize_dimension_value",
+                          "normalize_dimensions",
+                          "escape_dimension_value",
+                          "normalize_and_escape_dimension_value",
+                          "normalize_and_escape_dimensions")
+        })
+
+    def _view(self) -> "Normalize":
+        """
+        Create a normalizer that shares the caches of this one, but has its
+        own profiling hooks.
+        """
+        view = Normalize(self.__logger)
+        view.__dimension_key_cache = self.__dimension_key_cache
+        view.__dimension_value_cache = self.__dimension_value_cache
+        return view
+
+    def add_profiling_hook(self, hook: ProfilingHook) -> None:
+        """
+        Register a hook that is called with the stage name and the
+        time.perf_counter_ns() values before and after each normalization
+        step. Without registered hooks, normalization is not instrumented.
+        """
+        self.__profiling_hooks.add(hook)
+
+    def remove_profiling_hook(self, hook: ProfilingHook) -> None:
+        self.__profiling_hooks.remove(hook)
+
+    def cache_statistics(self) -> Tuple[int, int]:
+        """
+        Get the number of hits and misses of the normalization caches.
+        :return: A tuple of (hits, misses).
+        """
+        caches = (self.__dimension_key_cache, self.__dimension_value_cache)
+        return (sum(cache.hits for cache in caches),
+                sum(cache.misses for cache in caches))
 
     def normalize_metric_key(self, metric_key: str) -> Optional[str]:
         self.__logger.debug("normalizing metric key %s", metric_key)
@@ -70,7 +139,8 @@ class Normalize:
 
         if not isinstance(metric_key, str):
             raise MetricError(
-                f"Unexpected metric key type: {type(metric_key)}")
+                f"Unexpected metric key type: {type(metric_key)}",
+                reason="invalid_type")
 
         # trim if too long
         metric_key = metric_key[:self.__mk_max_length]
@@ -93,6 +163,49 @@ class Normalize:
 
         return ".".join([first, *rest])
 
+    def normalize_metric_key_suffix(self,
+                                    metric_key_suffix: str,
+                                    prefix_length: int,
+                                    ) -> str:
+        """
+        Normalize the part of a metric key that follows a prefix, e.g. the
+        metric name after the metric key prefix of a serializer. The suffix
+        is truncated as if it was part of the whole metric key, so joining
+        the normalized prefix and suffix with a dot gives the same result as
+        normalizing the whole key.
+        :param metric_key_suffix: The part of the key after the prefix and
+         the dot separating them.
+        :param prefix_length: The length of the (not normalized) prefix.
+        :return: The normalized sections of the suffix joined by dots, or an
+         empty string if no sections are left.
+        """
+        metric_key_suffix = metric_key_suffix[
+            :self.max_metric_key_suffix_length(prefix_length)]
+
+        return ".".join(filter(None, map(
+            self.__normalize_metric_key_section,
+            metric_key_suffix.split(".")
+        )))
+
+    @classmethod
+    def max_metric_key_length(cls) -> int:
+        """
+        The length after which normalize_metric_key truncates a key. Keys
+        can be truncated to it before they are normalized without changing
+        the result.
+        """
+        return cls.__mk_max_length
+
+    @classmethod
+    def max_metric_key_suffix_length(cls, prefix_length: int) -> int:
+        """
+        The length after which normalize_metric_key_suffix truncates a
+        suffix. Suffixes can be truncated to it before they are normalized
+        without changing the result.
+        :param prefix_length: The length of the (not normalized) prefix.
+        """
+        return max(0, cls.__mk_max_length - prefix_length - 1)
+
     @classmethod
     def __normalize_metric_key_section(cls, section: str) -> str:
         # delete invalid characters at the start of the section key
@@ -109,12 +222,19 @@ class Normalize:
 
         if not isinstance(dimension_key, str):
             raise MetricError(
-                f"Unexpected dimension key type: {type(dimension_key)}")
+                f"Unexpected dimension key type: {type(dimension_key)}",
+                reason="invalid_type")
 
-        dimension_key = dimension_key[:self.__dk_max_length]
+        # only the truncated key is cached, so oversized inputs are not
+        # kept alive by the cache.
+        return self.__dimension_key_cache.get_or_compute(
+            dimension_key[:self.__dk_max_length],
+            self.__normalize_dimension_key)
 
+    @classmethod
+    def __normalize_dimension_key(cls, dimension_key: str) -> str:
         sections = list(filter(None, map(
-            self.__normalize_dimension_key_section,
+            cls.__normalize_dimension_key_section,
             dimension_key.split(".")
         )))
 
@@ -140,13 +260,50 @@ class Normalize:
 
         if not isinstance(dimension_value, str):
             raise MetricError(
-                f"Unexpected dimension value type: {type(dimension_value)}")
+                f"Unexpected dimension value type: {type(dimension_value)}",
+                reason="invalid_type")
         dimension_value = dimension_value[:self.__dv_max_length]
 
         return self.__replace_control_characters(dimension_value)
 
+    def normalize_and_escape_dimension_value(self,
+                                             dimension_value: str,
+                                             ) -> str:
+        """
+        Normalize and escape a dimension value in one step. The result is
+        the same as escape_dimension_value(normalize_dimension_value(value)),
+        and is cached for values that are seen repeatedly.
+        """
+        if not dimension_value:
+            return ""
+
+        if not isinstance(dimension_value, str):
+            raise MetricError(
+                f"Unexpected dimension value type: {type(dimension_value)}",
+                reason="invalid_type")
+
+        # only the truncated value is cached, so oversized inputs are not
+        # kept alive by the cache.
+        return self.__dimension_value_cache.get_or_compute(
+            dimension_value[:self.__dv_max_length],
+            self.__normalize_and_escape_dimension_value)
+
+    @classmethod
+    def __normalize_and_escape_dimension_value(cls,
+                                               dimension_value: str,
+                                               ) -> str:
+        return cls.__escape(cls.__replace_control_characters(
+            dimension_value))
+
     @classmethod
     def __replace_control_characters(cls, s: str):
+        # all control characters (unicode category "C") are non-printable,
+        # so printable strings can be returned as they are.
+        if s.isprintable():
+            return s
+
+        import unicodedata
+
         s = "".join(
             c if unicodedata.category(c)[0] != "C" else "\u0000" for c in s
         )
@@ -166,15 +323,41 @@ class Normalize:
 
         return return_dict
 
+    def normalize_and_escape_dimensions(self,
+                                        dimensions: Mapping[str, str]
+                                        ) -> Mapping[str, str]:
+        """
+        Like normalize_dimensions, but the values are also escaped, i.e. in
+        the form in which they appear in metric lines.
+        """
+        return_dict = {}
+        for key, value in dimensions.items():
+            normalized_key = self.normalize_dimension_key(key)
+            if normalized_key:
+                return_dict[normalized_key] = \
+                    self.normalize_and_escape_dimension_value(value)
+            else:
+                self.__logger.debug("Key is empty, dropping %s=%s", key, value)
+
+        return return_dict
+
     def escape_dimension_value(self,
                                dimension_value: str,
                                ) -> str:
         self.__logger.debug("escaping dimension value: %s", dimension_value)
-        escaped = self.__re_dv_characters_to_escape.sub(r"\\\g<1>",
-                                                        dimension_value)
+        return self.__escape(dimension_value)
 
-        escaped = escaped[:self.__dv_max_length]
-        if self.__re_dv_odd_number_of_trailing_slashes.search(escaped):
-            escaped = escaped[:len(escaped) - 1]
+    @classmethod
+    def __escape(cls, dimension_value: str) -> str:
+        # escaping never shortens the value, so only the characters that can
+        # end up in the truncated result need to be escaped.
+        escaped = dimension_value[:cls.__dv_max_length].translate(
+            cls.__dv_escape_table)[:cls.__dv_max_length]
+
+        # an odd number of trailing backslashes means that truncation split
+        # an escape sequence. Only the trailing backslashes are scanned.
+        trailing_backslashes = len(escaped) - len(escaped.rstrip("\\"))
+        if trailing_backslashes % 2:
+            escaped = escaped[:-1]
 
         return escaped
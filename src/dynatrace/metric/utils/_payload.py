@@ -0,0 +1,41 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import itertools
+from typing import Iterable, Iterator, Optional
+
+from .dynatrace_metrics_api_constants import DynatraceMetricsApiConstants
+
+
+def chunk_lines(lines: Iterable[str],
+                lines_limit: Optional[int] = None,
+                ) -> Iterator[str]:
+    """
+    Combine metric lines into newline-separated payloads that do not exceed
+    the number of lines accepted in one request. Lines are consumed lazily,
+    so at most one payload is held in memory at a time.
+    :param lines: The serialized metric lines.
+    :param lines_limit: The maximum number of lines per payload. Defaults to
+     the payload_lines_limit() of the metrics API.
+    :return: An iterator over the payloads.
+    """
+    if lines_limit is None:
+        lines_limit = DynatraceMetricsApiConstants.payload_lines_limit()
+
+    iterator = iter(lines)
+    while True:
+        chunk = list(itertools.islice(iterator, lines_limit))
+        if not chunk:
+            return
+        yield "\n".join(chunk)
@@ -0,0 +1,89 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+from typing import Callable, List, Mapping, Sequence, Tuple
+
+# A profiling hook is called with the name of the stage and the
+# time.perf_counter_ns() values taken before and after the stage ran.
+ProfilingHook = Callable[[str, int, int], None]
+
+
+def _timed(stage: str,
+           func: Callable,
+           hooks: Tuple[ProfilingHook, ...],
+           ) -> Callable:
+    perf_counter_ns = time.perf_counter_ns
+
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = perf_counter_ns()
+            for hook in hooks:
+                hook(stage, start, end)
+
+    return timed
+
+
+class ProfilingHooks:
+    """
+    Keeps track of registered profiling hooks for an object, and shadows the
+    stage methods of that object with timed wrappers while at least one hook
+    is registered. Without hooks, the instance attributes are removed again
+    and the stages are plain method calls without any overhead.
+    """
+
+    def __init__(self,
+                 instance: object,
+                 stages: Mapping[str, Tuple[str, Callable, bool]],
+                 ) -> None:
+        """
+        :param instance: The object whose stages are profiled.
+        :param stages: Maps stage names to the attribute name on the
+         instance, the callable that implements the stage, and whether the
+         callable has to be bound to the instance attribute even if no hooks
+         are registered (i.e. if it differs from the class attribute).
+        """
+        self.__instance = instance
+        self.__stages = stages
+        self.__hooks: List[ProfilingHook] = []
+
+    @property
+    def hooks(self) -> Sequence[ProfilingHook]:
+        return tuple(self.__hooks)
+
+    def add(self, hook: ProfilingHook) -> None:
+        self.__hooks.append(hook)
+        self.rebind()
+
+    def remove(self, hook: ProfilingHook) -> None:
+        self.__hooks.remove(hook)
+        self.rebind()
+
+    def rebind(self) -> None:
+        """
+        Re-create the instance attributes for all stages. Needs to be called
+        when the underlying implementation of a stage changes.
+        """
+        hooks = tuple(self.__hooks)
+        instance_dict = vars(self.__instance)
+        for stage, (attribute, func, always_bind) in self.__stages.items():
+            if hooks:
+                instance_dict[attribute] = _timed(stage, func, hooks)
+            elif always_bind:
+                instance_dict[attribute] = func
+            elif attribute in instance_dict:
+                del instance_dict[attribute]
@@ -0,0 +1,146 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+The binary record protocol between the :class:`SidecarClient` and the
+:class:`SidecarDaemon`. Every record starts with its length (uint32, not
+including the length itself) and its type (uint8). All integers are little
+endian.
+
+A series record assigns an id to a metric name and its dimensions:
+
+    length, type=1, series id (uint32), dimension count (uint16),
+    name, (key, value) * dimension count
+
+where every string is its UTF-8 length (uint16) followed by its bytes.
+Series ids are less than MAX_SERIES, and a series record for an id that was
+used before replaces its series. A value record refers to a series defined
+before on the same connection (or in the same datagram):
+
+    length, type=2, series id (uint32), kind (uint8), value (int64 or
+    float64, depending on the kind), timestamp (int64, Unix time in
+    milliseconds, 0 if not set)
+"""
+
+import struct
+from typing import List, Mapping, Optional, Tuple
+
+from .metric_error import MetricError
+
+RECORD_LENGTH = struct.Struct("<I")
+
+# the maximum number of series ids per connection or datagram, which bounds
+# the series table of the daemon.
+MAX_SERIES = 0x10000
+# the maximum length of a record, which bounds the data the daemon buffers
+# per connection. Metric lines are much shorter.
+MAX_RECORD_LENGTH = 1024 * 1024
+
+SERIES_RECORD = 1
+VALUE_RECORD = 2
+
+# the float kind of every int kind is the next number.
+COUNTER_INT = 1
+COUNTER_FLOAT = 2
+GAUGE_INT = 3
+GAUGE_FLOAT = 4
+SUMMARY_INT = 5
+SUMMARY_FLOAT = 6
+
+INT_KINDS = frozenset((COUNTER_INT, GAUGE_INT, SUMMARY_INT))
+KINDS = INT_KINDS.union((COUNTER_FLOAT, GAUGE_FLOAT, SUMMARY_FLOAT))
+
+INT_VALUE = struct.Struct("<IBIBqq")
+FLOAT_VALUE = struct.Struct("<IBIBdq")
+VALUE_RECORD_LENGTH = INT_VALUE.size - RECORD_LENGTH.size
+# the offset of the kind in a value record.
+KIND_OFFSET = RECORD_LENGTH.size + 1 + 4
+
+_SERIES_HEADER = struct.Struct("<IH")
+_STRING_LENGTH = struct.Struct("<H")
+
+# longer strings are truncated by the normalization anyway. Every character
+# takes at most 4 bytes in UTF-8, so the encoded strings fit their length.
+_MAX_STRING_LENGTH = 0xFFFF // 4
+_MAX_DIMENSIONS = 0xFFFF
+
+
+class ProtocolError(Exception):
+    """
+    Raised for malformed records.
+    """
+
+
+def _encode_string(record: bytearray, s: str) -> None:
+    encoded = s[:_MAX_STRING_LENGTH].encode("utf-8", "surrogatepass")
+    record += _STRING_LENGTH.pack(len(encoded))
+    record += encoded
+
+
+def encode_series(series_id: int,
+                  metric_name: str,
+                  dimensions: Optional[Mapping[str, str]],
+                  ) -> bytes:
+    """
+    Create the series record for a metric name and its dimensions.
+    :raises MetricError: If there are more dimensions than the record can
+     hold, or the record is longer than MAX_RECORD_LENGTH.
+    """
+    dimensions = dimensions if dimensions else {}
+    if len(dimensions) > _MAX_DIMENSIONS:
+        raise MetricError(
+            "Too many dimensions: {}".format(len(dimensions)),
+            reason="too_many_dimensions")
+    record = bytearray(RECORD_LENGTH.size)
+    record.append(SERIES_RECORD)
+    record += _SERIES_HEADER.pack(series_id, len(dimensions))
+    _encode_string(record, metric_name)
+    for key, value in dimensions.items():
+        _encode_string(record, key)
+        _encode_string(record, value)
+    length = len(record) - RECORD_LENGTH.size
+    if length > MAX_RECORD_LENGTH:
+        raise MetricError(
+            "The series record is too long: {} bytes".format(length),
+            reason="series_too_large")
+    RECORD_LENGTH.pack_into(record, 0, length)
+    return bytes(record)
+
+
+def decode_series(data, offset: int, end: int
+                  ) -> Tuple[int, str, List[Tuple[str, str]]]:
+    """
+    Decode the series record between offset and end.
+    :return: The series id, the metric name and the dimensions.
+    """
+    try:
+        series_id, count = _SERIES_HEADER.unpack_from(
+            data, offset + RECORD_LENGTH.size + 1)
+        position = offset + RECORD_LENGTH.size + 1 + _SERIES_HEADER.size
+        strings = []
+        for _ in range(1 + 2 * count):
+            (length,) = _STRING_LENGTH.unpack_from(data, position)
+            position += _STRING_LENGTH.size
+            strings.append(bytes(data[position:position + length]).decode(
+                "utf-8", "surrogatepass"))
+            position += length
+    except (struct.error, UnicodeDecodeError) as err:
+        raise ProtocolError("Malformed series record") from err
+
+    if position != end:
+        raise ProtocolError("Malformed series record")
+    if series_id >= MAX_SERIES:
+        raise ProtocolError("Invalid series id {}".format(series_id))
+    return series_id, strings[0], list(zip(strings[1::2], strings[2::2]))
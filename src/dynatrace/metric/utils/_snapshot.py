@@ -0,0 +1,297 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+A compact binary format for the state of aggregated series, e.g. the
+counters and summaries of a :class:`ThreadLocalRecorder`, which is written
+on shutdown and read on startup.
+
+All integers are little-endian. A snapshot consists of a header and a body:
+
+- header: magic (b"DTMS"), format version (u16), flags (u16, 0), CRC32 of
+  the body (u32), length of the body (u64), the number of strings, dimension
+  sets and dimension items (u32 each) and the number of series in each of
+  the four series sections (u32 each).
+- body:
+  - string table: the end offset (u32) of every string in the string blob,
+    followed by the UTF-8 encoded strings.
+  - dimension sets: the end index (u32) of every set in the item list,
+    followed by the items, (key, value) string indexes (u32 each).
+  - series sections, stored column by column: the string indexes of the
+    metric names and the indexes of the dimension sets (u32 each), followed
+    by the values of int counters (i64), float counters (f64), int
+    summaries (min, max, sum, count: i64) and float summaries (min, max,
+    sum: f64, count: i64).
+
+Dimension sets are stored normalized, so restoring a snapshot does not
+normalize them again.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, List, Mapping, Sequence, Tuple, Union
+
+from .dimension_set import DimensionItems, DimensionSet
+
+Number = Union[int, float]
+SeriesKey = Tuple[str, DimensionSet]
+
+MAGIC = b"DTMS"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIQIIIIIII")
+
+# the value columns of the series sections.
+_SECTIONS = ("q", "d", "qqqq", "dddq")
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+class SnapshotError(Exception):
+    """
+    Raised for snapshots that cannot be read: files that are truncated,
+    corrupted or written in an unsupported format version.
+    """
+
+
+def _is_int64(value: Number) -> bool:
+    return type(value) is int and _INT64_MIN <= value <= _INT64_MAX
+
+
+def _pack(code: str, values: Sequence[Number]) -> bytes:
+    return struct.pack("<{}{}".format(len(values), code), *values)
+
+
+class _Tables:
+    """
+    The string and dimension set tables of a snapshot being written.
+    """
+
+    def __init__(self) -> None:
+        self.strings: Dict[str, int] = {}
+        # keyed by the items, as equal DimensionSets can differ in order.
+        self.dimension_sets: Dict[DimensionItems, int] = {}
+        self.dimension_set_ends: List[int] = []
+        self.dimension_items: List[int] = []
+
+    def string(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def dimension_set(self, dimensions: DimensionSet) -> int:
+        items = dimensions.items_tuple
+        index = self.dimension_sets.get(items)
+        if index is None:
+            index = self.dimension_sets[items] = len(
+                self.dimension_sets)
+            string = self.string
+            for key, value in items:
+                self.dimension_items.append(string(key))
+                self.dimension_items.append(string(value))
+            self.dimension_set_ends.append(len(self.dimension_items) // 2)
+        return index
+
+
+def encode_snapshot(counters: Mapping[SeriesKey, Number],
+                    summaries: Mapping[SeriesKey, Sequence[Number]],
+                    ) -> bytes:
+    """
+    Encode counters and [min, max, sum, count] summaries into a snapshot.
+    Integer values that do not fit into 64 bits are stored as floats.
+    """
+    tables = _Tables()
+    # the names, dimension sets and values of the series of every section.
+    sections: List[List[list]] = [
+        [[], []] + [[] for _ in columns] for columns in _SECTIONS]
+
+    for (metric_name, dimensions), value in counters.items():
+        section = sections[0 if _is_int64(value) else 1]
+        section[0].append(tables.string(metric_name))
+        section[1].append(tables.dimension_set(dimensions))
+        section[2].append(value)
+
+    for (metric_name, dimensions), summary in summaries.items():
+        minimum, maximum, total, _ = summary
+        section = sections[
+            2 if _is_int64(minimum) and _is_int64(maximum)
+            and _is_int64(total) else 3]
+        section[0].append(tables.string(metric_name))
+        section[1].append(tables.dimension_set(dimensions))
+        for column, value in zip(section[2:], summary):
+            column.append(value)
+
+    encoded = [s.encode("utf-8") for s in tables.strings]
+    ends = []
+    end = 0
+    for s in encoded:
+        end += len(s)
+        ends.append(end)
+
+    parts = [_pack("I", ends), b"".join(encoded),
+             _pack("I", tables.dimension_set_ends),
+             _pack("I", tables.dimension_items)]
+    for columns, section in zip(_SECTIONS, sections):
+        parts.append(_pack("I", section[0]))
+        parts.append(_pack("I", section[1]))
+        for code, values in zip(columns, section[2:]):
+            parts.append(_pack(code, values))
+    body = b"".join(parts)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, 0, zlib.crc32(body), len(body), len(encoded),
+        len(tables.dimension_set_ends), len(tables.dimension_items) // 2,
+        *(len(section[0]) for section in sections))
+    return header + body
+
+
+def decode_snapshot(data) -> Tuple[Dict[SeriesKey, Number],
+                                   Dict[SeriesKey, List[Number]]]:
+    """
+    Decode a snapshot created by :func:`encode_snapshot`.
+    :param data: The snapshot, as bytes or another buffer, e.g. an mmap.
+     No references to the buffer are kept.
+    :return: The counters and the [min, max, sum, count] summaries.
+    :raises SnapshotError: If the snapshot is invalid.
+    """
+    if len(data) < HEADER.size:
+        raise SnapshotError("The snapshot is truncated.")
+    (magic, version, _, checksum, body_length, string_count,
+     dimension_set_count, dimension_item_count,
+     *series_counts) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("Not a snapshot.")
+    if version != VERSION:
+        raise SnapshotError(
+            "Unsupported snapshot version {}.".format(version))
+    if len(data) - HEADER.size != body_length:
+        raise SnapshotError("The snapshot is truncated.")
+
+    # views are released explicitly, so the buffer (e.g. an mmap) can be
+    # closed right away, also on interpreters without reference counting.
+    with memoryview(data) as view, view[HEADER.size:] as body:
+        if zlib.crc32(body) != checksum:
+            raise SnapshotError("The checksum of the snapshot does not "
+                                "match.")
+
+    try:
+        return _decode_body(data, string_count, dimension_set_count,
+                            dimension_item_count, series_counts)
+    except (struct.error, IndexError, UnicodeDecodeError) as err:
+        raise SnapshotError("The snapshot is malformed.") from err
+
+
+class _Reader:
+    __slots__ = ("data", "position")
+
+    def __init__(self, data) -> None:
+        self.data = data
+        self.position = HEADER.size
+
+    def unpack(self, code: str, count: int) -> Tuple[Number, ...]:
+        layout = struct.Struct("<{}{}".format(count, code))
+        values = layout.unpack_from(self.data, self.position)
+        self.position += layout.size
+        return values
+
+    def read(self, length: int) -> bytes:
+        start = self.position
+        self.position += length
+        if self.position > len(self.data):
+            raise SnapshotError("The snapshot is truncated.")
+        # slicing bytes or an mmap copies the data.
+        return self.data[start:self.position]
+
+
+def _decode_body(data,
+                 string_count: int,
+                 dimension_set_count: int,
+                 dimension_item_count: int,
+                 series_counts: Sequence[int],
+                 ) -> Tuple[Dict[SeriesKey, Number],
+                            Dict[SeriesKey, List[Number]]]:
+    reader = _Reader(data)
+
+    ends = reader.unpack("I", string_count)
+    blob = reader.read(ends[-1] if ends else 0)
+    strings = []
+    start = 0
+    for end in ends:
+        strings.append(blob[start:end].decode("utf-8"))
+        start = end
+
+    set_ends = reader.unpack("I", dimension_set_count)
+    items = reader.unpack("I", dimension_item_count * 2)
+    dimension_sets = []
+    start = 0
+    for end in set_ends:
+        dimension_sets.append(DimensionSet._from_normalized(tuple(
+            (strings[items[i]], strings[items[i + 1]])
+            for i in range(start * 2, end * 2, 2))))
+        start = end
+
+    counters: Dict[SeriesKey, Number] = {}
+    summaries: Dict[SeriesKey, List[Number]] = {}
+    for columns, count in zip(_SECTIONS, series_counts):
+        keys = [(strings[name], dimension_sets[dimension_set])
+                for name, dimension_set in zip(reader.unpack("I", count),
+                                               reader.unpack("I", count))]
+        values = [reader.unpack(code, count) for code in columns]
+        if len(values) == 1:
+            counters.update(zip(keys, values[0]))
+        else:
+            summaries.update(zip(keys, map(list, zip(*values))))
+
+    if reader.position != len(data):
+        raise SnapshotError("The snapshot is malformed.")
+    return counters, summaries
+
+
+def write_snapshot(path: str,
+                   counters: Mapping[SeriesKey, Number],
+                   summaries: Mapping[SeriesKey, Sequence[Number]],
+                   ) -> None:
+    """
+    Write a snapshot to a file. The file is replaced atomically, so a crash
+    while writing leaves the previous snapshot intact.
+    """
+    data = encode_snapshot(counters, summaries)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path: str,
+                  ) -> Tuple[Dict[SeriesKey, Number],
+                             Dict[SeriesKey, List[Number]]]:
+    """
+    Read a snapshot from a file, which is memory-mapped instead of read
+    into memory.
+    :raises SnapshotError: If the snapshot is invalid.
+    :raises OSError: If the file cannot be read.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            # empty files cannot be memory-mapped.
+            raise SnapshotError("The snapshot is truncated.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_snapshot(mapped)
@@ -0,0 +1,163 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from typing import Callable, Hashable, List, Tuple
+
+# every level has 2 ** _LEVEL_BITS slots, and a slot of a level spans all
+# slots of the level below.
+_LEVEL_BITS = 6
+_SLOTS = 1 << _LEVEL_BITS
+_SLOT_MASK = _SLOTS - 1
+_LEVELS = 4
+
+# after pauses longer than this number of ticks, all entries are visited
+# once instead of visiting every tick that passed.
+_MAX_STEPPED_TICKS = _SLOTS * _SLOTS
+
+Entry = Tuple[int, Hashable]
+
+
+class HierarchicalTimingWheel:
+    """
+    Schedules items for a tick in the future. Level 0 has one slot per tick,
+    and every slot of a higher level covers all slots of the level below.
+    Items are placed in the lowest level that covers their deadline and move
+    down a level when the slot of their level is reached (cascading), so
+    scheduling an item and advancing by one tick take constant time, and
+    no operation scans all items. Items further in the future than the
+    highest level covers are kept in an overflow list that is revisited
+    whenever the highest level advances.
+
+    The wheel is not thread-safe.
+    """
+
+    def __init__(self, tick: int = 0) -> None:
+        """
+        :param tick: The current tick.
+        """
+        self.__tick = tick
+        self.__levels: List[List[List[Entry]]] = [
+            [[] for _ in range(_SLOTS)] for _ in range(_LEVELS)]
+        self.__overflow: List[Entry] = []
+
+    @property
+    def tick(self) -> int:
+        """
+        The current tick.
+        """
+        return self.__tick
+
+    def schedule(self, item: Hashable, deadline: int) -> None:
+        """
+        Schedule an item. Items with a deadline that already passed are due
+        in the next tick.
+        """
+        delta = deadline - self.__tick
+        if delta <= 0:
+            deadline = self.__tick + 1
+            delta = 1
+
+        for level in range(_LEVELS):
+            if delta < 1 << (_LEVEL_BITS * (level + 1)):
+                self.__levels[level][
+                    (deadline >> (_LEVEL_BITS * level)) & _SLOT_MASK].append(
+                    (deadline, item))
+                return
+        self.__overflow.append((deadline, item))
+
+    def advance(self,
+                tick: int,
+                on_due: Callable[[Hashable], None],
+                ) -> None:
+        """
+        Move the wheel to a tick.
+        :param tick: The new current tick.
+        :param on_due: Called with every item whose deadline passed. It may
+         schedule items again.
+        """
+        if tick - self.__tick > _MAX_STEPPED_TICKS:
+            self.__advance_all(tick, on_due)
+            return
+
+        levels = self.__levels
+        while self.__tick < tick:
+            current = self.__tick + 1
+            self.__tick = current
+
+            if not current & _SLOT_MASK:
+                # the highest levels cascade first, as their items can move
+                # into the slots of lower levels that cascade in this tick.
+                for level in range(_LEVELS - 1, 0, -1):
+                    if current & ((1 << (_LEVEL_BITS * level)) - 1):
+                        continue
+                    if level == _LEVELS - 1 and self.__overflow:
+                        entries, self.__overflow = self.__overflow, []
+                        self.__reschedule(entries)
+                    slots = levels[level]
+                    index = (current >> (_LEVEL_BITS * level)) & _SLOT_MASK
+                    entries = slots[index]
+                    if entries:
+                        slots[index] = []
+                        self.__reschedule(entries)
+
+            slots = levels[0]
+            index = current & _SLOT_MASK
+            entries = slots[index]
+            if entries:
+                slots[index] = []
+                for deadline, item in entries:
+                    if deadline <= current:
+                        on_due(item)
+                    else:
+                        self.schedule(item, deadline)
+
+    def __reschedule(self, entries: List[Entry]) -> None:
+        # items due in the current tick go to its level 0 slot, which is
+        # visited after the cascade.
+        tick = self.__tick
+        current_slot = self.__levels[0][tick & _SLOT_MASK]
+        schedule = self.schedule
+        for deadline, item in entries:
+            if deadline <= tick:
+                current_slot.append((deadline, item))
+            else:
+                schedule(item, deadline)
+
+    def __advance_all(self,
+                      tick: int,
+                      on_due: Callable[[Hashable], None],
+                      ) -> None:
+        entries = self.__overflow
+        self.__overflow = []
+        for slots in self.__levels:
+            for index, slot in enumerate(slots):
+                if slot:
+                    entries.extend(slot)
+                    slots[index] = []
+
+        self.__tick = tick
+        for deadline, item in entries:
+            if deadline <= tick:
+                on_due(item)
+            else:
+                self.schedule(item, deadline)
+
+    def __len__(self) -> int:
+        """
+        The number of scheduled items. Counts all slots, so it is meant for
+        tests and diagnostics.
+        """
+        return len(self.__overflow) + sum(
+            len(slot) for slots in self.__levels for slot in slots)
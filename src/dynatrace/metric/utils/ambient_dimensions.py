@@ -0,0 +1,107 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from contextvars import ContextVar
+from typing import Mapping, Optional, Tuple
+
+from ._cache import BoundedCache
+from .dimension_set import DimensionSet
+
+# the ambient dimensions of the current context, or None outside of all
+# scopes.
+_ambient_dimensions: "ContextVar[Optional[DimensionSet]]" = ContextVar(
+    "dynatrace_metric_utils_ambient_dimensions", default=None)
+
+# maps (outer scope, dimensions of the inner scope) to the dimensions of the
+# inner scope, so entering the same nested scopes repeatedly does not merge
+# the dimensions again.
+_nested_scopes = BoundedCache()
+
+
+def _merge_scopes(scopes: Tuple[DimensionSet, DimensionSet]) -> DimensionSet:
+    outer, inner = scopes
+    merged = dict(outer.items_tuple)
+    merged.update(inner.items_tuple)
+    return DimensionSet._from_normalized(tuple(merged.items()))
+
+
+def current_ambient_dimensions() -> Optional[DimensionSet]:
+    """
+    Get the ambient dimensions of the current context.
+    :return: A :class:`DimensionSet`, or None outside of all scopes.
+    """
+    return _ambient_dimensions.get()
+
+
+class AmbientDimensions:
+    """
+    A scope of dimensions that serializers add to all metrics serialized in
+    the current context, e.g. the tenant, region or route of the request
+    being handled. Enter the scope with a with statement:
+
+        with AmbientDimensions({"tenant": tenant, "route": route}):
+            handle_request()
+
+    The scope is stored in a context variable, so it applies to the current
+    thread or asyncio task (and to tasks created while it is active), but
+    not to other threads or tasks. Scopes can be nested; dimensions of inner
+    scopes overwrite dimensions of outer scopes with the same key.
+
+    Ambient dimensions overwrite the default dimensions of a serializer and
+    are overwritten by the metric dimensions and the serializer-specific
+    (static) dimensions. Serializers cache the merged dimensions per scope,
+    so ambient dimensions do not add normalization or merging work per
+    metric line.
+
+    A scope object can be entered once at a time; create a new one for
+    every with statement.
+    """
+    __slots__ = ("__dimensions", "__token")
+
+    def __init__(self, dimensions: Optional[Mapping[str, str]]) -> None:
+        """
+        :param dimensions: The dimensions of the scope. They are normalized
+         once, when the scope is created.
+        """
+        self.__dimensions = DimensionSet(dimensions)
+        self.__token = None
+
+    @property
+    def dimensions(self) -> DimensionSet:
+        """
+        The dimensions of this scope, without the dimensions of outer scopes.
+        """
+        return self.__dimensions
+
+    def __enter__(self) -> DimensionSet:
+        if self.__token is not None:
+            raise RuntimeError("The scope is already entered.")
+
+        outer = _ambient_dimensions.get()
+        dimensions = self.__dimensions
+        if outer is not None:
+            if dimensions:
+                dimensions = _nested_scopes.get_or_compute(
+                    (outer, dimensions), _merge_scopes)
+            else:
+                dimensions = outer
+        elif not dimensions:
+            dimensions = None
+
+        self.__token = _ambient_dimensions.set(dimensions)
+        return dimensions if dimensions is not None else DimensionSet()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        _ambient_dimensions.reset(self.__token)
+        self.__token = None
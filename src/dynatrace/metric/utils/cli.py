@@ -0,0 +1,443 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Serialize metric records from CSV or JSON Lines files into metric payloads.
+
+CSV files need a header row. The "name" column holds the metric name, the
+"value" column the value (or "min", "max", "sum" and "count" for summaries),
+the optional "type" column the metric type ("gauge", "count" or "summary")
+and the optional "timestamp" column the timestamp in milliseconds. All other
+columns are dimensions; empty cells are left out.
+
+JSON Lines files hold one object per line with the same keys, and the
+dimensions in a "dimensions" object. Numbers and booleans in it are used as
+dimension values in their JSON notation:
+
+    {"name": "cpu", "value": 0.5, "dimensions": {"host": "a", "core": 1}}
+
+The payloads are written to stdout, to a file, to one file per payload or
+posted to a metrics ingest endpoint:
+
+    dynatrace-metrics backfill.csv --endpoint \\
+        https://{env}.live.dynatrace.com/api/v2/metrics/ingest
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+from typing import Any, Iterable, Iterator, List, Mapping, Optional, \
+    Sequence, TextIO, Tuple
+
+from ._cache import BoundedCache
+from ._export import post_payload
+from ._metric import Metric
+from ._payload import chunk_lines
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_api_constants import DynatraceMetricsApiConstants
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+
+_RESERVED_COLUMNS = frozenset(
+    ("name", "type", "value", "min", "max", "sum", "count", "timestamp"))
+
+# the number of records sent to a worker process at a time.
+_CHUNK_SIZE = 10_000
+
+# a chunk of records: the header of a CSV file and its rows, or None and
+# lines of a JSON Lines file.
+_Chunk = Tuple[Optional[List[str]], List[Any]]
+
+# the converter of a worker process, created once by the pool initializer.
+_worker_converter: Optional["_RecordConverter"] = None
+
+
+def _initialize_worker(config, default_type: str) -> None:
+    global _worker_converter
+    _worker_converter = _RecordConverter(
+        DynatraceMetricsSerializer._from_config(config), default_type)
+
+
+def _convert_chunk(chunk: _Chunk) -> Tuple[List[str], int]:
+    return _worker_converter.convert(chunk)
+
+
+def _parse_number(value: Any):
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    raise ValueError("Not a number: {!r}".format(value))
+
+
+def _dimension_value(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    raise ValueError("Not a dimension value: {!r}".format(value))
+
+
+def _dimension_set(items: Tuple[Tuple[str, str], ...]) -> DimensionSet:
+    return DimensionSet(dict(items))
+
+
+class _RecordConverter:
+    """
+    Creates metric lines from parsed CSV rows or JSON Lines.
+    """
+
+    def __init__(self,
+                 serializer: DynatraceMetricsSerializer,
+                 default_type: str,
+                 ) -> None:
+        self.__serializer = serializer
+        self.__factory = DynatraceMetricsFactory()
+        self.__default_type = default_type
+        # backfills repeat the same dimensions many times. Keeping their
+        # DimensionSets lets the serializer reuse the serialized dimensions.
+        self.__dimension_sets = BoundedCache()
+
+    def convert(self, chunk: _Chunk) -> Tuple[List[str], int]:
+        """
+        Convert a chunk of records.
+        :return: The metric lines and the number of invalid records.
+        """
+        header, records = chunk
+        lines = []
+        append = lines.append
+        serialize = self.__serializer.serialize
+        invalid = 0
+        for record in records:
+            try:
+                if header is None:
+                    record = json.loads(record)
+                    if not isinstance(record, dict):
+                        raise ValueError("Not an object")
+                    dimensions = record.get("dimensions")
+                    if dimensions is not None:
+                        if not isinstance(dimensions, dict):
+                            raise ValueError("Dimensions are not an object")
+                        dimensions = {
+                            key: _dimension_value(value)
+                            for key, value in dimensions.items()}
+                else:
+                    record = dict(zip(header, record))
+                    dimensions = {key: value for key, value in record.items()
+                                  if key not in _RESERVED_COLUMNS and value}
+                if dimensions:
+                    dimensions = self.__dimension_sets.get_or_compute(
+                        tuple(dimensions.items()), _dimension_set)
+                append(serialize(self.__create_metric(record, dimensions)))
+            except (MetricError, ValueError, KeyError, TypeError):
+                invalid += 1
+        return lines, invalid
+
+    def __create_metric(self,
+                        record: Mapping[str, Any],
+                        dimensions: Optional[Mapping[str, str]],
+                        ) -> Metric:
+        name = record["name"]
+        metric_type = record.get("type") or self.__default_type
+        timestamp = record.get("timestamp")
+        timestamp = _parse_number(timestamp) if timestamp else None
+        factory = self.__factory
+
+        if metric_type == "summary":
+            values = [_parse_number(record[key])
+                      for key in ("min", "max", "sum")]
+            count = _parse_number(record["count"])
+            if all(isinstance(value, int) for value in values):
+                return factory.create_int_summary(name, *values, count,
+                                                  dimensions, timestamp)
+            return factory.create_float_summary(name, *values, count,
+                                                dimensions, timestamp)
+
+        value = _parse_number(record["value"])
+        if metric_type == "gauge":
+            if isinstance(value, int):
+                return factory.create_int_gauge(name, value, dimensions,
+                                                timestamp)
+            return factory.create_float_gauge(name, value, dimensions,
+                                              timestamp)
+        if metric_type == "count":
+            if isinstance(value, int):
+                return factory.create_int_counter_delta(
+                    name, value, dimensions, timestamp)
+            return factory.create_float_counter_delta(
+                name, value, dimensions, timestamp)
+        raise ValueError("Unsupported metric type: {!r}".format(metric_type))
+
+
+def _read_chunks(stream: TextIO,
+                 input_format: str,
+                 chunk_size: int = _CHUNK_SIZE,
+                 ) -> Iterator[_Chunk]:
+    if input_format == "csv":
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [column.strip() for column in header]
+        records: Iterator[Any] = reader
+    else:
+        header = None
+        records = (line for line in stream if line.strip())
+
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield header, chunk
+
+
+def _detect_format(path: str) -> str:
+    return "jsonl" if path.endswith((".jsonl", ".json", ".ndjson")) \
+        else "csv"
+
+
+def _open_input(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8",
+                                newline="")
+    return open(path, encoding="utf-8", newline="",
+                buffering=1024 * 1024)
+
+
+def _convert_serial(converter: _RecordConverter,
+                    chunks: Iterable[_Chunk],
+                    ) -> Iterator[Tuple[List[str], int]]:
+    for chunk in chunks:
+        yield converter.convert(chunk)
+
+
+def _convert_parallel(serializer: DynatraceMetricsSerializer,
+                      default_type: str,
+                      workers: int,
+                      chunks: Iterable[_Chunk],
+                      ) -> Iterator[Tuple[List[str], int]]:
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+
+    with ProcessPoolExecutor(
+            workers, initializer=_initialize_worker,
+            initargs=(serializer._get_config(), default_type)) as executor:
+        # a few chunks per worker are in flight, which keeps the workers
+        # busy and bounds the memory use. The results are returned in the
+        # order of the input.
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_convert_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _PayloadWriter:
+    """
+    Writes payloads to a file, a directory (one file per payload) or an
+    endpoint.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.__args = args
+        self.__output: Optional[TextIO] = None
+        self.__payloads = 0
+        self.failed = 0
+
+    def write(self, payload: str) -> None:
+        args = self.__args
+        if args.endpoint:
+            try:
+                status = post_payload(args.endpoint, payload,
+                                      args.api_token, args.timeout)
+            except OSError as err:
+                logging.getLogger(__name__).error(
+                    "Could not send payload %d: %s", self.__payloads, err)
+                status = None
+            if status is not None and not 200 <= status < 300:
+                logging.getLogger(__name__).error(
+                    "Payload %d was rejected with status %d", self.__payloads,
+                    status)
+            if status is None or not 200 <= status < 300:
+                self.failed += 1
+        elif args.output_dir:
+            path = os.path.join(args.output_dir,
+                                "payload-{:08d}.txt".format(self.__payloads))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(payload)
+                f.write("\n")
+        else:
+            if self.__output is None:
+                self.__output = sys.stdout if args.output == "-" else open(
+                    args.output, "w", encoding="utf-8",
+                    buffering=1024 * 1024)
+            self.__output.write(payload)
+            self.__output.write("\n")
+        self.__payloads += 1
+
+    def close(self) -> None:
+        if self.__output is not None:
+            self.__output.flush()
+            if self.__output is not sys.stdout:
+                self.__output.close()
+
+
+def _dimension(value: str) -> Tuple[str, str]:
+    key, separator, dimension_value = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(
+            "Expected key=value, got {!r}".format(value))
+    return key, dimension_value
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "Expected a positive integer, got {!r}".format(value))
+    return number
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="dynatrace-metrics", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=["-"],
+                        help="CSV or JSON Lines files, or - for stdin "
+                             "(default)")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="the input format. Defaults to jsonl for "
+                             ".jsonl, .json and .ndjson files and csv "
+                             "otherwise")
+    parser.add_argument("--type", default="gauge", dest="default_type",
+                        choices=("gauge", "count", "summary"),
+                        help="the type of records without a type")
+    parser.add_argument("--prefix", help="a prefix for all metric keys")
+    parser.add_argument("--dimension", type=_dimension, action="append",
+                        default=[], metavar="KEY=VALUE",
+                        help="a default dimension for all metrics")
+    parser.add_argument("--metadata", action="store_true",
+                        help="add the Dynatrace metadata dimensions of "
+                             "this host")
+    parser.add_argument("--metrics-source",
+                        help="the value of the dt.metrics.source dimension")
+    parser.add_argument("--lines-per-payload", type=_positive_int,
+                        default=DynatraceMetricsApiConstants
+                        .payload_lines_limit())
+    parser.add_argument("--workers", type=_positive_int, default=1,
+                        help="the number of worker processes")
+
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--output", "-o", default="-",
+                        help="the file to write the payloads to, or - for "
+                             "stdout (default)")
+    output.add_argument("--output-dir",
+                        help="a directory to write one file per payload to")
+    output.add_argument("--endpoint",
+                        help="an endpoint to post the payloads to")
+    parser.add_argument("--api-token",
+                        default=os.environ.get("DT_API_TOKEN"),
+                        help="the API token for the endpoint. Defaults to "
+                             "the DT_API_TOKEN environment variable")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="the timeout of requests, in seconds")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Run the command line interface.
+    :param argv: The arguments. Defaults to the arguments of the process.
+    :return: The exit code: 1 if payloads could not be sent to the
+     endpoint, 0 otherwise. Invalid records are skipped and counted. Exits
+     with code 2 on invalid arguments, unreadable or malformed input files
+     and invalid endpoint URLs.
+    """
+    parser = _create_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    serializer = DynatraceMetricsSerializer(
+        None, args.prefix, dict(args.dimension),
+        enrich_with_dynatrace_metadata=args.metadata,
+        metrics_source=args.metrics_source)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def chunks() -> Iterator[_Chunk]:
+        for path in args.inputs:
+            input_format = args.format or _detect_format(path)
+            stream = _open_input(path)
+            try:
+                yield from _read_chunks(stream, input_format)
+            except (csv.Error, UnicodeDecodeError) as err:
+                raise ValueError("{}: {}".format(path, err)) from err
+            finally:
+                if path == "-":
+                    # keep sys.stdin open.
+                    stream.detach()
+                else:
+                    stream.close()
+
+    if args.workers > 1:
+        results = _convert_parallel(serializer, args.default_type,
+                                    args.workers, chunks())
+    else:
+        results = _convert_serial(
+            _RecordConverter(serializer, args.default_type), chunks())
+
+    invalid = 0
+
+    def lines() -> Iterator[str]:
+        nonlocal invalid
+        for chunk_lines_, chunk_invalid in results:
+            invalid += chunk_invalid
+            yield from chunk_lines_
+
+    writer = _PayloadWriter(args)
+    try:
+        for payload in chunk_lines(lines(), args.lines_per_payload):
+            writer.write(payload)
+    except (OSError, ValueError) as err:
+        # e.g. a missing input file, a malformed CSV file or an invalid
+        # endpoint URL.
+        parser.error(str(err))
+    finally:
+        writer.close()
+
+    if invalid:
+        logger.warning("Skipped %d invalid records.", invalid)
+    if writer.failed:
+        logger.error("%d payloads could not be sent.", writer.failed)
+    return 1 if writer.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
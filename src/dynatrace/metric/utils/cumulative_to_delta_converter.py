@@ -0,0 +1,160 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple, Union
+
+from ._metric import Metric
+from ._metric_values import _raise_if_nan_or_inf
+from ._snapshot import read_snapshot, write_snapshot
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .series_expiry import SeriesExpiry
+
+SeriesKey = Tuple[str, DimensionSet]
+
+
+class CumulativeToDeltaConverter:
+    """
+    Converts monotonic cumulative counters, as exposed by e.g. psutil or
+    /proc, into delta counters. The last value of every series (metric name
+    and dimensions) is remembered, and each new value is exported as the
+    difference to it. A value smaller than the previous one means that the
+    counter was reset, in which case the value itself is exported as the
+    delta, as the counter started again from zero.
+
+    Series that have not been updated for the series timeout are forgotten,
+    so the memory used stays bounded with many short-lived series. The first
+    value of a new (or forgotten) series only initializes the series and
+    does not produce a metric.
+    """
+    DEFAULT_SERIES_TIMEOUT_SECONDS = 600.0
+
+    def __init__(self,
+                 factory: Optional[DynatraceMetricsFactory] = None,
+                 series_timeout: float = DEFAULT_SERIES_TIMEOUT_SECONDS,
+                 logger: Optional[logging.Logger] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 expiry: Optional[SeriesExpiry] = None,
+                 ) -> None:
+        """
+        :param factory: An optional factory used to create the metrics.
+        :param series_timeout: The number of seconds after which a series
+         that has not been updated is forgotten.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the class.
+        :param clock: A function returning the current time in seconds, used
+         to expire series. Defaults to time.monotonic. Ignored if an expiry
+         is passed.
+        :param expiry: An optional :class:`SeriesExpiry` shared with other
+         structures. By default, the converter has its own.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__factory = factory if factory else DynatraceMetricsFactory()
+        self.__lock = threading.Lock()
+        # only the last value is stored per series. The DimensionSets in the
+        # keys are interned and shared between series.
+        self.__last_values: Dict[SeriesKey, Union[int, float]] = {}
+        if expiry is None:
+            expiry = SeriesExpiry(series_timeout / 60, clock)
+        self.__expiry = expiry.tracker(series_timeout)
+
+    def convert(self,
+                metric_name: str,
+                value: Union[int, float],
+                dimensions: Optional[Mapping[str, str]] = None,
+                timestamp: Optional[float] = None,
+                ) -> Optional[Metric]:
+        """
+        Record the current value of a cumulative counter and create a delta
+        counter metric from it.
+        :param metric_name: The name of the metric.
+        :param value: The current, cumulative value of the counter.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions identifying the series.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds).
+        :return: A delta counter :class:`Metric`, or None if this is the
+         first value of the series.
+        """
+        _raise_if_nan_or_inf(value)
+        dimension_set = DimensionSet(dimensions)
+        key = (metric_name, dimension_set)
+
+        with self.__lock:
+            expiry = self.__expiry
+            last_values = self.__last_values
+            for expired in expiry.expired():
+                del last_values[expired]
+
+            previous = last_values.get(key)
+            last_values[key] = value
+            expiry.touch(key)
+
+        if previous is None:
+            return None
+
+        if value >= previous:
+            delta = value - previous
+        else:
+            self.__logger.debug("counter %s (%s) was reset", metric_name,
+                                dimension_set)
+            delta = value
+
+        if isinstance(delta, int):
+            return self.__factory.create_int_counter_delta(
+                metric_name, delta, dimension_set, timestamp)
+        return self.__factory.create_float_counter_delta(
+            metric_name, delta, dimension_set, timestamp)
+
+    def save_snapshot(self, path: str) -> int:
+        """
+        Write the last values of all series to a snapshot file, e.g. on
+        shutdown, so the next process can continue to compute deltas after
+        restoring them with :meth:`restore_snapshot`.
+        :param path: The path of the snapshot file.
+        :return: The number of series in the snapshot.
+        """
+        with self.__lock:
+            last_values = dict(self.__last_values)
+        write_snapshot(path, last_values, {})
+        return len(last_values)
+
+    def restore_snapshot(self, path: str) -> int:
+        """
+        Restore the last values of the series in a snapshot written by
+        :meth:`save_snapshot`. Restored series expire like series that were
+        just updated.
+        :param path: The path of the snapshot file.
+        :return: The number of series in the snapshot.
+        :raises SnapshotError: If the snapshot is truncated, corrupted or
+         has an unsupported version.
+        :raises OSError: If the file cannot be read.
+        """
+        last_values, _ = read_snapshot(path)
+        with self.__lock:
+            for expired in self.__expiry.expired():
+                del self.__last_values[expired]
+            self.__last_values.update(last_values)
+            touch = self.__expiry.touch
+            for key in last_values:
+                touch(key)
+        return len(last_values)
+
+    def __len__(self) -> int:
+        """
+        The number of series that are currently tracked.
+        """
+        return len(self.__last_values)
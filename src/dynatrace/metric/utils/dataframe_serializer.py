@@ -0,0 +1,385 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import itertools
+import logging
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple, Union
+
+from ._metric_values import _format_number
+from ._payload import chunk_lines
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+
+# timestamps between the year 2000 and 3000, like in Metric.
+_MIN_TIMESTAMP = 946681200000
+_MAX_TIMESTAMP = 32503676400000
+
+# the part of the metric line between the dimensions and the value.
+_TYPE_SEPARATORS = {
+    "gauge": " gauge,",
+    "count": " count,delta=",
+}
+
+
+def _numpy():
+    """
+    Get the numpy module, or None if it is not installed. numpy is only used
+    to speed up the conversion of numpy arrays and pandas columns.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _column(data: Any, name: str) -> Any:
+    column = data[name]
+    # pandas Series
+    to_numpy = getattr(column, "to_numpy", None)
+    return to_numpy() if to_numpy is not None else column
+
+
+def _is_numeric_array(numpy, column: Any) -> bool:
+    return (numpy is not None and isinstance(column, numpy.ndarray)
+            and column.dtype.kind in "iuf")
+
+
+def _to_list(column: Any) -> List[Any]:
+    to_list = getattr(column, "tolist", None)
+    return to_list() if to_list is not None else list(column)
+
+
+def _format_values(column: Any) -> List[Optional[str]]:
+    """
+    Format a column of values. Values that are not finite numbers are None.
+    """
+    numpy = _numpy()
+    if _is_numeric_array(numpy, column):
+        if column.dtype.kind in "iu":
+            return [_format_number(value) for value in column.tolist()]
+        finite = numpy.isfinite(column)
+        if finite.all():
+            return [_format_number(value) for value in column.tolist()]
+        return [_format_number(value) if valid else None
+                for value, valid in zip(numpy.where(finite, column,
+                                                    0).tolist(),
+                                        finite.tolist())]
+
+    formatted = []
+    append = formatted.append
+    for value in _to_list(column):
+        value_type = type(value)
+        if value_type is int or (value_type is float
+                                 and math.isfinite(value)):
+            append(_format_number(value))
+        elif (isinstance(value, (int, float)) and not isinstance(value, bool)
+              and math.isfinite(value)):
+            # e.g. numpy scalars in an object column.
+            append(_format_number(float(value)))
+        else:
+            append(None)
+    return formatted
+
+
+def _format_timestamps(column: Any) -> List[Optional[str]]:
+    """
+    Format a column of timestamps (Unix time in milliseconds, or datetime
+    values) as the timestamp suffix of metric lines. Invalid timestamps are
+    None.
+    """
+    numpy = _numpy()
+    if numpy is not None and isinstance(column, numpy.ndarray) and \
+            column.dtype.kind in "iufM":
+        if column.dtype.kind == "M":
+            # NaT becomes the smallest int64, which is out of range.
+            milliseconds = column.astype("datetime64[ms]").astype(numpy.int64)
+        else:
+            valid = numpy.isfinite(column)
+            milliseconds = numpy.round(numpy.where(valid, column, 0)).astype(
+                numpy.int64)
+            milliseconds[~valid] = 0
+        valid = (milliseconds >= _MIN_TIMESTAMP) & (
+            milliseconds < _MAX_TIMESTAMP)
+        return [" " + str(value) if ok else None
+                for value, ok in zip(milliseconds.tolist(), valid.tolist())]
+
+    formatted = []
+    append = formatted.append
+    for value in _to_list(column):
+        if hasattr(value, "timestamp"):
+            # datetime or pandas Timestamp. Naive datetimes are local time.
+            try:
+                value = value.timestamp() * 1000
+            except ValueError:
+                # pandas NaT
+                append(None)
+                continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                and math.isfinite(value):
+            value = int(round(value))
+            if _MIN_TIMESTAMP <= value < _MAX_TIMESTAMP:
+                append(" " + str(value))
+                continue
+        append(None)
+    return formatted
+
+
+class DataFrameSerializer:
+    """
+    Serializes tabular data, e.g. a pandas DataFrame or a dictionary of
+    lists or numpy arrays, into metric lines, without creating a
+    :class:`Metric` per value. Every row becomes one metric line per value
+    column:
+
+        serializer = DataFrameSerializer()
+        for payload in serializer.serialize_payloads(
+                df, ["latency"], name="analytics.latency",
+                dimension_columns=["region", "route"],
+                timestamp_column="time"):
+            send(payload)
+
+    Values and timestamps are validated per column (with numpy, if it is
+    installed and the columns are numpy arrays or pandas columns), and then
+    formatted one value at a time. The metric key and dimensions are
+    normalized and merged with the default and static dimensions of the
+    serializer once per distinct combination of metric name and dimension
+    values, so the lines are the same as the lines created by the serializer
+    for single metrics. Rows with invalid values or timestamps are dropped.
+
+    Self-monitoring and profiling hooks of the serializer only observe one
+    metric per distinct combination of metric name and dimension values.
+    """
+
+    def __init__(self,
+                 serializer: Optional[DynatraceMetricsSerializer] = None,
+                 logger: Optional[logging.Logger] = None,
+                 ) -> None:
+        """
+        :param serializer: The serializer whose configuration (prefix,
+         default dimensions, ...) is used for the metric lines. Defaults to
+         a serializer with the Dynatrace metadata enrichment.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__serializer = serializer if serializer else \
+            DynatraceMetricsSerializer(self.__logger.getChild(
+                DynatraceMetricsSerializer.__name__))
+        self.__factory = DynatraceMetricsFactory()
+
+    def serialize_lines(self,
+                        data: Any,
+                        value_columns: Sequence[str],
+                        name: Optional[str] = None,
+                        name_column: Optional[str] = None,
+                        dimension_columns: Sequence[str] = (),
+                        timestamp_column: Optional[str] = None,
+                        metric_type: str = "gauge",
+                        ) -> Iterator[str]:
+        """
+        Serialize the rows of a table into metric lines.
+        :param data: A pandas DataFrame or a mapping of column names to
+         lists or numpy arrays of the same length.
+        :param value_columns: The columns holding the metric values.
+        :param name: The metric name. With several value columns, the name
+         of the value column is appended to it ("name.column").
+        :param name_column: A column holding the metric name of each row,
+         instead of a fixed name. If neither a name nor a name column is
+         specified, the name of the value column is the metric name.
+        :param dimension_columns: The columns holding dimension values. The
+         column names are the dimension keys. Empty (None or NaN) values are
+         left out.
+        :param timestamp_column: An optional column holding the timestamps,
+         either as Unix time in milliseconds or as datetime values.
+        :param metric_type: "gauge" for gauges or "count" for delta
+         counters.
+        :return: An iterator over the metric lines, row by row.
+        """
+        type_separator = _TYPE_SEPARATORS.get(metric_type)
+        if type_separator is None:
+            raise ValueError("Unsupported metric type: {!r}".format(
+                metric_type))
+        if not value_columns:
+            raise ValueError("At least one value column is required.")
+        if name is not None and name_column is not None:
+            raise ValueError("Specify either a name or a name column.")
+
+        values = [_format_values(_column(data, column))
+                  for column in value_columns]
+        rows = len(values[0])
+
+        if name_column is not None:
+            names: Iterable[Any] = _to_list(_column(data, name_column))
+        else:
+            names = itertools.repeat(name, rows)
+        if dimension_columns:
+            dimension_rows: Iterable[Tuple[Any, ...]] = zip(
+                *(_to_list(_column(data, column))
+                  for column in dimension_columns))
+        else:
+            dimension_rows = itertools.repeat((), rows)
+        if timestamp_column is not None:
+            timestamps: Iterable[Optional[str]] = _format_timestamps(
+                _column(data, timestamp_column))
+        else:
+            timestamps = itertools.repeat("", rows)
+
+        # the metric key and dimensions of the lines, per metric name, value
+        # column and dimension values.
+        heads: Dict[Tuple[Any, int, Tuple[Any, ...]], Optional[str]] = {}
+        columns = range(len(value_columns))
+        max_length = DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH
+        dropped = 0
+
+        for row_name, dimension_values, timestamp, *row_values in zip(
+                names, dimension_rows, timestamps, *values):
+            if timestamp is None:
+                dropped += len(row_values)
+                continue
+
+            for column, value in zip(columns, row_values):
+                if value is None:
+                    dropped += 1
+                    continue
+
+                key = (row_name, column, dimension_values)
+                try:
+                    head = heads[key]
+                except KeyError:
+                    head = heads[key] = self.__head(
+                        row_name, value_columns, column, dimension_columns,
+                        dimension_values, name_column is not None)
+                if head is None:
+                    dropped += 1
+                    continue
+
+                line = head + type_separator + value + timestamp
+                if len(line) > max_length:
+                    # rejected or shortened by the serializer.
+                    line = self.__serialize_long_line(
+                        head, metric_type, value, timestamp, key,
+                        value_columns, dimension_columns)
+                    if line is None:
+                        dropped += 1
+                        continue
+                yield line
+
+        if dropped:
+            self.__logger.warning("Dropped %d values that could not be "
+                                  "serialized.", dropped)
+
+    def serialize_payloads(self,
+                           data: Any,
+                           value_columns: Sequence[str],
+                           name: Optional[str] = None,
+                           name_column: Optional[str] = None,
+                           dimension_columns: Sequence[str] = (),
+                           timestamp_column: Optional[str] = None,
+                           metric_type: str = "gauge",
+                           lines_limit: Optional[int] = None,
+                           ) -> Iterator[str]:
+        """
+        Serialize the rows of a table into payloads for the metrics API.
+        The parameters are the same as for :meth:`serialize_lines`.
+        :param lines_limit: The maximum number of lines per payload. Defaults
+         to the payload_lines_limit() of the metrics API.
+        :return: An iterator over the payloads. At most one payload is held
+         in memory at a time, in addition to the formatted columns.
+        """
+        return chunk_lines(self.serialize_lines(
+            data, value_columns, name, name_column, dimension_columns,
+            timestamp_column, metric_type), lines_limit)
+
+    def __metric_name(self,
+                      row_name: Any,
+                      value_columns: Sequence[str],
+                      column: int,
+                      ) -> str:
+        if row_name is None:
+            return value_columns[column]
+        if len(value_columns) > 1:
+            return "{}.{}".format(row_name, value_columns[column])
+        return str(row_name)
+
+    def __metric(self,
+                 key: Tuple[Any, int, Tuple[Any, ...]],
+                 value: Union[int, float],
+                 value_columns: Sequence[str],
+                 dimension_columns: Sequence[str],
+                 metric_type: str = "gauge",
+                 timestamp: Optional[int] = None,
+                 ):
+        row_name, column, dimension_values = key
+        dimensions = {}
+        for dimension_key, dimension_value in zip(dimension_columns,
+                                                  dimension_values):
+            if dimension_value is None or (
+                    isinstance(dimension_value, float)
+                    and math.isnan(dimension_value)):
+                continue
+            dimensions[dimension_key] = str(dimension_value)
+
+        metric_name = self.__metric_name(row_name, value_columns, column)
+        if metric_type == "count":
+            return self.__factory.create_float_counter_delta(
+                metric_name, value, dimensions, timestamp)
+        return self.__factory.create_float_gauge(metric_name, value,
+                                                 dimensions, timestamp)
+
+    def __head(self,
+               row_name: Any,
+               value_columns: Sequence[str],
+               column: int,
+               dimension_columns: Sequence[str],
+               dimension_values: Tuple[Any, ...],
+               has_name_column: bool,
+               ) -> Optional[str]:
+        """
+        Create the metric key and dimensions of the lines of a series, by
+        serializing a gauge of the series.
+        """
+        if has_name_column and row_name is None:
+            return None
+        try:
+            line = self.__serializer.serialize(self.__metric(
+                (row_name, column, dimension_values), 0, value_columns,
+                dimension_columns))
+        except MetricError as err:
+            self.__logger.debug("Could not serialize %s: %s",
+                                row_name or value_columns[column], err)
+            return None
+        # dimension values cannot contain an unescaped " gauge,".
+        return line[:line.rindex(" gauge,")]
+
+    def __serialize_long_line(self,
+                              head: str,
+                              metric_type: str,
+                              value: str,
+                              timestamp: str,
+                              key: Tuple[Any, int, Tuple[Any, ...]],
+                              value_columns: Sequence[str],
+                              dimension_columns: Sequence[str],
+                              ) -> Optional[str]:
+        try:
+            return self.__serializer.serialize(self.__metric(
+                key, float(value), value_columns, dimension_columns,
+                metric_type, int(timestamp) if timestamp else None))
+        except MetricError as err:
+            self.__logger.debug("Could not serialize %s: %s", head, err)
+            return None
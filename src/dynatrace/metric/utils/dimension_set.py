@@ -0,0 +1,144 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+import weakref
+from collections.abc import Mapping as MappingABC
+from typing import Iterator, Mapping, Optional, Tuple
+
+from ._normalize import Normalize
+
+_normalize = Normalize()
+
+DimensionItems = Tuple[Tuple[str, str], ...]
+
+
+class DimensionSet(MappingABC):
+    """
+    An immutable, normalized set of dimensions. Dimension sets are interned:
+    creating a DimensionSet from dimensions that were seen before in the same
+    order returns the existing instance, so all metrics using the same
+    dimensions share one object. Sets with the same dimensions in a different
+    order are separate instances, which keep their order when they are
+    serialized, but are equal and have the same hash (so they are one series
+    when metrics are aggregated). The keys and values are normalized
+    once, when the set is created, and the hash and the escaped
+    "key=value,..." representation used in metric lines are computed only
+    once.
+
+    A DimensionSet can be passed anywhere dimensions are accepted, e.g. to
+    the create_* methods of the :class:`DynatraceMetricsFactory`.
+    """
+    __slots__ = ("__items", "__dimensions", "__hash", "__fragment",
+                 "__weakref__")
+
+    __lock = threading.Lock()
+    # maps normalized items to the instance.
+    __interned: "weakref.WeakValueDictionary[DimensionItems, DimensionSet]" \
+        = weakref.WeakValueDictionary()
+    # maps the items passed by the user to the instance, which avoids
+    # normalizing dimensions that have been seen before.
+    __by_input: "weakref.WeakValueDictionary[DimensionItems, DimensionSet]" \
+        = weakref.WeakValueDictionary()
+
+    def __new__(cls,
+                dimensions: Optional[Mapping[str, str]] = None,
+                ) -> "DimensionSet":
+        if isinstance(dimensions, DimensionSet):
+            return dimensions
+
+        input_items = tuple(dimensions.items()) if dimensions else ()
+        try:
+            existing = cls.__by_input.get(input_items)
+        except TypeError:
+            # unhashable values are rejected by the normalization below.
+            existing = None
+            input_items = None
+        if existing is not None:
+            return existing
+
+        normalized = _normalize.normalize_dimensions(
+            dimensions if dimensions else {})
+        instance = cls._from_normalized(tuple(normalized.items()))
+        if input_items is not None:
+            cls.__by_input[input_items] = instance
+        return instance
+
+    @classmethod
+    def _from_normalized(cls, items: DimensionItems) -> "DimensionSet":
+        """
+        Get the interned instance for already normalized items.
+        """
+        instance = cls.__interned.get(items)
+        if instance is not None:
+            return instance
+
+        with cls.__lock:
+            instance = cls.__interned.get(items)
+            if instance is None:
+                instance = object.__new__(cls)
+                instance.__items = items
+                instance.__dimensions = dict(items)
+                # the hash does not depend on the order of the dimensions,
+                # to be consistent with the equality of mappings.
+                instance.__hash = hash(frozenset(items))
+                instance.__fragment = ",".join(
+                    "{}={}".format(k, _normalize.escape_dimension_value(v))
+                    for k, v in items)
+                cls.__interned[items] = instance
+        return instance
+
+    def __reduce__(self):
+        return DimensionSet._from_normalized, (self.__items,)
+
+    def __getitem__(self, key: str) -> str:
+        return self.__dimensions[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__dimensions)
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__dimensions
+
+    def __hash__(self) -> int:
+        return self.__hash
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, DimensionSet):
+            return (self.__hash == other.__hash
+                    and self.__dimensions == other.__dimensions)
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        return "DimensionSet({!r})".format(self.__dimensions)
+
+    @property
+    def items_tuple(self) -> DimensionItems:
+        """
+        The normalized dimensions as a tuple of (key, value) pairs.
+        """
+        return self.__items
+
+    @property
+    def serialized(self) -> str:
+        """
+        The escaped, comma-separated "key=value" pairs as they appear in a
+        metric line.
+        """
+        return self.__fragment
@@ -0,0 +1,172 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import itertools
+import logging
+import math
+import os
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from ._metric import Metric
+from ._payload import chunk_lines
+from .ambient_dimensions import _ambient_dimensions
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_api_constants import DynatraceMetricsApiConstants
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# the serializer of a worker process, created once by the pool initializer.
+_worker_serializer: Optional[DynatraceMetricsSerializer] = None
+
+
+def _initialize_worker(config) -> None:
+    global _worker_serializer
+    _worker_serializer = DynatraceMetricsSerializer._from_config(config)
+
+
+def _serialize_chunk(metrics: Sequence[Metric],
+                     ambient_dimensions: Optional[DimensionSet],
+                     ) -> Tuple[List[str], int]:
+    # the ambient dimensions of the context that submitted the batch.
+    token = _ambient_dimensions.set(ambient_dimensions)
+    try:
+        return _serialize_all(_worker_serializer, metrics)
+    finally:
+        _ambient_dimensions.reset(token)
+
+
+def _serialize_all(serializer: DynatraceMetricsSerializer,
+                   metrics: Sequence[Metric],
+                   ) -> Tuple[List[str], int]:
+    lines = []
+    append = lines.append
+    serialize = serializer.serialize
+    dropped = 0
+    for metric in metrics:
+        try:
+            append(serialize(metric))
+        except MetricError:
+            dropped += 1
+    return lines, dropped
+
+
+class DynatraceMetricsBatchSerializer:
+    """
+    Serializes large batches of :class:`Metric` objects into payloads,
+    distributing the work across a pool of worker processes. The
+    configuration of the wrapped serializer is sent to every worker once,
+    when the pool is started. Batches smaller than the parallel threshold
+    are serialized in the current process, where the overhead of sending
+    metrics to other processes would outweigh the gain.
+
+    Metrics that cannot be serialized are dropped and logged. Profiling
+    hooks and self-monitoring of the wrapped serializer only apply to
+    batches serialized in the current process.
+    """
+    DEFAULT_PARALLEL_THRESHOLD = 20_000
+
+    def __init__(self,
+                 serializer: DynatraceMetricsSerializer,
+                 max_workers: Optional[int] = None,
+                 parallel_threshold: int = DEFAULT_PARALLEL_THRESHOLD,
+                 logger: Optional[logging.Logger] = None,
+                 ) -> None:
+        """
+        :param serializer: The serializer used to create metric lines.
+        :param max_workers: The number of worker processes. Defaults to the
+         number of CPUs.
+        :param parallel_threshold: The minimum number of metrics in a batch
+         for the batch to be serialized in parallel.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the class.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__serializer = serializer
+        self.__max_workers = max_workers or os.cpu_count() or 1
+        self.__parallel_threshold = parallel_threshold
+        self.__executor: Optional["ProcessPoolExecutor"] = None
+
+    def serialize_lines(self, metrics: Sequence[Metric]) -> List[str]:
+        """
+        Serialize all metrics, keeping their order.
+        :param metrics: The metrics to serialize.
+        :return: The metric lines of all metrics that could be serialized.
+        """
+        if (self.__max_workers <= 1
+                or len(metrics) < max(1, self.__parallel_threshold)):
+            lines, dropped = _serialize_all(self.__serializer, metrics)
+        else:
+            lines, dropped = self.__serialize_parallel(metrics)
+
+        if dropped:
+            self.__logger.warning("Dropped %d metrics that could not be "
+                                  "serialized.", dropped)
+        return lines
+
+    def serialize_batch(self, metrics: Sequence[Metric]) -> List[str]:
+        """
+        Serialize all metrics into payloads that contain at most
+        payload_lines_limit() lines each, keeping the order of the metrics.
+        :param metrics: The metrics to serialize.
+        :return: A list of newline-separated payloads.
+        """
+        return list(chunk_lines(self.serialize_lines(metrics)))
+
+    def __serialize_parallel(self,
+                             metrics: Sequence[Metric],
+                             ) -> Tuple[List[str], int]:
+        if self.__executor is None:
+            # importing multiprocessing is expensive, so it is only imported
+            # when a batch is serialized in parallel.
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.__executor = ProcessPoolExecutor(
+                self.__max_workers,
+                initializer=_initialize_worker,
+                initargs=(self.__serializer._get_config(),))
+
+        # a few chunks per worker to balance uneven chunks, but large enough
+        # to amortize the cost of sending them to the worker.
+        chunk_size = max(
+            DynatraceMetricsApiConstants.payload_lines_limit(),
+            math.ceil(len(metrics) / (self.__max_workers * 4)))
+        chunks = [metrics[offset:offset + chunk_size]
+                  for offset in range(0, len(metrics), chunk_size)]
+
+        lines = []
+        dropped = 0
+        # map returns the results in the order of the chunks.
+        for chunk_lines_, chunk_dropped in self.__executor.map(
+                _serialize_chunk, chunks,
+                itertools.repeat(_ambient_dimensions.get())):
+            lines.extend(chunk_lines_)
+            dropped += chunk_dropped
+        return lines, dropped
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes.
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def __enter__(self) -> "DynatraceMetricsBatchSerializer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -52,8 +52,8 @@ class DynatraceMetricsFactory:
         The value will be serialized as "gauge,[value]".
         :param metric_name: The name of the metric
         :param value: The value to be set on the metric.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
@@ -73,8 +73,8 @@ class DynatraceMetricsFactory:
         The value will be serialized as "gauge,[value]".
         :param metric_name: The name of the metric
         :param value: The value to be set on the metric.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
@@ -96,8 +96,8 @@ class DynatraceMetricsFactory:
         Only a delta to the previously exported value should be specified here.
         :param metric_name: The name of the metric
         :param value: The value to be set on the metric.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
@@ -120,8 +120,8 @@ class DynatraceMetricsFactory:
         Only a delta to the previously exported value should be specified here.
         :param metric_name: The name of the metric
         :param value: The value to be set on the metric.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
@@ -150,8 +150,8 @@ class DynatraceMetricsFactory:
         :param max: The largest value in the summary.
         :param sum: The sum of all values in the summary.
         :param count: The number of observations combined in the summary.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
@@ -181,8 +181,8 @@ class DynatraceMetricsFactory:
         :param max: The largest value in the summary.
         :param sum: The sum of all values in the summary.
         :param count: The number of observations combined in the summary.
-        :param dimensions: An optional dictionary to add as dimensions on this
-         metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` to
+         add as dimensions on this metric.
         :param timestamp: An optional timestamp (Unix time, in milliseconds).
         :return: A :class:`Metric` object.
         """
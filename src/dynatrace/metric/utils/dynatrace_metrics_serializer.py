@@ -13,12 +13,28 @@
 #  limitations under the License.
 
 import logging
-from typing import Optional, Mapping, List
+import time
+from typing import FrozenSet, Optional, Mapping, List, Tuple, TYPE_CHECKING
 
-from ._dynatrace_metadata_enricher import DynatraceMetadataEnricher
-from ._normalize import Normalize
+from ._cache import BoundedCache
 from ._metric import Metric
+from ._metric_values import MetricValue
+from ._profiling import ProfilingHook, ProfilingHooks
+from .ambient_dimensions import _ambient_dimensions
+from .dimension_set import DimensionSet
 from .metric_error import MetricError
+from .serializer_config import SerializerConfig
+
+if TYPE_CHECKING:
+    from .self_monitoring import SelfMonitoring
+
+
+def _by_identity(dimension_set: DimensionSet) -> Tuple[int, DimensionSet]:
+    # DimensionSets with the same dimensions in a different order are equal,
+    # but keep their order in metric lines, so caches of serialized
+    # dimensions are keyed by the (interned) instance. The key references
+    # the instance, so its id is not reused while the key is cached.
+    return id(dimension_set), dimension_set
 
 
 class DynatraceMetricsSerializer:
@@ -35,46 +51,209 @@ class DynatraceMetricsSerializer:
                  default_dimensions: Optional[Mapping[str, str]] = None,
                  enrich_with_dynatrace_metadata: bool = True,
                  metrics_source: Optional[str] = None,
+                 self_monitoring: Optional["SelfMonitoring"] = None,
+                 drop_dimensions_to_fit: bool = False,
+                 config: Optional[SerializerConfig] = None,
                  ):
+        """
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        :param metric_key_prefix: An optional prefix for all metric keys.
+        :param default_dimensions: Optional dimensions added to all metrics.
+        :param enrich_with_dynatrace_metadata: Whether to add the Dynatrace
+         metadata dimensions to all metrics. Ignored if a config is passed.
+        :param metrics_source: An optional value for the "dt.metrics.source"
+         dimension. Ignored if a config is passed.
+        :param self_monitoring: An optional :class:`SelfMonitoring` instance
+         that records the activity of this serializer.
+        :param drop_dimensions_to_fit: Whether to drop dimensions instead of
+         rejecting metric lines that exceed the maximum line length.
+        :param config: An optional :class:`SerializerConfig` shared with
+         other serializers. If None is specified, a config is created for
+         this serializer.
+        """
 
         self.__logger = logger if logger else logging.getLogger(__name__)
 
-        if enrich_with_dynatrace_metadata:
-            # create an enricher and get the Dynatrace metadata dimensions
-            # this enricher uses a child logger of the serializer logger.
-            enricher = DynatraceMetadataEnricher(
-                self.__logger.getChild(DynatraceMetadataEnricher.__name__))
-            static_dimensions = enricher.get_dynatrace_metadata()
-        else:
-            static_dimensions = {}
-
-        # create an instance of the normalizer class with a child logger
-        self.__normalize = Normalize(
-            self.__logger.getChild(Normalize.__name__)
-        )
-
-        # String is not None and non-empty.
-        if metrics_source:
-            static_dimensions['dt.metrics.source'] = metrics_source
+        if config is None:
+            config = SerializerConfig(self.__logger,
+                                      enrich_with_dynatrace_metadata,
+                                      metrics_source)
+        self.__config = config
+        # the normalizer of the config may be shared with other serializers,
+        # so the profiling hooks of this serializer are installed on a view
+        # that shares its caches.
+        self.__normalize = config._normalize._view()
 
         # None or empty string
         if not metric_key_prefix:
             self.__metric_key_prefix = None
+            self.__normalized_metric_key_prefix = None
+            self.__max_metric_name_length = None
         else:
             self.__metric_key_prefix = metric_key_prefix
+            # the sections of the prefix are normalized independently of the
+            # metric name, so the prefix is only normalized once.
+            self.__normalized_metric_key_prefix = \
+                self.__normalize.normalize_metric_key(metric_key_prefix)
+            # longer metric names are truncated when they are normalized.
+            self.__max_metric_name_length = \
+                self.__normalize.max_metric_key_suffix_length(
+                    len(metric_key_prefix))
+
+        # maps metric names to their normalized keys including the prefix.
+        self.__prefixed_metric_keys = BoundedCache()
+
+        self.__static_dimensions = config._static_dimensions
 
         # None or empty dict
         if not default_dimensions:
-            self.__default_dimensions = {}
+            self.__set_default_dimensions({})
         else:
-            self.__default_dimensions = self.__normalize.normalize_dimensions(
-                default_dimensions)
+            self.__set_default_dimensions(
+                self.__normalize.normalize_and_escape_dimensions(
+                    default_dimensions))
+
+        self.__drop_dimensions_to_fit = drop_dimensions_to_fit
+        # length of the static dimensions in a metric line, which are always
+        # added.
+        self.__static_dimensions_length = self.__dimensions_length(
+            self.__static_dimensions)
 
-        if not static_dimensions:
-            self.__static_dimensions = {}
+        self.__self_monitoring = self_monitoring
+        if self_monitoring is not None:
+            self_monitoring._register_normalizer(config._normalize)
+            # shadow the serialize method, so serializers without
+            # self-monitoring do not pay for the bookkeeping.
+            serialize = self.__serialize_with_self_monitoring
         else:
-            self.__static_dimensions = self.__normalize.normalize_dimensions(
-                static_dimensions)
+            serialize = self.serialize
+
+        self.__profiling_hooks = ProfilingHooks(self, {
+            "serialize": ("serialize", serialize,
+                          self_monitoring is not None),
+            "merge_dimensions": ("_DynatraceMetricsSerializer"
+                                 "__merge_dimensions",
+                                 self.__merge_dimensions, False),
+            "serialize_dimensions": ("_DynatraceMetricsSerializer"
+                                     "__serialize_dimensions",
+                                     self.__serialize_dimensions, False),
+            "format_value": ("_DynatraceMetricsSerializer__format_value",
+                             self.__format_value, False),
+        })
+        self.__profiling_hooks.rebind()
+
+    def add_profiling_hook(self, hook: ProfilingHook) -> None:
+        """
+        Register a hook that is called with the stage name and the
+        time.perf_counter_ns() values before and after each serialization
+        stage (including the normalization stages). Stages are nested, e.g.
+        the "serialize" stage contains all other stages. Without registered
+        hooks, serialization is not instrumented.
+        :param hook: A callable taking the stage name, the start and the end
+         time in nanoseconds.
+        """
+        self.__profiling_hooks.add(hook)
+        self.__normalize.add_profiling_hook(hook)
+
+    def remove_profiling_hook(self, hook: ProfilingHook) -> None:
+        """
+        Remove a previously registered profiling hook.
+        :param hook: The hook to remove.
+        """
+        self.__profiling_hooks.remove(hook)
+        self.__normalize.remove_profiling_hook(hook)
+
+    @property
+    def config(self) -> SerializerConfig:
+        """
+        The :class:`SerializerConfig` used by this serializer.
+        """
+        return self.__config
+
+    def _get_config(self) -> Tuple[SerializerConfig,
+                                   Optional[str],
+                                   Mapping[str, str],
+                                   bool]:
+        """
+        Get the configuration of this serializer as a picklable tuple of the
+        shared config, the metric key prefix, the already normalized and
+        escaped default dimensions and whether dimensions are dropped to fit
+        the maximum line length. Used to re-create the serializer in worker
+        processes without reading the Dynatrace metadata again.
+        """
+        return (self.__config,
+                self.__metric_key_prefix,
+                dict(self.__default_dimensions),
+                self.__drop_dimensions_to_fit)
+
+    @classmethod
+    def _from_config(cls,
+                     config: Tuple[SerializerConfig,
+                                   Optional[str],
+                                   Mapping[str, str],
+                                   bool],
+                     logger: Optional[logging.Logger] = None,
+                     ) -> "DynatraceMetricsSerializer":
+        """
+        Re-create a serializer from the result of :meth:`_get_config`.
+        """
+        (serializer_config, metric_key_prefix, default_dimensions,
+         drop_dimensions_to_fit) = config
+        serializer = cls(logger, metric_key_prefix,
+                         drop_dimensions_to_fit=drop_dimensions_to_fit,
+                         config=serializer_config)
+        serializer.__set_default_dimensions(dict(default_dimensions))
+        return serializer
+
+    def __set_default_dimensions(self,
+                                 default_dimensions: Mapping[str, str],
+                                 ) -> None:
+        self.__default_dimensions = default_dimensions
+        self.__layout = self.__create_layout(default_dimensions)
+
+        # serialized dimensions of DimensionSets merged with the default and
+        # static dimensions of this serializer.
+        self.__dimension_set_fragments = BoundedCache()
+        # the same for the ambient dimensions of a scope: maps scopes to
+        # their layouts, and (scope, DimensionSet) to the serialized
+        # dimensions. All are keyed with _by_identity.
+        self.__ambient_layouts = BoundedCache()
+        self.__ambient_dimension_set_fragments = BoundedCache()
+
+    def __create_layout(self,
+                        default_dimensions: Mapping[str, str],
+                        ) -> "_DimensionLayout":
+        static_dimensions = self.__static_dimensions
+        return _DimensionLayout(
+            default_dimensions,
+            frozenset(default_dimensions).union(static_dimensions),
+            self.__serialize_dimensions({
+                k: static_dimensions.get(k, v)
+                for k, v in default_dimensions.items()
+            }),
+            self.__serialize_dimensions({
+                k: v for k, v in static_dimensions.items()
+                if k not in default_dimensions
+            }))
+
+    def __ambient_layout(self,
+                         ambient_dimensions: DimensionSet,
+                         ) -> "_DimensionLayout":
+        return self.__ambient_layouts.get_or_compute(
+            _by_identity(ambient_dimensions), self.__create_ambient_layout)
+
+    def __create_ambient_layout(self,
+                                key: Tuple[int, DimensionSet],
+                                ) -> "_DimensionLayout":
+        _, ambient_dimensions = key
+        # ambient dimensions overwrite the default dimensions. They are
+        # already normalized, but not escaped.
+        escape = self.__normalize.escape_dimension_value
+        default_dimensions = dict(self.__default_dimensions)
+        for k, v in ambient_dimensions.items():
+            default_dimensions[k] = escape(v)
+        return self.__create_layout(default_dimensions)
 
     def serialize(self, metric: Metric) -> str:
         """
@@ -84,47 +263,366 @@ class DynatraceMetricsSerializer:
         :return: The string representation of the metric.
         """
         self.__logger.debug("serializing %s", metric.get_metric_name())
-        builder = []
 
         metric_name = metric.get_metric_name()
         if self.__metric_key_prefix:
-            metric_name = "{}.{}".format(self.__metric_key_prefix, metric_name)
-
-        metric_key = self.__normalize.normalize_metric_key(metric_name)
+            metric_key = self.__get_prefixed_metric_key(metric_name)
+        else:
+            metric_key = self.__normalize.normalize_metric_key(metric_name)
 
         if not metric_key:
-            raise MetricError("Metric name is empty")
+            raise MetricError("Metric name is empty",
+                              reason="empty_metric_key")
 
-        builder.append(metric_key)
+        # everything after the dimensions: the value and the timestamp.
+        suffix = " " + self.__format_value(metric.get_value())
+        timestamp = metric.get_timestamp()
+        if timestamp:
+            suffix = suffix + " " + timestamp
 
-        merged_dimensions = self.__merge_dimensions([
-            self.__default_dimensions,
-            self.__normalize.normalize_dimensions(metric.get_dimensions()),
-            self.__static_dimensions
-        ])
+        # the number of characters left for the dimensions, including the
+        # comma that separates them from the metric key.
+        budget = (DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH
+                  - len(metric_key) - len(suffix))
 
-        if merged_dimensions:
-            builder.append(",")
-            builder.append(self.__serialize_dimensions(merged_dimensions))
+        ambient_dimensions = _ambient_dimensions.get()
+        if ambient_dimensions is None:
+            default_dimensions = self.__default_dimensions
+        else:
+            default_dimensions = self.__ambient_layout(
+                ambient_dimensions).default_dimensions
+
+        dimensions = metric.get_dimensions()
+        if isinstance(dimensions, DimensionSet):
+            serialized_dimensions = self.__dimension_set_fragment(
+                dimensions, ambient_dimensions)
 
-        builder.append(" ")
-        builder.append(metric.get_value().serialize_value())
+            if serialized_dimensions and len(serialized_dimensions) >= budget:
+                serialized_dimensions = self.__serialize_metric_dimensions(
+                    dimensions, budget, metric_key, default_dimensions)
+        else:
+            serialized_dimensions = self.__serialize_metric_dimensions(
+                dimensions, budget, metric_key, default_dimensions)
 
+        if serialized_dimensions:
+            return metric_key + "," + serialized_dimensions + suffix
+        return metric_key + suffix
+
+    def _prepare(self, metric: Metric) -> "_PreparedMetric":
+        """
+        Do the part of the serialization that is the same for all
+        serializers: format the value and the timestamp and normalize the
+        metric dimensions. The result can be rendered by any serializer with
+        :meth:`_render`.
+        """
+        suffix = " " + self.__format_value(metric.get_value())
         timestamp = metric.get_timestamp()
         if timestamp:
-            builder.append(" {}".format(timestamp))
+            suffix = suffix + " " + timestamp
+
+        dimensions = metric.get_dimensions()
+        if isinstance(dimensions, DimensionSet):
+            # the serializers cache the merged dimensions of DimensionSets.
+            return _PreparedMetric(metric.get_metric_name(), suffix, None, "")
+
+        metric_dimensions = self.__normalize.normalize_and_escape_dimensions(
+            dimensions)
+        return _PreparedMetric(metric.get_metric_name(), suffix,
+                               metric_dimensions,
+                               self.__serialize_dimensions(metric_dimensions))
+
+    def _render(self, metric: Metric, prepared: "_PreparedMetric") -> str:
+        """
+        Create the metric line of a metric prepared by :meth:`_prepare`,
+        which gives the same result as :meth:`serialize`. Lines that exceed
+        the maximum line length are serialized with :meth:`serialize`, which
+        rejects them or drops dimensions to make them fit.
+        """
+        if self.__self_monitoring is None:
+            return self.__render(metric, prepared)
+
+        start = time.perf_counter_ns()
+        try:
+            metric_str = self.__render(metric, prepared)
+        except MetricError as err:
+            self.__self_monitoring._record_error(
+                err.reason, line_dropped=err.reason == "line_too_long")
+            raise
+
+        self.__self_monitoring._record_line(
+            metric_str, time.perf_counter_ns() - start)
+        return metric_str
+
+    def __render(self, metric: Metric, prepared: "_PreparedMetric") -> str:
+        if self.__metric_key_prefix:
+            metric_key = self.__get_prefixed_metric_key(prepared.metric_name)
+        else:
+            # normalized once for all serializers without a prefix.
+            metric_key = prepared.metric_key
+            if metric_key is None:
+                metric_key = prepared.metric_key = \
+                    self.__normalize.normalize_metric_key(
+                        prepared.metric_name) or ""
+
+        if not metric_key:
+            raise MetricError("Metric name is empty",
+                              reason="empty_metric_key")
 
-        metric_str = "".join(builder)
+        ambient_dimensions = _ambient_dimensions.get()
+        metric_dimensions = prepared.metric_dimensions
+        if metric_dimensions is None:
+            serialized_dimensions = self.__dimension_set_fragment(
+                metric.get_dimensions(), ambient_dimensions)
+        else:
+            if ambient_dimensions is None:
+                layout = self.__layout
+            else:
+                layout = self.__ambient_layout(ambient_dimensions)
+
+            if layout.keys.isdisjoint(metric_dimensions):
+                # the metric dimensions end up between the default and the
+                # static dimensions, so the prepared fragment is spliced in.
+                serialized_dimensions = ",".join(filter(None, (
+                    layout.leading_fragment,
+                    prepared.dimensions_fragment,
+                    layout.trailing_fragment,
+                )))
+            else:
+                serialized_dimensions = self.__serialize_dimensions(
+                    self.__merge_dimensions([
+                        layout.default_dimensions,
+                        metric_dimensions,
+                        self.__static_dimensions,
+                    ]))
+
+        if serialized_dimensions:
+            metric_str = (metric_key + "," + serialized_dimensions
+                          + prepared.suffix)
+        else:
+            metric_str = metric_key + prepared.suffix
 
         if len(metric_str) > DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH:
-            raise MetricError(
-                "Metric line exceeds maximum length of {} characters."
-                " Metric name: {}".format(
-                    DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH,
-                    metric_key))
+            # rare: let serialize reject the line or drop dimensions.
+            return DynatraceMetricsSerializer.serialize(self, metric)
+        return metric_str
+
+    def __get_prefixed_metric_key(self, metric_name: str) -> Optional[str]:
+        if not self.__normalized_metric_key_prefix:
+            # the first section of the prefix is empty, so is every key.
+            return None
+
+        if not isinstance(metric_name, str):
+            metric_name = str(metric_name)
+
+        # only the truncated name is cached, so oversized names are not
+        # kept alive by the cache.
+        return self.__prefixed_metric_keys.get_or_compute(
+            metric_name[:self.__max_metric_name_length],
+            self.__normalize_prefixed_metric_key)
+
+    def __normalize_prefixed_metric_key(self, metric_name: str) -> str:
+        normalized_name = self.__normalize.normalize_metric_key_suffix(
+            metric_name, len(self.__metric_key_prefix))
+        if normalized_name:
+            return self.__normalized_metric_key_prefix + "." + normalized_name
+        return self.__normalized_metric_key_prefix
+
+    def __dimension_set_fragment(self,
+                                 dimensions: DimensionSet,
+                                 ambient_dimensions: Optional[DimensionSet],
+                                 ) -> str:
+        """
+        Get the serialized dimensions of a DimensionSet, merged with the
+        dimensions of this serializer and the ambient dimensions.
+        """
+        if ambient_dimensions is not None:
+            return self.__ambient_dimension_set_fragments.get_or_compute(
+                _by_identity(ambient_dimensions) + _by_identity(dimensions),
+                self.__serialize_ambient_dimension_set)
+        if self.__default_dimensions or self.__static_dimensions:
+            return self.__dimension_set_fragments.get_or_compute(
+                _by_identity(dimensions), self.__serialize_keyed_dimension_set)
+        return dimensions.serialized
+
+    def __serialize_metric_dimensions(self,
+                                      dimensions: Mapping[str, str],
+                                      budget: int,
+                                      metric_key: str,
+                                      default_dimensions: Mapping[str, str],
+                                      ) -> str:
+        """
+        Normalize the metric dimensions, merge them with the default and
+        static dimensions and serialize them. The length of the dimensions
+        is tracked while they are normalized, so that metrics with too many
+        or too long dimensions are rejected as soon as they exceed the budget,
+        without normalizing all of their dimensions.
+
+        If the serializer drops dimensions to fit, the static dimensions are
+        always kept, followed by the metric dimensions (in their order, up to
+        the first one that does not fit) and the default dimensions that
+        still fit.
+        :param dimensions: The (not normalized) metric dimensions.
+        :param budget: The maximum length of the serialized dimensions,
+        including the comma separating them from the metric key.
+        :param metric_key: The metric key, used in error messages.
+        :param default_dimensions: The default dimensions, including the
+         ambient dimensions of the current context.
+        :return: The serialized dimensions.
+        """
+        normalize = self.__normalize
+        static_dimensions = self.__static_dimensions
+        drop_dimensions_to_fit = self.__drop_dimensions_to_fit
+
+        # normalize the keys first. If multiple keys are normalized to the
+        # same key, the last value wins, so the final set of keys (and the
+        # default dimensions they overwrite) is known before the values are
+        # normalized.
+        raw_values = {}
+        for key, value in dimensions.items():
+            normalized_key = normalize.normalize_dimension_key(key)
+            if normalized_key:
+                raw_values[normalized_key] = value
+            else:
+                self.__logger.debug("Key is empty, dropping %s=%s", key, value)
+
+        # the length of ",key=value" for all dimensions that are certainly
+        # part of the line. Without dropping, this includes the default
+        # dimensions that are not overwritten.
+        length = self.__static_dimensions_length
+        if not drop_dimensions_to_fit:
+            for key, value in default_dimensions.items():
+                if key not in raw_values and key not in static_dimensions:
+                    length += len(key) + len(value) + 2
+
+        if length > budget:
+            raise self.__line_too_long(metric_key)
+
+        metric_dimensions = {}
+        dropped = 0
+        full = False
+        for key, value in raw_values.items():
+            if key in static_dimensions:
+                # overwritten by the static dimension, whose length is
+                # already counted. The key keeps its position, like when the
+                # dimensions are merged without a budget.
+                metric_dimensions[key] = static_dimensions[key]
+                continue
+            if full:
+                dropped += 1
+                continue
+
+            escaped = normalize.normalize_and_escape_dimension_value(value)
+
+            new_length = length + len(key) + len(escaped) + 2
+            if new_length > budget:
+                if not drop_dimensions_to_fit:
+                    raise self.__line_too_long(metric_key)
+                # this and all following metric dimensions are dropped.
+                full = True
+                dropped += 1
+                continue
+
+            metric_dimensions[key] = escaped
+            length = new_length
+
+        if drop_dimensions_to_fit:
+            # keep the position of default dimensions that are overwritten.
+            kept_default_dimensions = {}
+            for key, value in default_dimensions.items():
+                if key in raw_values:
+                    # a default dimension overwritten by a metric dimension
+                    # is never put back, even if the metric dimension was
+                    # dropped, as that would report a wrong value.
+                    if key in metric_dimensions:
+                        kept_default_dimensions[key] = value
+                elif key in static_dimensions:
+                    kept_default_dimensions[key] = value
+                else:
+                    new_length = length + len(key) + len(value) + 2
+                    if new_length > budget:
+                        dropped += 1
+                        continue
+                    kept_default_dimensions[key] = value
+                    length = new_length
+            default_dimensions = kept_default_dimensions
 
+            if dropped:
+                self.__logger.debug("Dropped %d dimensions of %s to fit the "
+                                    "maximum line length.", dropped,
+                                    metric_key)
+                if self.__self_monitoring is not None:
+                    self.__self_monitoring._record_dimensions_dropped(dropped)
+
+        merged_dimensions = self.__merge_dimensions([
+            default_dimensions,
+            metric_dimensions,
+            static_dimensions
+        ])
+
+        if not merged_dimensions:
+            return ""
+        return self.__serialize_dimensions(merged_dimensions)
+
+    @staticmethod
+    def __line_too_long(metric_key: str) -> MetricError:
+        return MetricError(
+            "Metric line exceeds maximum length of {} characters."
+            " Metric name: {}".format(
+                DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH,
+                metric_key),
+            reason="line_too_long")
+
+    @staticmethod
+    def __dimensions_length(dimensions: Mapping[str, str]) -> int:
+        # the length of ",key=value" for every dimension.
+        return sum(len(k) + len(v) + 2 for k, v in dimensions.items())
+
+    def __serialize_with_self_monitoring(self, metric: Metric) -> str:
+        start = time.perf_counter_ns()
+        try:
+            metric_str = DynatraceMetricsSerializer.serialize(self, metric)
+        except MetricError as err:
+            self.__self_monitoring._record_error(
+                err.reason, line_dropped=err.reason == "line_too_long")
+            raise
+
+        self.__self_monitoring._record_line(
+            metric_str, time.perf_counter_ns() - start)
         return metric_str
 
+    def __serialize_dimension_set(self,
+                                  dimension_set: DimensionSet,
+                                  default_dimensions: Optional[
+                                      Mapping[str, str]] = None,
+                                  ) -> str:
+        # the dimensions in the set are already normalized.
+        escape = self.__normalize.escape_dimension_value
+        return self.__serialize_dimensions(self.__merge_dimensions([
+            self.__default_dimensions if default_dimensions is None
+            else default_dimensions,
+            {k: escape(v) for k, v in dimension_set.items()},
+            self.__static_dimensions,
+        ]))
+
+    def __serialize_keyed_dimension_set(
+        self,
+        key: Tuple[int, DimensionSet],
+    ) -> str:
+        return self.__serialize_dimension_set(key[1])
+
+    def __serialize_ambient_dimension_set(
+        self,
+        key: Tuple[int, DimensionSet, int, DimensionSet],
+    ) -> str:
+        _, ambient_dimensions, _, dimension_set = key
+        layout = self.__ambient_layout(ambient_dimensions)
+        return self.__serialize_dimension_set(dimension_set,
+                                              layout.default_dimensions)
+
+    @staticmethod
+    def __format_value(value: MetricValue) -> str:
+        return value.serialize_value()
+
     @staticmethod
     def __merge_dimensions(
         dimension_maps: List[Mapping[str, str]]
@@ -146,20 +644,61 @@ class DynatraceMetricsSerializer:
 
         return combined
 
-    def __serialize_dimensions(self,
-                               dimensions: Mapping[str, str]
-                               ) -> str:
+    @staticmethod
+    def __serialize_dimensions(dimensions: Mapping[str, str]) -> str:
         """
         Combine a dimension list into a string of key=value pairs, separated
         by a comma.
-        :param dimensions: the dimensions map to serialize
+        :param dimensions: the dimensions map to serialize. The values have
+        to be escaped already.
         :return: A string representing the dimensions.
         """
-        builder = []
-        for k, v in dimensions.items():
-            builder.append("{}={}".format(
-                k,
-                self.__normalize.escape_dimension_value(v)
-            ))
+        return ",".join([k + "=" + v for k, v in dimensions.items()])
 
-        return ",".join(builder)
+
+class _DimensionLayout:
+    """
+    The default and static dimensions of a serializer as they appear around
+    the metric dimensions in a line, if no metric dimension overwrites them:
+    the default dimensions (with the values of static dimensions that
+    overwrite them) first, the remaining static dimensions last.
+    """
+    __slots__ = ("default_dimensions", "keys", "leading_fragment",
+                 "trailing_fragment")
+
+    def __init__(self,
+                 default_dimensions: Mapping[str, str],
+                 keys: FrozenSet[str],
+                 leading_fragment: str,
+                 trailing_fragment: str,
+                 ) -> None:
+        self.default_dimensions = default_dimensions
+        self.keys = keys
+        self.leading_fragment = leading_fragment
+        self.trailing_fragment = trailing_fragment
+
+
+class _PreparedMetric:
+    """
+    The parts of a metric line that do not depend on the serializer, created
+    by :meth:`DynatraceMetricsSerializer._prepare`.
+    """
+    __slots__ = ("metric_name", "metric_key", "suffix", "metric_dimensions",
+                 "dimensions_fragment")
+
+    def __init__(self,
+                 metric_name: str,
+                 suffix: str,
+                 metric_dimensions: Optional[Mapping[str, str]],
+                 dimensions_fragment: str,
+                 ) -> None:
+        self.metric_name = metric_name
+        # the normalized metric name without a prefix, computed by the first
+        # serializer without a prefix that renders the metric.
+        self.metric_key: Optional[str] = None
+        # " value[ timestamp]".
+        self.suffix = suffix
+        # the normalized and escaped metric dimensions, or None for
+        # DimensionSets.
+        self.metric_dimensions = metric_dimensions
+        self.dimensions_fragment = dimensions_fragment
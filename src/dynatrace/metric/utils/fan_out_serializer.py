@@ -0,0 +1,114 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+from typing import List, Optional, Sequence
+
+from ._metric import Metric
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+
+
+class FanOutSerializer:
+    """
+    Serializes every metric for several serializers, e.g. one per tenant or
+    endpoint, that differ in their metric key prefix and dimensions. The
+    parts of a metric line that are the same for all serializers (the
+    normalized metric dimensions, the formatted value and the timestamp)
+    are created once per metric, and only the prefixed metric key and the
+    default and static dimensions are added for each serializer. The lines
+    are the same as the lines created by the serialize method of each
+    serializer.
+
+    Self-monitoring of the serializers is supported; profiling hooks only
+    instrument the stages that are shared by all serializers.
+    """
+
+    def __init__(self,
+                 serializers: Sequence[DynatraceMetricsSerializer],
+                 logger: Optional[logging.Logger] = None,
+                 ) -> None:
+        """
+        :param serializers: The serializers to create metric lines for.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        """
+        if not serializers:
+            raise ValueError("At least one serializer is required.")
+
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__serializers = list(serializers)
+        # the normalization is the same for all serializers.
+        self.__prepare = self.__serializers[0]._prepare
+        self.__renders = [serializer._render
+                          for serializer in self.__serializers]
+
+    @property
+    def serializers(self) -> List[DynatraceMetricsSerializer]:
+        return list(self.__serializers)
+
+    def serialize(self, metric: Metric) -> List[Optional[str]]:
+        """
+        Create the metric line of a metric for every serializer.
+        :param metric: The metric to serialize.
+        :return: The metric lines, in the order of the serializers. The line
+         is None for serializers that cannot serialize the metric.
+        """
+        try:
+            prepared = self.__prepare(metric)
+        except MetricError:
+            # e.g. invalid dimensions. Let every serializer reject the
+            # metric, which also records the error in its self-monitoring.
+            return [self.__serialize_or_none(serializer.serialize, metric)
+                    for serializer in self.__serializers]
+
+        lines = []
+        append = lines.append
+        for render in self.__renders:
+            try:
+                append(render(metric, prepared))
+            except MetricError as err:
+                self.__logger.debug("Could not serialize %s: %s",
+                                    metric.get_metric_name(), err)
+                append(None)
+        return lines
+
+    def serialize_lines(self, metrics: Sequence[Metric]) -> List[List[str]]:
+        """
+        Serialize all metrics for every serializer, keeping their order.
+        :param metrics: The metrics to serialize.
+        :return: One list of metric lines per serializer, in the order of
+         the serializers. Metrics that cannot be serialized are dropped.
+        """
+        per_serializer: List[List[str]] = [[] for _ in self.__serializers]
+        dropped = 0
+        for metric in metrics:
+            for lines, line in zip(per_serializer, self.serialize(metric)):
+                if line is None:
+                    dropped += 1
+                else:
+                    lines.append(line)
+
+        if dropped:
+            self.__logger.warning("Dropped %d metric lines that could not be "
+                                  "serialized.", dropped)
+        return per_serializer
+
+    def __serialize_or_none(self, serialize, metric: Metric) -> Optional[str]:
+        try:
+            return serialize(metric)
+        except MetricError as err:
+            self.__logger.debug("Could not serialize %s: %s",
+                                metric.get_metric_name(), err)
+            return None
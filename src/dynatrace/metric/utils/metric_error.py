@@ -12,5 +12,16 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from typing import Optional
+
+
 class MetricError(ValueError):
-    pass
+    """
+    Raised when a metric cannot be created or serialized.
+    The optional reason is a short, stable identifier for the kind of error
+    (e.g. "line_too_long"), which can be used to aggregate errors.
+    """
+
+    def __init__(self, *args, reason: Optional[str] = None) -> None:
+        super().__init__(*args)
+        self.reason = reason
@@ -0,0 +1,460 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import logging
+import math
+import re
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, \
+    Tuple, Union
+
+from ._metric import Metric
+from .cumulative_to_delta_converter import CumulativeToDeltaConverter
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+from .series_expiry import SeriesExpiry
+
+Number = Union[int, float]
+
+_LABEL = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"'
+                    r'\s*,?')
+_UNESCAPE = re.compile(r"\\(.)")
+_UNESCAPED = {"n": "\n"}
+
+# the suffixes of the samples that belong to a family of each type.
+_FAMILY_SUFFIXES = {
+    "counter": ("_total", "_created"),
+    "histogram": ("_bucket", "_count", "_sum", "_created"),
+    "gaugehistogram": ("_bucket", "_gcount", "_gsum"),
+    "summary": ("_count", "_sum", "_created"),
+}
+
+# timestamps below this value are in seconds (OpenMetrics), not in
+# milliseconds (Prometheus).
+_MILLISECONDS_THRESHOLD = 1e11
+
+
+class _Group:
+    """
+    The samples of one histogram or summary series in a scrape.
+    """
+    __slots__ = ("buckets", "quantiles", "total", "count", "timestamp")
+
+    def __init__(self) -> None:
+        self.buckets: List[Tuple[float, Number]] = []
+        self.quantiles: List[Tuple[float, float]] = []
+        self.total: Optional[Number] = None
+        self.count: Optional[Number] = None
+        self.timestamp: Optional[float] = None
+
+
+class PrometheusConverter:
+    """
+    Converts metrics in the Prometheus text exposition format (or the
+    OpenMetrics text format) into Dynatrace metrics. The input is consumed
+    line by line, so large scrapes never have to be held in memory; only
+    the series of the histogram or summary that is currently parsed are
+    buffered.
+
+    - Counters are cumulative and are exported as delta counters, the
+      difference to the value of the previous scrape.
+    - Gauges and untyped metrics are exported as gauges.
+    - Histograms and summaries are exported as summaries of the
+      observations since the previous scrape, under the name of the metric
+      family. Their minimum and maximum are estimated from the bucket
+      boundaries (histograms) or the lowest and highest quantile
+      (summaries).
+
+    Like counters, histograms and summaries are only exported from the
+    second scrape of a series on. Series that are not seen for the series
+    timeout are forgotten. Labels are parsed and normalized once per
+    distinct label set, and the result is reused in later scrapes until the
+    label set is not seen for the series timeout.
+
+    A converter is meant to be used for one scrape target at a time and is
+    not thread-safe.
+    """
+    DEFAULT_SERIES_TIMEOUT_SECONDS = 600.0
+
+    def __init__(self,
+                 serializer: Optional[DynatraceMetricsSerializer] = None,
+                 factory: Optional[DynatraceMetricsFactory] = None,
+                 series_timeout: float = DEFAULT_SERIES_TIMEOUT_SECONDS,
+                 logger: Optional[logging.Logger] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 expiry: Optional[SeriesExpiry] = None,
+                 ) -> None:
+        """
+        :param serializer: The serializer used by :meth:`convert_lines`.
+         Defaults to a serializer with the Dynatrace metadata enrichment.
+        :param factory: An optional factory used to create the metrics.
+        :param series_timeout: The number of seconds after which a series
+         that has not been scraped is forgotten.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        :param clock: A function returning the current time in seconds, used
+         to expire series. Defaults to time.monotonic. Ignored if an expiry
+         is passed.
+        :param expiry: An optional :class:`SeriesExpiry` shared with other
+         structures. By default, the converter has its own.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__serializer = serializer
+        self.__factory = factory if factory else DynatraceMetricsFactory()
+        if expiry is None:
+            expiry = SeriesExpiry(series_timeout / 60, clock)
+        self.__counters = CumulativeToDeltaConverter(
+            self.__factory, series_timeout, self.__logger, expiry=expiry)
+        # the cumulative (count, sum, buckets) of histograms and summaries
+        # in the previous scrape.
+        self.__previous: Dict[Tuple[str, DimensionSet], tuple] = {}
+        self.__expiry = expiry.tracker(series_timeout)
+        # maps (label text, family type) to the dimensions and the value of
+        # the "le" or "quantile" label. Label sets that are no longer
+        # scraped expire like series.
+        self.__labels: Dict[Tuple[str, str],
+                            Tuple[DimensionSet, Optional[str]]] = {}
+        self.__label_expiry = expiry.tracker(series_timeout)
+
+    def convert(self,
+                lines: Iterable[Union[str, bytes]],
+                timestamp: Optional[float] = None,
+                ) -> Iterator[Metric]:
+        """
+        Convert a scrape into metrics.
+        :param lines: The lines of the scrape, e.g. an open file or an HTTP
+         response.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds)
+         for all samples without a timestamp.
+        :return: An iterator over the metrics. Invalid samples are skipped.
+        """
+        for expired in self.__expiry.expired():
+            del self.__previous[expired]
+        for expired in self.__label_expiry.expired():
+            del self.__labels[expired]
+
+        family_name: Optional[str] = None
+        family_type = "untyped"
+        suffixes: Tuple[str, ...] = ()
+        # the histogram or summary series of the current family.
+        groups: Dict[DimensionSet, _Group] = {}
+
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
+            line = line.strip()
+            if not line:
+                continue
+
+            if line[0] == "#":
+                parts = line.split(None, 3)
+                if len(parts) >= 4 and parts[1] == "TYPE":
+                    yield from self.__finish_family(family_name, groups)
+                    groups = {}
+                    family_name = parts[2]
+                    family_type = parts[3].strip().lower()
+                    suffixes = _FAMILY_SUFFIXES.get(family_type, ())
+                continue
+
+            try:
+                name, labels, value, sample_timestamp = self.__parse(line)
+            except ValueError as err:
+                self.__logger.debug("Invalid sample %r: %s", line, err)
+                continue
+            if sample_timestamp is None:
+                sample_timestamp = timestamp
+
+            if name != family_name and not (
+                    family_name and name.startswith(family_name)
+                    and name[len(family_name):] in suffixes):
+                # a sample without a TYPE line of its own.
+                yield from self.__finish_family(family_name, groups)
+                groups = {}
+                family_name = None
+                family_type = "untyped"
+                suffixes = ()
+
+            try:
+                if family_type in ("histogram", "summary"):
+                    self.__add_to_group(groups, family_name, family_type,
+                                        name, labels, value,
+                                        sample_timestamp)
+                    continue
+
+                dimensions, _ = self.__dimensions(labels, "untyped")
+                if family_type == "counter":
+                    if name.endswith("_created"):
+                        continue
+                    metric = self.__counters.convert(
+                        name, value, dimensions, sample_timestamp)
+                    if metric is not None:
+                        yield metric
+                elif self.__is_finite(value):
+                    yield self.__gauge(name, value, dimensions,
+                                       sample_timestamp)
+            except (MetricError, ValueError) as err:
+                self.__logger.debug("Invalid sample %r: %s", line, err)
+
+        yield from self.__finish_family(family_name, groups)
+
+    def convert_lines(self,
+                      lines: Iterable[Union[str, bytes]],
+                      timestamp: Optional[float] = None,
+                      ) -> Iterator[str]:
+        """
+        Convert a scrape into Dynatrace metric lines.
+        :param lines: The lines of the scrape.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds)
+         for all samples without a timestamp.
+        :return: An iterator over the metric lines. Metrics that cannot be
+         serialized are skipped.
+        """
+        if self.__serializer is None:
+            self.__serializer = DynatraceMetricsSerializer(
+                self.__logger.getChild(DynatraceMetricsSerializer.__name__))
+        serialize = self.__serializer.serialize
+        for metric in self.convert(lines, timestamp):
+            try:
+                yield serialize(metric)
+            except MetricError as err:
+                self.__logger.debug("Could not serialize %s: %s",
+                                    metric.get_metric_name(), err)
+
+    def scrape(self,
+               url: str,
+               timeout: float = 10.0,
+               ) -> Iterator[str]:
+        """
+        Scrape an HTTP endpoint in the Prometheus format and convert the
+        response into metric lines while it is read.
+        :param url: The URL of the endpoint, e.g. http://localhost:9100/metrics
+        :param timeout: The timeout of the request, in seconds.
+        :return: An iterator over the metric lines.
+        """
+        import urllib.request
+
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            yield from self.convert_lines(response)
+
+    @staticmethod
+    def __parse(line: str) -> Tuple[str, str, Number, Optional[float]]:
+        # <name>[{<labels>}] <value> [<timestamp>]
+        brace = line.find("{")
+        if brace >= 0:
+            end = line.rfind("}")
+            if end < brace:
+                raise ValueError("Unterminated labels")
+            name = line[:brace].strip()
+            labels = line[brace + 1:end]
+            fields = line[end + 1:].split()
+        else:
+            name, *fields = line.split()
+            labels = ""
+
+        if not name or not 1 <= len(fields) <= 2:
+            raise ValueError("Expected a value and an optional timestamp")
+
+        try:
+            value: Number = int(fields[0])
+        except ValueError:
+            value = float(fields[0])
+
+        sample_timestamp = None
+        if len(fields) == 2:
+            sample_timestamp = float(fields[1])
+            if sample_timestamp < _MILLISECONDS_THRESHOLD:
+                sample_timestamp *= 1000
+        return name, labels, value, sample_timestamp
+
+    def __dimensions(self,
+                     labels: str,
+                     family_type: str,
+                     ) -> Tuple[DimensionSet, Optional[str]]:
+        """
+        Get the dimensions of a label set, and the value of the "le" label of
+        histograms or the "quantile" label of summaries.
+        """
+        if not labels:
+            return DimensionSet(), None
+        key = (labels, family_type)
+        parsed = self.__labels.get(key)
+        if parsed is None:
+            parsed = self.__labels[key] = self.__parse_labels(key)
+        self.__label_expiry.touch(key)
+        return parsed
+
+    @staticmethod
+    def __parse_labels(key: Tuple[str, str],
+                       ) -> Tuple[DimensionSet, Optional[str]]:
+        labels, family_type = key
+        special = {"histogram": "le", "summary": "quantile"}.get(family_type)
+
+        dimensions = {}
+        special_value = None
+        position = 0
+        while position < len(labels):
+            match = _LABEL.match(labels, position)
+            if match is None:
+                if labels[position:].strip(" ,"):
+                    raise ValueError("Invalid labels: " + labels)
+                break
+            position = match.end()
+            name, value = match.group(1), match.group(2)
+            if "\\" in value:
+                value = _UNESCAPE.sub(
+                    lambda m: _UNESCAPED.get(m.group(1), m.group(1)), value)
+            if name == special:
+                special_value = value
+            else:
+                dimensions[name] = value
+        return DimensionSet(dimensions), special_value
+
+    def __add_to_group(self,
+                       groups: Dict[DimensionSet, _Group],
+                       family_name: str,
+                       family_type: str,
+                       name: str,
+                       labels: str,
+                       value: Number,
+                       sample_timestamp: Optional[float],
+                       ) -> None:
+        dimensions, special_value = self.__dimensions(labels, family_type)
+        group = groups.get(dimensions)
+        if group is None:
+            group = groups[dimensions] = _Group()
+
+        suffix = name[len(family_name):]
+        if suffix == "_bucket" and special_value is not None:
+            group.buckets.append((float(special_value), value))
+        elif suffix == "_count":
+            group.count = value
+            group.timestamp = sample_timestamp
+        elif suffix == "_sum":
+            group.total = value
+        elif suffix == "" and special_value is not None:
+            group.quantiles.append((float(special_value), value))
+
+    def __finish_family(self,
+                        family_name: Optional[str],
+                        groups: Dict[DimensionSet, _Group],
+                        ) -> Iterator[Metric]:
+        for dimensions, group in groups.items():
+            try:
+                metric = self.__summary(family_name, dimensions, group)
+            except MetricError as err:
+                self.__logger.debug("Invalid series %s: %s", family_name,
+                                    err)
+                continue
+            if metric is not None:
+                yield metric
+
+    def __summary(self,
+                  family_name: str,
+                  dimensions: DimensionSet,
+                  group: _Group,
+                  ) -> Optional[Metric]:
+        if group.count is None or group.total is None:
+            return None
+        if not (self.__is_finite(group.count)
+                and self.__is_finite(group.total)):
+            return None
+
+        group.buckets.sort()
+        key = (family_name, dimensions)
+        buckets = tuple(group.buckets)
+        previous = self.__previous.get(key)
+        self.__previous[key] = (group.count, group.total, buckets)
+        self.__expiry.touch(key)
+        if previous is None:
+            return None
+
+        previous_count, previous_total, previous_buckets = previous
+        if group.count < previous_count:
+            # the series was reset.
+            previous_count, previous_total, previous_buckets = 0, 0, ()
+
+        count = int(group.count - previous_count)
+        if count <= 0:
+            return None
+        total = group.total - previous_total
+        mean = total / count
+
+        if buckets:
+            minimum, maximum = self.__estimate_from_buckets(
+                buckets, previous_buckets, count, mean)
+        else:
+            quantiles = [v for _, v in sorted(group.quantiles)
+                         if self.__is_finite(v)]
+            if quantiles:
+                minimum, maximum = quantiles[0], quantiles[-1]
+            else:
+                minimum = maximum = mean
+
+        # the estimates are not always consistent with the mean.
+        minimum = min(minimum, mean)
+        maximum = max(maximum, mean)
+        return self.__factory.create_float_summary(
+            family_name, minimum, maximum, total, count, dimensions,
+            group.timestamp)
+
+    @staticmethod
+    def __estimate_from_buckets(buckets: Tuple[Tuple[float, Number], ...],
+                                previous_buckets: Tuple[Tuple[float, Number],
+                                                        ...],
+                                count: int,
+                                mean: float,
+                                ) -> Tuple[float, float]:
+        """
+        Estimate the minimum and maximum of the observations since the
+        previous scrape: the lower boundary of the first bucket and the upper
+        boundary of the last bucket that received observations.
+        """
+        previous = dict(previous_buckets)
+        # the values if no bucket is found, e.g. without a +Inf bucket.
+        minimum = maximum = mean
+        lower = None
+        found_minimum = False
+        for upper, cumulative in buckets:
+            delta = cumulative - previous.get(upper, 0)
+            if not found_minimum and delta > 0:
+                found_minimum = True
+                # the lowest bucket starts at 0, unless its bound is negative.
+                minimum = lower if lower is not None else min(upper, 0.0)
+            if delta >= count:
+                if math.isinf(upper):
+                    maximum = lower if lower is not None else mean
+                else:
+                    maximum = upper
+                break
+            lower = upper
+        return minimum, maximum
+
+    def __gauge(self,
+                name: str,
+                value: Number,
+                dimensions: DimensionSet,
+                sample_timestamp: Optional[float],
+                ) -> Metric:
+        if isinstance(value, int):
+            return self.__factory.create_int_gauge(
+                name, value, dimensions, sample_timestamp)
+        return self.__factory.create_float_gauge(
+            name, value, dimensions, sample_timestamp)
+
+    @staticmethod
+    def __is_finite(value: Number) -> bool:
+        return isinstance(value, int) or math.isfinite(value)
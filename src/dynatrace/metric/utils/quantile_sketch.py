@@ -0,0 +1,426 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+import struct
+import threading
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from ._metric import Metric
+from ._metric_values import _raise_if_nan_or_inf
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+
+# sentinels for bin indices that have not been collapsed.
+_NO_FLOOR = -(2 ** 63)
+_NO_CEILING = 2 ** 63 - 1
+
+# magic, version, relative accuracy, max bins, count, zero count, min, max,
+# sum, positive floor, negative ceiling, number of positive and negative bins.
+_HEADER = struct.Struct("<4sBdIQQdddqqII")
+_BIN = struct.Struct("<qQ")
+_MAGIC = b"DTQS"
+_VERSION = 1
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch with relative error guarantees, based on
+    DDSketch. Observations are counted in logarithmically sized bins, so
+    every quantile is estimated with at most the configured relative error,
+    independently of the number of observations. The number of bins is
+    limited: when it is exceeded, the bins of the lowest quantiles are
+    collapsed, trading their accuracy for fixed memory.
+
+    Minimum, maximum, sum and count are tracked exactly. Sketches with the
+    same relative accuracy can be merged, e.g. across threads, or across
+    processes using :meth:`to_bytes` and :meth:`from_bytes`.
+    """
+    __slots__ = ("__relative_accuracy", "__gamma", "__multiplier",
+                 "__max_bins", "__positive", "__negative", "__zero_count",
+                 "__positive_floor", "__negative_ceiling", "__count",
+                 "__min", "__max", "__sum")
+
+    DEFAULT_RELATIVE_ACCURACY = 0.01
+    DEFAULT_MAX_BINS = 2048
+
+    def __init__(self,
+                 relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_bins: int = DEFAULT_MAX_BINS,
+                 ) -> None:
+        """
+        :param relative_accuracy: The maximum relative error of quantile
+         estimates, between 0 and 1.
+        :param max_bins: The maximum number of bins for positive and for
+         negative values each.
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy must be between 0 and 1.")
+        if max_bins < 1:
+            raise ValueError("The maximum number of bins must be positive.")
+
+        self.__relative_accuracy = relative_accuracy
+        self.__gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.__multiplier = 1 / math.log(self.__gamma)
+        self.__max_bins = max_bins
+        # maps bin indices to counts. Bin i holds the values in
+        # (gamma^(i-1), gamma^i], or their negation for negative values.
+        self.__positive: Dict[int, int] = {}
+        self.__negative: Dict[int, int] = {}
+        self.__zero_count = 0
+        # indices below the floor (above the ceiling for negative values)
+        # have been collapsed into the floor (ceiling) bin.
+        self.__positive_floor = _NO_FLOOR
+        self.__negative_ceiling = _NO_CEILING
+        self.__count = 0
+        self.__min = math.inf
+        self.__max = -math.inf
+        self.__sum = 0.0
+
+    def add(self, value: Union[int, float]) -> None:
+        """
+        Record an observation.
+        :param value: A finite number.
+        """
+        _raise_if_nan_or_inf(value)
+
+        if value > 0:
+            index = math.ceil(math.log(value) * self.__multiplier)
+            if index < self.__positive_floor:
+                index = self.__positive_floor
+            bins = self.__positive
+            if index in bins:
+                bins[index] += 1
+            else:
+                bins[index] = 1
+                if len(bins) > self.__max_bins:
+                    self.__collapse()
+        elif value < 0:
+            index = math.ceil(math.log(-value) * self.__multiplier)
+            if index > self.__negative_ceiling:
+                index = self.__negative_ceiling
+            bins = self.__negative
+            if index in bins:
+                bins[index] += 1
+            else:
+                bins[index] = 1
+                if len(bins) > self.__max_bins:
+                    self.__collapse()
+        else:
+            self.__zero_count += 1
+
+        self.__count += 1
+        self.__sum += value
+        if value < self.__min:
+            self.__min = value
+        if value > self.__max:
+            self.__max = value
+
+    def __collapse(self) -> None:
+        # collapse the lowest quantiles, i.e. the smallest positive and the
+        # largest negative bins, so that the higher quantiles stay accurate.
+        max_bins = self.__max_bins
+        positive = self.__positive
+        if len(positive) > max_bins:
+            floor = sorted(positive)[len(positive) - max_bins]
+            collapsed = 0
+            for index in [i for i in positive if i < floor]:
+                collapsed += positive.pop(index)
+            positive[floor] += collapsed
+            self.__positive_floor = floor
+
+        negative = self.__negative
+        if len(negative) > max_bins:
+            ceiling = sorted(negative)[max_bins - 1]
+            collapsed = 0
+            for index in [i for i in negative if i > ceiling]:
+                collapsed += negative.pop(index)
+            negative[ceiling] += collapsed
+            self.__negative_ceiling = ceiling
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """
+        Add all observations of another sketch to this sketch.
+        :param other: A sketch with the same relative accuracy.
+        """
+        if other.__relative_accuracy != self.__relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative "
+                             "accuracies.")
+        if not other.__count:
+            return
+
+        # bins of either sketch beyond the collapsed bins of the other are
+        # collapsed, like values added directly.
+        floor = max(self.__positive_floor, other.__positive_floor)
+        positive = self.__positive
+        if floor != self.__positive_floor:
+            self.__positive_floor = floor
+            collapsed = 0
+            for index in [i for i in positive if i < floor]:
+                collapsed += positive.pop(index)
+            if collapsed:
+                positive[floor] = positive.get(floor, 0) + collapsed
+        for index, count in other.__positive.items():
+            if index < floor:
+                index = floor
+            positive[index] = positive.get(index, 0) + count
+
+        ceiling = min(self.__negative_ceiling, other.__negative_ceiling)
+        negative = self.__negative
+        if ceiling != self.__negative_ceiling:
+            self.__negative_ceiling = ceiling
+            collapsed = 0
+            for index in [i for i in negative if i > ceiling]:
+                collapsed += negative.pop(index)
+            if collapsed:
+                negative[ceiling] = negative.get(ceiling, 0) + collapsed
+        for index, count in other.__negative.items():
+            if index > ceiling:
+                index = ceiling
+            negative[index] = negative.get(index, 0) + count
+
+        self.__collapse()
+        self.__zero_count += other.__zero_count
+        self.__count += other.__count
+        self.__sum += other.__sum
+        self.__min = min(self.__min, other.__min)
+        self.__max = max(self.__max, other.__max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile of the recorded observations.
+        :param q: The quantile, between 0 and 1 (e.g. 0.95).
+        :return: The estimated value, or None if the sketch is empty.
+        """
+        return self.quantiles((q,))[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """
+        Estimate multiple quantiles in one pass over the bins.
+        :param qs: The quantiles, between 0 and 1.
+        :return: The estimated values in the order of qs, or Nones if the
+         sketch is empty.
+        """
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError("Quantiles must be between 0 and 1.")
+        if not self.__count:
+            return [None] * len(qs)
+
+        gamma = self.__gamma
+        # the value of bin i with the lowest relative error to all values in
+        # (gamma^(i-1), gamma^i].
+        bins: List[Tuple[float, int]] = [
+            (-2 * gamma ** i / (gamma + 1), self.__negative[i])
+            for i in sorted(self.__negative, reverse=True)]
+        if self.__zero_count:
+            bins.append((0.0, self.__zero_count))
+        bins.extend((2 * gamma ** i / (gamma + 1), self.__positive[i])
+                    for i in sorted(self.__positive))
+
+        results: List[Optional[float]] = [None] * len(qs)
+        order = sorted(range(len(qs)), key=qs.__getitem__)
+        bin_iter = iter(bins)
+        value, cumulative = next(bin_iter)
+        for position in order:
+            rank = qs[position] * (self.__count - 1)
+            while cumulative <= rank:
+                bin_value, count = next(bin_iter)
+                value = bin_value
+                cumulative += count
+            # the estimate cannot be outside of the exact bounds.
+            results[position] = float(min(max(value, self.__min),
+                                          self.__max))
+        return results
+
+    @property
+    def relative_accuracy(self) -> float:
+        return self.__relative_accuracy
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    @property
+    def min(self) -> Optional[float]:
+        return self.__min if self.__count else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self.__max if self.__count else None
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch into a compact, versioned binary form.
+        """
+        parts = [_HEADER.pack(
+            _MAGIC, _VERSION, self.__relative_accuracy, self.__max_bins,
+            self.__count, self.__zero_count, self.__min, self.__max,
+            self.__sum, self.__positive_floor, self.__negative_ceiling,
+            len(self.__positive), len(self.__negative))]
+        parts.extend(_BIN.pack(index, count)
+                     for index, count in self.__positive.items())
+        parts.extend(_BIN.pack(index, count)
+                     for index, count in self.__negative.items())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        """
+        Restore a sketch created with :meth:`to_bytes`.
+        """
+        try:
+            (magic, version, relative_accuracy, max_bins, count, zero_count,
+             minimum, maximum, total, positive_floor, negative_ceiling,
+             positive_bins, negative_bins) = _HEADER.unpack_from(data)
+        except struct.error as err:
+            raise ValueError("Invalid quantile sketch data.") from err
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Unsupported quantile sketch data.")
+        if len(data) != (_HEADER.size
+                         + (positive_bins + negative_bins) * _BIN.size):
+            raise ValueError("Invalid quantile sketch data length.")
+
+        sketch = cls(relative_accuracy, max_bins)
+        offset = _HEADER.size
+        for bins, number in ((sketch.__positive, positive_bins),
+                             (sketch.__negative, negative_bins)):
+            for _ in range(number):
+                index, bin_count = _BIN.unpack_from(data, offset)
+                bins[index] = bin_count
+                offset += _BIN.size
+
+        sketch.__count = count
+        sketch.__zero_count = zero_count
+        sketch.__min = minimum
+        sketch.__max = maximum
+        sketch.__sum = total
+        sketch.__positive_floor = positive_floor
+        sketch.__negative_ceiling = negative_ceiling
+        return sketch
+
+
+SeriesKey = Tuple[str, DimensionSet]
+
+
+class QuantileSketchAggregator:
+    """
+    Records observations (e.g. latencies) per series in
+    :class:`QuantileSketch` objects. On collection, every series with
+    observations is exported as a float summary and as one gauge per
+    configured percentile, named "<metric name>.p<percentile>", e.g.
+    "request.duration.p99" or "request.duration.p99_9". The sketches are
+    reset on every collection.
+    """
+    DEFAULT_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+    def __init__(self,
+                 percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                 relative_accuracy: float =
+                 QuantileSketch.DEFAULT_RELATIVE_ACCURACY,
+                 max_bins: int = QuantileSketch.DEFAULT_MAX_BINS,
+                 factory: Optional[DynatraceMetricsFactory] = None,
+                 ) -> None:
+        """
+        :param percentiles: The quantiles exported as gauges, between 0 and
+         1.
+        :param relative_accuracy: The relative accuracy of the sketches.
+        :param max_bins: The maximum number of bins of the sketches.
+        :param factory: An optional factory used to create the metrics.
+        """
+        for q in percentiles:
+            if not 0 <= q <= 1:
+                raise ValueError("Percentiles must be between 0 and 1.")
+        self.__percentiles = tuple(percentiles)
+        # e.g. ".p95" for 0.95 and ".p99_9" for 0.999.
+        self.__suffixes = tuple(
+            ".p" + "{:g}".format(q * 100).replace(".", "_")
+            for q in self.__percentiles)
+        self.__relative_accuracy = relative_accuracy
+        self.__max_bins = max_bins
+        # validates the sketch parameters.
+        QuantileSketch(relative_accuracy, max_bins)
+        self.__factory = factory if factory else DynatraceMetricsFactory()
+        self.__lock = threading.Lock()
+        self.__sketches: Dict[SeriesKey, QuantileSketch] = {}
+
+    def __get_sketch(self, key: SeriesKey) -> QuantileSketch:
+        sketch = self.__sketches.get(key)
+        if sketch is None:
+            sketch = QuantileSketch(self.__relative_accuracy,
+                                    self.__max_bins)
+            self.__sketches[key] = sketch
+        return sketch
+
+    def record(self,
+               metric_name: str,
+               value: Union[int, float],
+               dimensions: Optional[Mapping[str, str]] = None,
+               ) -> None:
+        """
+        Record an observation for a series.
+        :param metric_name: The name of the metric.
+        :param value: The observed value.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions identifying the series.
+        """
+        key = (metric_name, DimensionSet(dimensions))
+        with self.__lock:
+            self.__get_sketch(key).add(value)
+
+    def merge(self,
+              metric_name: str,
+              sketch: QuantileSketch,
+              dimensions: Optional[Mapping[str, str]] = None,
+              ) -> None:
+        """
+        Merge a sketch (e.g. recorded in another process) into a series.
+        :param metric_name: The name of the metric.
+        :param sketch: The sketch to merge.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions identifying the series.
+        """
+        key = (metric_name, DimensionSet(dimensions))
+        with self.__lock:
+            self.__get_sketch(key).merge(sketch)
+
+    def collect(self, timestamp: Optional[float] = None) -> List[Metric]:
+        """
+        Create metrics from the observations since the last collection and
+        reset all series.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds)
+         for all metrics.
+        :return: A summary and the percentile gauges for every series.
+        """
+        with self.__lock:
+            sketches = self.__sketches
+            self.__sketches = {}
+
+        factory = self.__factory
+        metrics = []
+        for (metric_name, dimensions), sketch in sketches.items():
+            if not sketch.count:
+                continue
+            metrics.append(factory.create_float_summary(
+                metric_name, sketch.min, sketch.max, sketch.sum,
+                sketch.count, dimensions, timestamp))
+            for suffix, value in zip(
+                    self.__suffixes, sketch.quantiles(self.__percentiles)):
+                metrics.append(factory.create_float_gauge(
+                    metric_name + suffix, value, dimensions, timestamp))
+        return metrics
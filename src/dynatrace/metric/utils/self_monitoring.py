@@ -0,0 +1,181 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import bisect
+import threading
+import weakref
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from ._metric import Metric
+from ._normalize import Normalize
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+
+# upper bounds (in nanoseconds) of the serialization time histogram buckets:
+# 1us, 2us, 4us, ... ~1s. Everything above the last bound is counted in an
+# overflow bucket.
+_DURATION_BUCKET_BOUNDS_NS = tuple(1_000 * 2 ** i for i in range(21))
+
+
+class SelfMonitoring:
+    """
+    Collects internal counters and timers of the library. Pass an instance to
+    one or more :class:`DynatraceMetricsSerializer` objects to record how
+    many lines and bytes they produce, how long serialization takes and which
+    errors occur. Serializers without self-monitoring do not pay for it.
+
+    The collected data can be read as a snapshot, or turned into
+    "dt.sdk.*" metrics that can be serialized like any other metric.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__normalizers: "weakref.WeakSet[Normalize]" = weakref.WeakSet()
+
+        self.__lines_serialized = 0
+        self.__bytes_produced = 0
+        self.__lines_dropped = 0
+        self.__dimensions_dropped = 0
+        self.__errors: Dict[str, int] = {}
+        self.__duration_buckets = [0] * (len(_DURATION_BUCKET_BOUNDS_NS) + 1)
+
+        # summary of serialization durations since the last collection.
+        self.__duration_min = 0
+        self.__duration_max = 0
+        self.__duration_sum = 0
+        self.__duration_count = 0
+
+        # counter values at the time of the last collection, used to
+        # export deltas.
+        self.__last_collected: Dict[Tuple[str, Optional[str]], int] = {}
+
+    def _register_normalizer(self, normalize: Normalize) -> None:
+        self.__normalizers.add(normalize)
+
+    def _record_line(self, line: str, duration_ns: int) -> None:
+        # len() of an ASCII string equals its encoded size, and isascii()
+        # does not need to scan the string.
+        size = len(line) if line.isascii() else len(line.encode("utf-8"))
+        bucket = bisect.bisect_left(_DURATION_BUCKET_BOUNDS_NS, duration_ns)
+
+        with self.__lock:
+            self.__lines_serialized += 1
+            self.__bytes_produced += size
+            self.__duration_buckets[bucket] += 1
+            if self.__duration_count == 0:
+                self.__duration_min = duration_ns
+                self.__duration_max = duration_ns
+            elif duration_ns < self.__duration_min:
+                self.__duration_min = duration_ns
+            elif duration_ns > self.__duration_max:
+                self.__duration_max = duration_ns
+            self.__duration_sum += duration_ns
+            self.__duration_count += 1
+
+    def _record_error(self, reason: Optional[str],
+                      line_dropped: bool = False) -> None:
+        reason = reason if reason else "other"
+        with self.__lock:
+            self.__errors[reason] = self.__errors.get(reason, 0) + 1
+            if line_dropped:
+                self.__lines_dropped += 1
+
+    def _record_dimensions_dropped(self, count: int) -> None:
+        with self.__lock:
+            self.__dimensions_dropped += count
+
+    def __cache_statistics(self) -> Tuple[int, int]:
+        hits = misses = 0
+        for normalize in list(self.__normalizers):
+            normalizer_hits, normalizer_misses = normalize.cache_statistics()
+            hits += normalizer_hits
+            misses += normalizer_misses
+        return hits, misses
+
+    def snapshot(self) -> Mapping[str, object]:
+        """
+        Get the current state of all counters. Counters are cumulative since
+        the creation of this object.
+        :return: A dictionary with the counter values. The serialization
+        time histogram maps the upper bound of each bucket in nanoseconds
+        (None for the overflow bucket) to the number of observations.
+        """
+        cache_hits, cache_misses = self.__cache_statistics()
+        with self.__lock:
+            histogram = dict(zip(_DURATION_BUCKET_BOUNDS_NS + (None,),
+                                 self.__duration_buckets))
+            return {
+                "lines_serialized": self.__lines_serialized,
+                "bytes_produced": self.__bytes_produced,
+                "lines_dropped_too_long": self.__lines_dropped,
+                "dimensions_dropped_to_fit": self.__dimensions_dropped,
+                "errors": dict(self.__errors),
+                "normalization_cache_hits": cache_hits,
+                "normalization_cache_misses": cache_misses,
+                "serialization_time_histogram_ns": histogram,
+            }
+
+    def collect_metrics(
+        self,
+        factory: Optional[DynatraceMetricsFactory] = None,
+    ) -> List[Metric]:
+        """
+        Create "dt.sdk.*" metrics from the data collected since the last
+        call. Counters are exported as deltas, serialization durations as a
+        summary in milliseconds.
+        :param factory: An optional factory used to create the metrics.
+        :return: A list of :class:`Metric` objects.
+        """
+        factory = factory if factory else DynatraceMetricsFactory()
+        cache_hits, cache_misses = self.__cache_statistics()
+
+        with self.__lock:
+            counters = [
+                ("dt.sdk.serializer.lines", None, self.__lines_serialized),
+                ("dt.sdk.serializer.bytes", None, self.__bytes_produced),
+                ("dt.sdk.serializer.lines_dropped", None,
+                 self.__lines_dropped),
+                ("dt.sdk.serializer.dimensions_dropped", None,
+                 self.__dimensions_dropped),
+                ("dt.sdk.normalization.cache_hits", None, cache_hits),
+                ("dt.sdk.normalization.cache_misses", None, cache_misses),
+            ]
+            counters.extend(("dt.sdk.serializer.errors", reason, count)
+                            for reason, count in self.__errors.items())
+
+            duration = (self.__duration_min, self.__duration_max,
+                        self.__duration_sum, self.__duration_count)
+            self.__duration_min = self.__duration_max = 0
+            self.__duration_sum = self.__duration_count = 0
+
+            deltas = []
+            for name, reason, value in counters:
+                key = (name, reason)
+                delta = value - self.__last_collected.get(key, 0)
+                self.__last_collected[key] = value
+                if delta:
+                    deltas.append((name, reason, delta))
+
+        metrics = [
+            factory.create_int_counter_delta(
+                name, delta, {"reason": reason} if reason else None)
+            for name, reason, delta in deltas
+        ]
+
+        minimum, maximum, total, count = duration
+        if count:
+            metrics.append(factory.create_float_summary(
+                "dt.sdk.serializer.duration",
+                minimum / 1e6, maximum / 1e6, total / 1e6, count))
+
+        return metrics
@@ -0,0 +1,144 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+from types import MappingProxyType
+from typing import Mapping, Optional, TYPE_CHECKING
+
+from ._dynatrace_metadata_enricher import DynatraceMetadataEnricher
+from ._normalize import Normalize
+
+if TYPE_CHECKING:
+    from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+    from .self_monitoring import SelfMonitoring
+
+
+def _restore_serializer_config(static_dimensions: Mapping[str, str],
+                               ) -> "SerializerConfig":
+    return SerializerConfig._from_static_dimensions(static_dimensions)
+
+
+class SerializerConfig:
+    """
+    The settings that do not depend on a metric key prefix or default
+    dimensions: the serializer-specific dimensions (Dynatrace metadata and
+    metrics source), which are read and normalized once, and the normalizer
+    with its caches. A config is immutable and can be shared by any number
+    of serializers, e.g. one per tenant in a multi-tenant service. Creating
+    a serializer from a config does not read the Dynatrace metadata again,
+    and all serializers share one warm normalization cache.
+
+    Profiling hooks added to one of the serializers only instrument the
+    normalization of that serializer.
+    """
+
+    def __init__(self,
+                 logger: Optional[logging.Logger] = None,
+                 enrich_with_dynatrace_metadata: bool = True,
+                 metrics_source: Optional[str] = None,
+                 ) -> None:
+        """
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        :param enrich_with_dynatrace_metadata: Whether to add the Dynatrace
+         metadata dimensions to all metrics.
+        :param metrics_source: An optional value for the "dt.metrics.source"
+         dimension.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+
+        if enrich_with_dynatrace_metadata:
+            # create an enricher and get the Dynatrace metadata dimensions
+            # this enricher uses a child logger of the config logger.
+            enricher = DynatraceMetadataEnricher(
+                self.__logger.getChild(DynatraceMetadataEnricher.__name__))
+            static_dimensions = dict(enricher.get_dynatrace_metadata())
+        else:
+            static_dimensions = {}
+
+        # create an instance of the normalizer class with a child logger
+        self.__normalize = Normalize(
+            self.__logger.getChild(Normalize.__name__)
+        )
+
+        # String is not None and non-empty.
+        if metrics_source:
+            static_dimensions['dt.metrics.source'] = metrics_source
+
+        if not static_dimensions:
+            self.__static_dimensions = {}
+        else:
+            self.__static_dimensions = \
+                self.__normalize.normalize_and_escape_dimensions(
+                    static_dimensions)
+
+    @classmethod
+    def _from_static_dimensions(cls,
+                                static_dimensions: Mapping[str, str],
+                                logger: Optional[logging.Logger] = None,
+                                ) -> "SerializerConfig":
+        """
+        Create a config from already normalized and escaped static
+        dimensions, without reading the Dynatrace metadata.
+        """
+        config = cls(logger, enrich_with_dynatrace_metadata=False)
+        config.__static_dimensions = dict(static_dimensions)
+        return config
+
+    def __reduce__(self):
+        # the normalizer and its caches are re-created in the receiving
+        # process.
+        return _restore_serializer_config, (self.__static_dimensions,)
+
+    @property
+    def static_dimensions(self) -> Mapping[str, str]:
+        """
+        The normalized and escaped serializer-specific dimensions.
+        """
+        return MappingProxyType(self.__static_dimensions)
+
+    @property
+    def _normalize(self) -> Normalize:
+        return self.__normalize
+
+    @property
+    def _static_dimensions(self) -> Mapping[str, str]:
+        # the dict itself, to avoid the proxy on the serialization path. It is
+        # never modified.
+        return self.__static_dimensions
+
+    def serializer(self,
+                   metric_key_prefix: Optional[str] = None,
+                   default_dimensions: Optional[Mapping[str, str]] = None,
+                   logger: Optional[logging.Logger] = None,
+                   self_monitoring: Optional["SelfMonitoring"] = None,
+                   drop_dimensions_to_fit: bool = False,
+                   ) -> "DynatraceMetricsSerializer":
+        """
+        Create a serializer that uses this config.
+        :param metric_key_prefix: An optional prefix for all metric keys.
+        :param default_dimensions: Optional dimensions added to all metrics.
+        :param logger: An optional logger for the serializer.
+        :param self_monitoring: An optional :class:`SelfMonitoring` instance.
+        :param drop_dimensions_to_fit: Whether to drop dimensions instead of
+         rejecting metric lines that exceed the maximum line length.
+        :return: A :class:`DynatraceMetricsSerializer`.
+        """
+        from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+
+        return DynatraceMetricsSerializer(
+            logger, metric_key_prefix, default_dimensions,
+            self_monitoring=self_monitoring,
+            drop_dimensions_to_fit=drop_dimensions_to_fit,
+            config=self)
@@ -0,0 +1,213 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+from ._timing_wheel import HierarchicalTimingWheel
+
+
+class SeriesExpiry:
+    """
+    Expires idle series, e.g. the series of a converter or the entries of
+    a cache, so the memory of stateful structures stays proportional to
+    the number of active series. One instance can be shared by several
+    structures, each of which registers with its own timeout through
+    :meth:`tracker`:
+
+        expiry = SeriesExpiry()
+        converter = CumulativeToDeltaConverter(expiry=expiry)
+        prometheus = PrometheusConverter(expiry=expiry)
+
+    Deadlines are kept in a hierarchical timing wheel, so touching a series
+    and expiring series take constant time per series, and expiry never
+    scans all series. Touching a series that is already tracked only
+    records the current tick; the series is rescheduled lazily when its
+    original deadline is reached.
+    """
+    DEFAULT_RESOLUTION_SECONDS = 1.0
+
+    def __init__(self,
+                 resolution: float = DEFAULT_RESOLUTION_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 ) -> None:
+        """
+        :param resolution: The length of a tick of the timing wheel, in
+         seconds. Series expire up to one tick after their timeout.
+        :param clock: A function returning the current time in seconds.
+         Defaults to time.monotonic.
+        """
+        if resolution <= 0:
+            raise ValueError("The resolution must be positive.")
+
+        self.__resolution = resolution
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self._tick = self.__tick_now()
+        self.__wheel = HierarchicalTimingWheel(self._tick)
+
+    @property
+    def resolution(self) -> float:
+        return self.__resolution
+
+    def tracker(self, timeout: float) -> "ExpiryTracker":
+        """
+        Register a structure whose series expire after a timeout.
+        :param timeout: The number of seconds after which a series that has
+         not been touched expires.
+        :return: An :class:`ExpiryTracker` for the series of the structure.
+        """
+        if timeout <= 0:
+            raise ValueError("The timeout must be positive.")
+        return ExpiryTracker(self, math.ceil(timeout / self.__resolution))
+
+    def advance(self) -> None:
+        """
+        Move the timing wheel to the current time. The series that are due
+        are handed to their trackers, which check them in
+        :meth:`ExpiryTracker.expired`. Trackers advance the wheel
+        themselves, so calling this is optional.
+        """
+        # inlined __tick_now, as this is called on hot paths.
+        tick = int(self.__clock() // self.__resolution)
+        if tick <= self._tick:
+            return
+        with self.__lock:
+            if tick > self._tick:
+                self.__wheel.advance(tick, self.__on_due)
+                self._tick = tick
+
+    def _schedule(self,
+                  tracker: "ExpiryTracker",
+                  key: Hashable,
+                  deadline: int,
+                  ) -> None:
+        with self.__lock:
+            self.__wheel.schedule((tracker, key), deadline)
+
+    def _lock(self) -> threading.Lock:
+        return self.__lock
+
+    def __tick_now(self) -> int:
+        return int(self.__clock() // self.__resolution)
+
+    def __on_due(self, item) -> None:
+        tracker, key = item
+        deadline = tracker._on_due(key, self.__wheel.tick)
+        if deadline is not None:
+            self.__wheel.schedule(item, deadline)
+
+
+class ExpiryTracker:
+    """
+    Tracks when the series of one structure were last used. Created by
+    :meth:`SeriesExpiry.tracker`.
+
+    The structure calls :meth:`touch` whenever a series is used and removes
+    the series returned by :meth:`expired`. Both have to be called by one
+    thread at a time, e.g. under the lock of the structure; the shared
+    :class:`SeriesExpiry` never calls back into the structure.
+    """
+    __slots__ = ("__expiry", "__timeout_ticks", "__last_ticks", "__due")
+
+    def __init__(self, expiry: SeriesExpiry, timeout_ticks: int) -> None:
+        self.__expiry = expiry
+        self.__timeout_ticks = timeout_ticks
+        # the tick in which each series was last touched.
+        self.__last_ticks: Dict[Hashable, int] = {}
+        # series whose deadline passed, which may have been touched since.
+        self.__due: List[Hashable] = []
+
+    def touch(self, key: Hashable) -> None:
+        """
+        Mark the series as used now.
+        """
+        last_ticks = self.__last_ticks
+        tick = self.__expiry._tick
+        previous = last_ticks.get(key)
+        if previous is not None:
+            if previous != tick:
+                last_ticks[key] = tick
+            return
+
+        last_ticks[key] = tick
+        # keys touched at the end of a tick are kept for the full timeout.
+        self.__expiry._schedule(self, key, tick + self.__timeout_ticks + 1)
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Stop tracking the series.
+        """
+        self.__last_ticks.pop(key, None)
+
+    def expired(self) -> List[Hashable]:
+        """
+        Advance the shared timing wheel to the current time.
+        :return: The series that have not been touched for the timeout and
+         are no longer tracked.
+        """
+        expiry = self.__expiry
+        expiry.advance()
+        if not self.__due:
+            return []
+
+        with expiry._lock():
+            due = self.__due
+            self.__due = []
+
+        tick = expiry._tick
+        timeout_ticks = self.__timeout_ticks
+        last_ticks = self.__last_ticks
+        expired = []
+        for key in due:
+            last_tick = last_ticks.get(key)
+            if last_tick is None:
+                # discarded
+                continue
+            deadline = last_tick + timeout_ticks + 1
+            if deadline <= tick:
+                del last_ticks[key]
+                expired.append(key)
+            else:
+                # touched since it was scheduled.
+                expiry._schedule(self, key, deadline)
+        return expired
+
+    def _on_due(self, key: Hashable, tick: int) -> Optional[int]:
+        """
+        Called by the SeriesExpiry, with its lock held, when the deadline of
+        a series passed.
+        :return: The new deadline if the series was touched since it was
+         scheduled.
+        """
+        last_tick = self.__last_ticks.get(key)
+        if last_tick is None:
+            # discarded
+            return None
+        deadline = last_tick + self.__timeout_ticks + 1
+        if deadline > tick:
+            return deadline
+        # the owner checks the series again, as it may be touched
+        # concurrently.
+        self.__due.append(key)
+        return None
+
+    def __len__(self) -> int:
+        """
+        The number of series that are tracked.
+        """
+        return len(self.__last_ticks)
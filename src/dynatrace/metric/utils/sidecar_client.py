@@ -0,0 +1,323 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import logging
+import socket
+import struct
+import threading
+from typing import Dict, List, Mapping, Optional, Set, Tuple, Union
+
+from . import _sidecar_protocol as protocol
+from .metric_error import MetricError
+
+Number = Union[int, float]
+
+
+class SidecarClient:
+    """
+    Sends metrics to a :class:`SidecarDaemon` over a Unix domain socket, as
+    compact binary records. The client does not normalize, validate or
+    serialize anything: every value is packed into a fixed-size record that
+    refers to its series (metric name and dimensions) by an id, and the
+    records are written to the socket in batches. The daemon does the
+    aggregation, normalization, serialization and export.
+
+    Records are buffered until the buffer is full or :meth:`flush` is
+    called, so call :meth:`flush` periodically (or use the client as a
+    context manager). Sending never raises: if the daemon cannot be reached,
+    the buffered records are dropped and counted in :attr:`dropped_records`,
+    and the client reconnects on the next flush.
+
+    With datagram sockets, every datagram contains the series records of the
+    series it uses, so datagrams are independent of each other.
+
+    The ids of at most max_series series are kept. When more series are
+    used, all ids are forgotten and reassigned, and the series are defined
+    again with their new ids.
+    """
+    STREAM_BUFFER_SIZE = 64 * 1024
+    # the maximum datagram size of Unix domain sockets on macOS.
+    DATAGRAM_BUFFER_SIZE = 2048
+    DEFAULT_MAX_SERIES = 10_000
+
+    def __init__(self,
+                 path: str,
+                 datagram: bool = False,
+                 buffer_size: Optional[int] = None,
+                 timeout: float = 1.0,
+                 logger: Optional[logging.Logger] = None,
+                 max_series: int = DEFAULT_MAX_SERIES,
+                 ) -> None:
+        """
+        :param path: The path of the socket of the daemon.
+        :param datagram: Whether to use a datagram socket instead of a
+         stream socket.
+        :param buffer_size: The number of bytes that are buffered before they
+         are sent. For datagram sockets, this is the maximum datagram size.
+        :param timeout: The maximum time in seconds to wait for the daemon
+         when sending.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        :param max_series: The maximum number of series ids that are kept,
+         at most 65536.
+        """
+        self.__logger = logger if logger else logging.getLogger(__name__)
+        self.__path = path
+        self.__datagram = datagram
+        if buffer_size is None:
+            buffer_size = (SidecarClient.DATAGRAM_BUFFER_SIZE if datagram
+                           else SidecarClient.STREAM_BUFFER_SIZE)
+        self.__buffer_size = buffer_size
+        self.__timeout = timeout
+        self.__max_series = min(max_series, protocol.MAX_SERIES)
+
+        self.__lock = threading.Lock()
+        self.__socket: Optional[socket.socket] = None
+        self.__buffer = bytearray()
+        self.__buffered_records = 0
+        self.__dropped_records = 0
+
+        # maps (metric name, dimension items) to series ids.
+        self.__series_ids: Dict[Tuple[str, Tuple[Tuple[str, str], ...]],
+                                int] = {}
+        # the series record of every series id.
+        self.__series_records: List[bytes] = []
+        # the series sent on the current connection or in the current
+        # datagram.
+        self.__defined: Set[int] = set()
+
+    @property
+    def dropped_records(self) -> int:
+        """
+        The number of value records that could not be sent.
+        """
+        return self.__dropped_records
+
+    def add(self,
+            metric_name: str,
+            value: Number = 1,
+            dimensions: Optional[Mapping[str, str]] = None,
+            timestamp: Optional[int] = None,
+            ) -> None:
+        """
+        Add a value to a delta counter.
+        :param metric_name: The name of the metric.
+        :param value: The value to add.
+        :param dimensions: Optional dimensions.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds).
+        """
+        if type(value) is int:
+            self.__send(metric_name, dimensions, protocol.COUNTER_INT, value,
+                        timestamp)
+        else:
+            self.__send(metric_name, dimensions, protocol.COUNTER_FLOAT,
+                        value, timestamp)
+
+    def gauge(self,
+              metric_name: str,
+              value: Number,
+              dimensions: Optional[Mapping[str, str]] = None,
+              timestamp: Optional[int] = None,
+              ) -> None:
+        """
+        Set the value of a gauge. The daemon exports the last value.
+        """
+        if type(value) is int:
+            self.__send(metric_name, dimensions, protocol.GAUGE_INT, value,
+                        timestamp)
+        else:
+            self.__send(metric_name, dimensions, protocol.GAUGE_FLOAT, value,
+                        timestamp)
+
+    def record(self,
+               metric_name: str,
+               value: Number,
+               dimensions: Optional[Mapping[str, str]] = None,
+               timestamp: Optional[int] = None,
+               ) -> None:
+        """
+        Record a value into a summary (minimum, maximum, sum and count).
+        """
+        if type(value) is int:
+            self.__send(metric_name, dimensions, protocol.SUMMARY_INT, value,
+                        timestamp)
+        else:
+            self.__send(metric_name, dimensions, protocol.SUMMARY_FLOAT,
+                        value, timestamp)
+
+    def __send(self,
+               metric_name: str,
+               dimensions: Optional[Mapping[str, str]],
+               kind: int,
+               value: Number,
+               timestamp: Optional[int],
+               ) -> None:
+        key = (metric_name, tuple(dimensions.items()) if dimensions else ())
+        with self.__lock:
+            series_id = self.__series_ids.get(key)
+            if series_id is None:
+                series_id = self.__define(metric_name, dimensions, key)
+            record = self.__pack(series_id, kind, value, timestamp)
+
+            size = len(record)
+            if series_id not in self.__defined:
+                size += len(self.__series_records[series_id])
+            if self.__buffer and len(self.__buffer) + size > \
+                    self.__buffer_size:
+                self.__flush_locked()
+
+            buffer = self.__buffer
+            if series_id not in self.__defined:
+                buffer += self.__series_records[series_id]
+                self.__defined.add(series_id)
+            buffer += record
+            self.__buffered_records += 1
+
+            if len(buffer) >= self.__buffer_size:
+                self.__flush_locked()
+
+    @staticmethod
+    def __pack(series_id: int,
+               kind: int,
+               value: Number,
+               timestamp: Optional[int],
+               ) -> bytes:
+        timestamp = int(timestamp) if timestamp else 0
+        if kind in protocol.INT_KINDS:
+            try:
+                return protocol.INT_VALUE.pack(
+                    protocol.VALUE_RECORD_LENGTH, protocol.VALUE_RECORD,
+                    series_id, kind, value, timestamp)
+            except struct.error:
+                # ints that do not fit into 64 bits are sent as floats.
+                kind += 1
+                value = float(value)
+
+        try:
+            return protocol.FLOAT_VALUE.pack(
+                protocol.VALUE_RECORD_LENGTH, protocol.VALUE_RECORD,
+                series_id, kind, value, timestamp)
+        except struct.error:
+            raise MetricError(
+                "Unexpected value type: {}".format(type(value)),
+                reason="invalid_type") from None
+
+    def __define(self,
+                 metric_name: str,
+                 dimensions: Optional[Mapping[str, str]],
+                 key: Tuple[str, Tuple[Tuple[str, str], ...]],
+                 ) -> int:
+        if not isinstance(metric_name, str):
+            raise MetricError(
+                f"Unexpected metric key type: {type(metric_name)}",
+                reason="invalid_type")
+        if dimensions:
+            for dimension_key, dimension_value in dimensions.items():
+                if not isinstance(dimension_key, str) \
+                        or not isinstance(dimension_value, str):
+                    raise MetricError("Dimension keys and values have to be "
+                                      "strings", reason="invalid_type")
+
+        if len(self.__series_records) >= self.__max_series:
+            # the ids are reused. Series records already buffered are read
+            # by the daemon before the ones redefining their ids.
+            self.__series_ids.clear()
+            self.__series_records.clear()
+            self.__defined.clear()
+
+        series_id = len(self.__series_records)
+        series_record = protocol.encode_series(series_id, metric_name,
+                                               dimensions)
+        if self.__datagram and len(series_record) + protocol.INT_VALUE.size \
+                > self.__buffer_size:
+            raise MetricError(
+                "The series does not fit into a datagram of {} bytes: "
+                "{}".format(self.__buffer_size, metric_name),
+                reason="series_too_large")
+
+        self.__series_records.append(series_record)
+        self.__series_ids[key] = series_id
+        return series_id
+
+    def flush(self) -> None:
+        """
+        Send all buffered records to the daemon.
+        """
+        with self.__lock:
+            self.__flush_locked()
+
+    def __flush_locked(self) -> None:
+        if not self.__buffer:
+            return
+
+        data = bytes(self.__buffer)
+        records = self.__buffered_records
+        self.__buffer.clear()
+        self.__buffered_records = 0
+
+        try:
+            if self.__socket is None:
+                self.__socket = self.__connect()
+            if self.__datagram:
+                self.__socket.send(data)
+            else:
+                self.__socket.sendall(data)
+        except OSError as err:
+            # a partially sent buffer cannot be continued on a new
+            # connection, which starts without any series.
+            if self.__dropped_records == 0:
+                self.__logger.warning(
+                    "Could not send metrics to the sidecar daemon at %s: %s",
+                    self.__path, err)
+            self.__dropped_records += records
+            self.__close_socket()
+            self.__defined.clear()
+            return
+
+        if self.__datagram:
+            # every datagram defines the series it uses.
+            self.__defined.clear()
+
+    def __connect(self) -> socket.socket:
+        sock = socket.socket(
+            socket.AF_UNIX,
+            socket.SOCK_DGRAM if self.__datagram else socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.__timeout)
+            sock.connect(self.__path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def __close_socket(self) -> None:
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    def close(self) -> None:
+        """
+        Send all buffered records and close the connection to the daemon.
+        """
+        with self.__lock:
+            self.__flush_locked()
+            self.__close_socket()
+            self.__defined.clear()
+
+    def __enter__(self) -> "SidecarClient":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
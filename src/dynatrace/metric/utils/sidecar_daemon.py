@@ -0,0 +1,334 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import functools
+import logging
+import math
+import os
+import socket
+import stat
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import _sidecar_protocol as protocol
+from ._cache import BoundedCache
+from ._listener import _Listener
+from ._metric import Metric
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+from .thread_local_recorder import SeriesKey, _series_key
+
+# maps the series ids of a connection or datagram to the series, or to None
+# for series that are invalid.
+SeriesTable = Dict[int, Optional[SeriesKey]]
+
+
+class _Connection:
+    __slots__ = ("sock", "buffer", "series")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.buffer = bytearray()
+        self.series: SeriesTable = {}
+
+
+class SidecarDaemon(_Listener):
+    """
+    Receives metrics from :class:`SidecarClient` instances over a Unix
+    domain socket, aggregates them and periodically serializes and exports
+    them. Running the daemon next to latency-sensitive applications moves
+    the normalization, serialization and HTTP requests out of the
+    application processes.
+
+    Per flush interval and series, counters are summed, gauges keep their
+    last value and summaries their minimum, maximum, sum and count. Every
+    metric gets the timestamp of the last value recorded for it. Values for
+    series that were not defined before are counted as invalid.
+
+    Use :meth:`serve_forever` to run the daemon in the current thread, or
+    :meth:`start` to run it in a background thread.
+    """
+    RECEIVE_SIZE = 256 * 1024
+
+    def __init__(self,
+                 path: str,
+                 serializer: Optional[DynatraceMetricsSerializer] = None,
+                 export: Optional[Callable[[str], None]] = None,
+                 endpoint: Optional[str] = None,
+                 api_token: Optional[str] = None,
+                 flush_interval: float = 60.0,
+                 datagram: bool = False,
+                 logger: Optional[logging.Logger] = None,
+                 ) -> None:
+        """
+        :param path: The path of the socket. A socket left over at this path,
+         e.g. by a daemon that was killed, is replaced.
+        :param serializer: The serializer used to create the metric lines.
+         Defaults to a serializer with the Dynatrace metadata enrichment.
+        :param export: An optional callable that is called with every payload
+         of newline-separated metric lines. Defaults to sending them to the
+         endpoint.
+        :param endpoint: The metrics ingest endpoint. Defaults to the local
+         OneAgent endpoint.
+        :param api_token: An optional API token for the endpoint.
+        :param flush_interval: The time in seconds between two exports.
+        :param datagram: Whether to listen on a datagram socket instead of a
+         stream socket.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        """
+        super().__init__(
+            serializer, export, endpoint, api_token, flush_interval,
+            logger if logger else logging.getLogger(__name__),
+            ("records_received", "records_invalid"))
+        self.__path = path
+        self.__datagram = datagram
+
+        # maps (metric name, dimension items) of series records to the
+        # normalized series, shared by all connections.
+        self.__series_keys = BoundedCache()
+
+        self.__counters: Dict[SeriesKey, list] = {}
+        self.__gauges: Dict[SeriesKey, list] = {}
+        self.__summaries: Dict[SeriesKey, list] = {}
+
+        self.__socket = self.__bind()
+
+    def __bind(self) -> socket.socket:
+        try:
+            if stat.S_ISSOCK(os.stat(self.__path).st_mode):
+                os.unlink(self.__path)
+        except FileNotFoundError:
+            pass
+
+        sock = socket.socket(
+            socket.AF_UNIX,
+            socket.SOCK_DGRAM if self.__datagram else socket.SOCK_STREAM)
+        try:
+            sock.bind(self.__path)
+            if not self.__datagram:
+                sock.listen()
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+
+        self._register(sock, self.__receive_datagram if self.__datagram
+                       else self.__accept)
+        return sock
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __accept(self) -> None:
+        try:
+            sock, _ = self.__socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        connection = _Connection(sock)
+        self._register(sock, functools.partial(self.__receive, connection))
+
+    def __receive(self, connection: _Connection) -> None:
+        try:
+            data = connection.sock.recv(SidecarDaemon.RECEIVE_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            self.__close_connection(connection)
+            return
+
+        buffer = connection.buffer
+        buffer += data
+        try:
+            consumed = self.__handle_records(buffer, connection.series)
+        except protocol.ProtocolError as err:
+            self._logger.warning("Closing sidecar connection: %s", err)
+            self.__close_connection(connection)
+            return
+        del buffer[:consumed]
+
+    def __close_connection(self, connection: _Connection) -> None:
+        self._unregister(connection.sock)
+        connection.sock.close()
+
+    def __receive_datagram(self) -> None:
+        try:
+            data = self.__socket.recv(SidecarDaemon.RECEIVE_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as err:
+            # e.g. ENOBUFS. The socket stays usable.
+            self._logger.warning("Could not receive sidecar datagram: %s",
+                                 err)
+            return
+
+        try:
+            # every datagram defines the series it uses.
+            consumed = self.__handle_records(data, {})
+            if consumed != len(data):
+                raise protocol.ProtocolError("Incomplete record")
+        except protocol.ProtocolError as err:
+            self._logger.warning("Dropping sidecar datagram: %s", err)
+
+    def __handle_records(self, data, series: SeriesTable) -> int:
+        """
+        Aggregate all complete records at the start of the data.
+        :return: The number of bytes consumed.
+        """
+        size = len(data)
+        offset = 0
+        received = invalid = 0
+        int_kinds = protocol.INT_KINDS
+        header_size = protocol.RECORD_LENGTH.size + 1
+
+        with self._lock:
+            counters = self.__counters
+            gauges = self.__gauges
+            summaries = self.__summaries
+
+            while size - offset >= header_size:
+                (length,) = protocol.RECORD_LENGTH.unpack_from(data, offset)
+                if length > protocol.MAX_RECORD_LENGTH:
+                    # rejected before the record is buffered.
+                    raise protocol.ProtocolError(
+                        "Record length {} exceeds the maximum".format(length))
+                end = offset + protocol.RECORD_LENGTH.size + length
+                if end > size:
+                    break
+
+                record_type = data[offset + protocol.RECORD_LENGTH.size]
+                if record_type == protocol.SERIES_RECORD:
+                    series_id, metric_name, dimensions = \
+                        protocol.decode_series(data, offset, end)
+                    series[series_id] = self.__series_key(metric_name,
+                                                          dimensions)
+                    offset = end
+                    continue
+
+                if (record_type != protocol.VALUE_RECORD
+                        or length != protocol.VALUE_RECORD_LENGTH):
+                    raise protocol.ProtocolError(
+                        "Unexpected record type {} of length {}".format(
+                            record_type, length))
+
+                kind = data[offset + protocol.KIND_OFFSET]
+                if kind in int_kinds:
+                    _, _, series_id, kind, value, timestamp = \
+                        protocol.INT_VALUE.unpack_from(data, offset)
+                else:
+                    _, _, series_id, kind, value, timestamp = \
+                        protocol.FLOAT_VALUE.unpack_from(data, offset)
+                offset = end
+                received += 1
+
+                key = series.get(series_id)
+                if (key is None or kind not in protocol.KINDS
+                        or not math.isfinite(value)):
+                    if series_id not in series:
+                        self._logger.debug("Value for unknown series %d",
+                                           series_id)
+                    invalid += 1
+                    continue
+
+                if kind <= protocol.COUNTER_FLOAT:
+                    counter = counters.get(key)
+                    if counter is None:
+                        counters[key] = [value, timestamp]
+                    else:
+                        counter[0] += value
+                        counter[1] = timestamp
+                elif kind <= protocol.GAUGE_FLOAT:
+                    gauges[key] = [value, timestamp]
+                else:
+                    summary = summaries.get(key)
+                    if summary is None:
+                        summaries[key] = [value, value, value, 1, timestamp]
+                    else:
+                        if value < summary[0]:
+                            summary[0] = value
+                        elif value > summary[1]:
+                            summary[1] = value
+                        summary[2] += value
+                        summary[3] += 1
+                        summary[4] = timestamp
+
+            self._statistics["records_received"] += received
+            self._statistics["records_invalid"] += invalid
+        return offset
+
+    def __series_key(self,
+                     metric_name: str,
+                     dimensions: List[Tuple[str, str]],
+                     ) -> Optional[SeriesKey]:
+        try:
+            return self.__series_keys.get_or_compute(
+                (metric_name, tuple(dimensions)), self.__normalize_series)
+        except MetricError as err:
+            self._logger.debug("Invalid series %s: %s", metric_name, err)
+            return None
+
+    @staticmethod
+    def __normalize_series(series: Tuple[str, Tuple[Tuple[str, str], ...]]
+                           ) -> SeriesKey:
+        metric_name, dimensions = series
+        return _series_key(metric_name, DimensionSet(dict(dimensions)))
+
+    def _collect_metrics(self) -> List[Metric]:
+        with self._lock:
+            counters = self.__counters
+            gauges = self.__gauges
+            summaries = self.__summaries
+            self.__counters = {}
+            self.__gauges = {}
+            self.__summaries = {}
+
+        factory = self._factory
+        metrics = []
+        for (metric_name, dimensions), (value, timestamp) in \
+                counters.items():
+            self._append_metric(
+                metrics,
+                factory.create_int_counter_delta if type(value) is int
+                else factory.create_float_counter_delta,
+                metric_name, value, dimensions, timestamp or None)
+
+        for (metric_name, dimensions), (value, timestamp) in gauges.items():
+            self._append_metric(
+                metrics,
+                factory.create_int_gauge if type(value) is int
+                else factory.create_float_gauge,
+                metric_name, value, dimensions, timestamp or None)
+
+        for (metric_name, dimensions), \
+                (minimum, maximum, total, count, timestamp) in \
+                summaries.items():
+            self._append_metric(
+                metrics,
+                factory.create_int_summary if type(total) is int
+                else factory.create_float_summary,
+                metric_name, minimum, maximum, total, count, dimensions,
+                timestamp or None)
+        return metrics
+
+    def _on_close(self) -> None:
+        try:
+            os.unlink(self.__path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,308 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import logging
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ._cache import BoundedCache
+from ._listener import _Listener
+from ._metric import Metric
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_serializer import DynatraceMetricsSerializer
+from .metric_error import MetricError
+from .series_expiry import SeriesExpiry
+from .thread_local_recorder import SeriesKey, _series_key
+
+_SUMMARY_TYPES = frozenset(("ms", "h", "d"))
+
+
+class StatsdListener(_Listener):
+    """
+    Receives metrics in the StatsD protocol over UDP, aggregates them and
+    periodically serializes and exports them. Supported are counters
+    ("c"), gauges ("g", including relative "+" and "-" updates), timers,
+    histograms and distributions ("ms", "h", "d", exported as summaries) and
+    sets ("s", exported as a gauge of the number of distinct values), with
+    sample rates ("@0.1") and DogStatsD tags ("#key:value,..."), which become
+    dimensions. Tags without a value are ignored. Gauges are exported when
+    they were updated since the last export; their last values are kept for
+    relative updates until they have not been updated for a timeout.
+
+    The socket is drained in batches whenever it is readable, and the
+    received packets are parsed without further system calls. Metric names
+    and tags are normalized once per distinct combination.
+
+    Use :meth:`serve_forever` to run the listener in the current thread, or
+    :meth:`start` to run it in a background thread.
+    """
+    # the maximum size of a UDP datagram.
+    RECEIVE_SIZE = 65535
+    # the number of packets received before they are parsed.
+    BATCH_SIZE = 256
+    SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+    DEFAULT_GAUGE_TIMEOUT_SECONDS = 600.0
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8125,
+                 serializer: Optional[DynatraceMetricsSerializer] = None,
+                 export: Optional[Callable[[str], None]] = None,
+                 endpoint: Optional[str] = None,
+                 api_token: Optional[str] = None,
+                 flush_interval: float = 10.0,
+                 logger: Optional[logging.Logger] = None,
+                 gauge_timeout: float = DEFAULT_GAUGE_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 expiry: Optional[SeriesExpiry] = None,
+                 ) -> None:
+        """
+        :param host: The address to listen on.
+        :param port: The UDP port to listen on. If 0, a free port is chosen,
+         see :attr:`address`.
+        :param serializer: The serializer used to create the metric lines.
+         Defaults to a serializer with the Dynatrace metadata enrichment.
+        :param export: An optional callable that is called with every payload
+         of newline-separated metric lines. Defaults to sending them to the
+         endpoint.
+        :param endpoint: The metrics ingest endpoint. Defaults to the local
+         OneAgent endpoint.
+        :param api_token: An optional API token for the endpoint.
+        :param flush_interval: The time in seconds between two exports.
+        :param logger: An optional logger. If None is specified, creates one
+         with the name of the module.
+        :param gauge_timeout: The number of seconds after which the last
+         value of a gauge that has not been updated is forgotten. Relative
+         updates of a forgotten gauge start at 0.
+        :param clock: A function returning the current time in seconds, used
+         to expire gauges. Defaults to time.monotonic. Ignored if an expiry
+         is passed.
+        :param expiry: An optional :class:`SeriesExpiry` shared with other
+         structures. By default, the listener has its own.
+        """
+        super().__init__(
+            serializer, export, endpoint, api_token, flush_interval,
+            logger if logger else logging.getLogger(__name__),
+            ("packets_received", "metrics_received", "metrics_invalid"))
+
+        # maps (metric name, tags) to the normalized series.
+        self.__series_keys = BoundedCache()
+
+        self.__counters: Dict[SeriesKey, float] = {}
+        # the last values of the gauges are kept across exports for
+        # relative updates. Only the updated gauges are exported.
+        self.__gauges: Dict[SeriesKey, float] = {}
+        self.__updated_gauges: Set[SeriesKey] = set()
+        if expiry is None:
+            expiry = SeriesExpiry(gauge_timeout / 60, clock)
+        self.__gauge_expiry = expiry.tracker(gauge_timeout)
+        # maps series to [min, max, sum, count], where the sum and the count
+        # are scaled by the sample rates.
+        self.__summaries: Dict[SeriesKey, list] = {}
+        self.__sets: Dict[SeriesKey, Set[str]] = {}
+
+        family, kind, protocol, _, address = socket.getaddrinfo(
+            host, port, type=socket.SOCK_DGRAM)[0]
+        self.__socket = socket.socket(family, kind, protocol)
+        try:
+            try:
+                # absorb bursts while packets are parsed.
+                self.__socket.setsockopt(socket.SOL_SOCKET,
+                                         socket.SO_RCVBUF,
+                                         StatsdListener.SOCKET_BUFFER_SIZE)
+            except OSError:
+                pass
+            self.__socket.bind(address)
+            self.__socket.setblocking(False)
+        except OSError:
+            self.__socket.close()
+            raise
+        self.__buffer = bytearray(StatsdListener.RECEIVE_SIZE)
+        self._register(self.__socket, self.__receive)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """
+        The host and port the listener is bound to.
+        """
+        return self.__socket.getsockname()[:2]
+
+    def __receive(self) -> None:
+        recv_into = self.__socket.recv_into
+        view = memoryview(self.__buffer)
+        packets = []
+        for _ in range(StatsdListener.BATCH_SIZE):
+            try:
+                size = recv_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as err:
+                # e.g. ICMP errors reported on the socket.
+                self._logger.debug("Could not receive: %s", err)
+                break
+            packets.append(str(view[:size], "utf-8", "replace"))
+
+        if packets:
+            self.__handle_packets(packets)
+
+    def __handle_packets(self, packets: List[str]) -> None:
+        received = invalid = 0
+        with self._lock:
+            for packet in packets:
+                for line in packet.split("\n"):
+                    if not line:
+                        continue
+                    received += 1
+                    try:
+                        self.__handle_line(line)
+                    except (ValueError, MetricError) as err:
+                        self._logger.debug("Invalid StatsD line %r: %s",
+                                           line, err)
+                        invalid += 1
+
+            self._statistics["packets_received"] += len(packets)
+            self._statistics["metrics_received"] += received
+            self._statistics["metrics_invalid"] += invalid
+
+    def __handle_line(self, line: str) -> None:
+        # <name>:<value>|<type>[|@<sample rate>][|#<tags>]
+        name_and_value, _, fields = line.partition("|")
+        metric_name, separator, value = name_and_value.rpartition(":")
+        if not separator or not fields:
+            raise ValueError("Missing value or type")
+
+        sample_rate = 1.0
+        tags = ""
+        if "|" in fields:
+            metric_type, *options = fields.split("|")
+            for option in options:
+                if option.startswith("@"):
+                    sample_rate = float(option[1:])
+                    if not 0 < sample_rate <= 1:
+                        raise ValueError("Invalid sample rate")
+                elif option.startswith("#"):
+                    tags = option[1:]
+        else:
+            metric_type = fields
+
+        key = self.__series_keys.get_or_compute((metric_name, tags),
+                                                self.__normalize_series)
+
+        if metric_type == "c":
+            number = self.__parse_number(value)
+            if sample_rate != 1.0:
+                number = number / sample_rate
+            self.__counters[key] = self.__counters.get(key, 0) + number
+        elif metric_type in _SUMMARY_TYPES:
+            number = self.__parse_number(value)
+            if sample_rate == 1.0:
+                total, count = number, 1
+            else:
+                total, count = number / sample_rate, 1 / sample_rate
+            summary = self.__summaries.get(key)
+            if summary is None:
+                self.__summaries[key] = [number, number, total, count]
+            else:
+                if number < summary[0]:
+                    summary[0] = number
+                elif number > summary[1]:
+                    summary[1] = number
+                summary[2] += total
+                summary[3] += count
+        elif metric_type == "g":
+            number = self.__parse_number(value)
+            if value[0] in "+-":
+                # relative to the current value.
+                number += self.__gauges.get(key, 0)
+            self.__gauges[key] = number
+            self.__updated_gauges.add(key)
+            self.__gauge_expiry.touch(key)
+        elif metric_type == "s":
+            members = self.__sets.get(key)
+            if members is None:
+                members = self.__sets[key] = set()
+            members.add(value)
+        else:
+            raise ValueError("Unknown metric type")
+
+    @staticmethod
+    def __parse_number(value: str) -> float:
+        try:
+            return int(value)
+        except ValueError:
+            number = float(value)
+        if number != number or number in (float("inf"), float("-inf")):
+            raise ValueError("The value is not finite")
+        return number
+
+    @staticmethod
+    def __normalize_series(series: Tuple[str, str]) -> SeriesKey:
+        metric_name, tags = series
+        dimensions = {}
+        if tags:
+            for tag in tags.split(","):
+                key, separator, value = tag.partition(":")
+                if separator:
+                    dimensions[key] = value
+        return _series_key(metric_name, DimensionSet(dimensions))
+
+    def _collect_metrics(self) -> List[Metric]:
+        with self._lock:
+            counters = self.__counters
+            last_gauges = self.__gauges
+            gauges = {key: last_gauges[key] for key in self.__updated_gauges}
+            for expired in self.__gauge_expiry.expired():
+                del last_gauges[expired]
+            summaries = self.__summaries
+            sets = self.__sets
+            self.__counters = {}
+            self.__updated_gauges = set()
+            self.__summaries = {}
+            self.__sets = {}
+
+        factory = self._factory
+        metrics = []
+        for (metric_name, dimensions), value in counters.items():
+            self._append_metric(
+                metrics,
+                factory.create_int_counter_delta if type(value) is int
+                else factory.create_float_counter_delta,
+                metric_name, value, dimensions)
+
+        for (metric_name, dimensions), value in gauges.items():
+            self._append_metric(
+                metrics,
+                factory.create_int_gauge if type(value) is int
+                else factory.create_float_gauge,
+                metric_name, value, dimensions)
+
+        for (metric_name, dimensions), (minimum, maximum, total, count) \
+                in summaries.items():
+            if type(total) is int and type(count) is int:
+                self._append_metric(
+                    metrics, factory.create_int_summary, metric_name,
+                    minimum, maximum, total, count, dimensions)
+            else:
+                # the count is scaled by the sample rates.
+                self._append_metric(
+                    metrics, factory.create_float_summary, metric_name,
+                    minimum, maximum, total, max(1, round(count)),
+                    dimensions)
+
+        for (metric_name, dimensions), members in sets.items():
+            self._append_metric(metrics, factory.create_int_gauge,
+                                metric_name, len(members), dimensions)
+        return metrics
@@ -0,0 +1,341 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+from ._cache import BoundedCache
+from ._metric import Metric
+from ._metric_values import _raise_if_nan_or_inf
+from ._normalize import Normalize
+from ._snapshot import read_snapshot, write_snapshot
+from .dimension_set import DimensionSet
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .metric_error import MetricError
+
+Number = Union[int, float]
+SeriesKey = Tuple[str, DimensionSet]
+
+_normalize = Normalize()
+_metric_keys = BoundedCache()
+
+
+def _normalize_metric_name(metric_name: str) -> str:
+    metric_key = _normalize.normalize_metric_key(metric_name)
+    if not metric_key:
+        raise MetricError("Metric name is empty", reason="empty_metric_key")
+    return metric_key
+
+
+def _series_key(metric_name: str,
+                dimensions: Optional[Mapping[str, str]],
+                ) -> SeriesKey:
+    if not isinstance(metric_name, str):
+        raise MetricError(
+            f"Unexpected metric key type: {type(metric_name)}",
+            reason="invalid_type")
+    # only the truncated name is cached, so oversized names are not kept
+    # alive by the cache.
+    return (_metric_keys.get_or_compute(
+                metric_name[:_normalize.max_metric_key_length()],
+                _normalize_metric_name),
+            DimensionSet(dimensions))
+
+
+class _ThreadTable:
+    """
+    The values recorded by one thread. Only the owning thread records into
+    the table, so its lock is uncontended except during collection.
+    """
+    __slots__ = ("lock", "counters", "summaries", "thread")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: Dict[SeriesKey, Number] = {}
+        # maps series to [min, max, sum, count].
+        self.summaries: Dict[SeriesKey, List[Number]] = {}
+        self.thread = threading.current_thread()
+
+
+class ThreadLocalRecorder:
+    """
+    Records counters and summaries with little contention between threads.
+    Every thread writes into its own table, guarded by a lock that only the
+    owning thread and the collector use. Recording is not lock-free, as it
+    takes this (usually uncontended) lock, but recording threads never wait
+    for each other. :meth:`collect` merges the tables of all threads,
+    including threads that exited since the last collection, and resets
+    them.
+
+    Series (metric name and dimensions) are normalized when they are
+    recorded. To avoid this cost on hot paths, get a handle for a series
+    once with :meth:`counter` or :meth:`summary`.
+    """
+
+    def __init__(self,
+                 factory: Optional[DynatraceMetricsFactory] = None,
+                 ) -> None:
+        """
+        :param factory: An optional factory used to create the metrics.
+        """
+        self.__factory = factory if factory else DynatraceMetricsFactory()
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__tables: List[_ThreadTable] = []
+
+    def counter(self,
+                metric_name: str,
+                dimensions: Optional[Mapping[str, str]] = None,
+                ) -> "RecorderCounter":
+        """
+        Get a handle to add to the counter of a series.
+        :param metric_name: The name of the metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions.
+        """
+        return RecorderCounter(self, _series_key(metric_name, dimensions))
+
+    def summary(self,
+                metric_name: str,
+                dimensions: Optional[Mapping[str, str]] = None,
+                ) -> "RecorderSummary":
+        """
+        Get a handle to record values into the summary of a series.
+        :param metric_name: The name of the metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions.
+        """
+        return RecorderSummary(self, _series_key(metric_name, dimensions))
+
+    def add(self,
+            metric_name: str,
+            value: Number,
+            dimensions: Optional[Mapping[str, str]] = None,
+            ) -> None:
+        """
+        Add a value to the counter of a series.
+        """
+        if type(value) is not int:
+            _raise_if_nan_or_inf(value)
+        self._add(_series_key(metric_name, dimensions), value)
+
+    def record(self,
+               metric_name: str,
+               value: Number,
+               dimensions: Optional[Mapping[str, str]] = None,
+               ) -> None:
+        """
+        Record a value into the summary of a series.
+        """
+        if type(value) is not int:
+            _raise_if_nan_or_inf(value)
+        self._record(_series_key(metric_name, dimensions), value)
+
+    def _table(self) -> _ThreadTable:
+        try:
+            return self.__local.table
+        except AttributeError:
+            table = _ThreadTable()
+            self.__local.table = table
+            with self.__lock:
+                self.__tables.append(table)
+            return table
+
+    def _add(self, key: SeriesKey, value: Number) -> None:
+        # the value has to be validated by the caller.
+        try:
+            table = self.__local.table
+        except AttributeError:
+            table = self._table()
+
+        with table.lock:
+            counters = table.counters
+            counters[key] = counters.get(key, 0) + value
+
+    def _record(self, key: SeriesKey, value: Number) -> None:
+        # the value has to be validated by the caller.
+        try:
+            table = self.__local.table
+        except AttributeError:
+            table = self._table()
+
+        with table.lock:
+            summary = table.summaries.get(key)
+            if summary is None:
+                table.summaries[key] = [value, value, value, 1]
+            else:
+                if value < summary[0]:
+                    summary[0] = value
+                elif value > summary[1]:
+                    summary[1] = value
+                summary[2] += value
+                summary[3] += 1
+
+    def _collect_raw(self,
+                     reset: bool = True,
+                     ) -> Tuple[Dict[SeriesKey, Number],
+                                Dict[SeriesKey, List[Number]]]:
+        """
+        Merge the tables of all threads.
+        :param reset: Whether to reset the tables.
+        :return: The counters and the [min, max, sum, count] summaries
+         recorded since the last collection.
+        """
+        with self.__lock:
+            tables = self.__tables
+            if reset:
+                # the data of exited threads is collected one last time.
+                self.__tables = [table for table in tables
+                                 if table.thread.is_alive()]
+
+        counters: Dict[SeriesKey, Number] = {}
+        summaries: Dict[SeriesKey, List[Number]] = {}
+        for table in tables:
+            with table.lock:
+                table_counters = table.counters
+                table_summaries = table.summaries
+                if reset:
+                    table.counters = {}
+                    table.summaries = {}
+                else:
+                    table_counters = dict(table_counters)
+                    table_summaries = {key: list(summary) for key, summary
+                                       in table_summaries.items()}
+
+            for key, value in table_counters.items():
+                counters[key] = counters.get(key, 0) + value
+
+            for key, summary in table_summaries.items():
+                existing = summaries.get(key)
+                if existing is None:
+                    summaries[key] = summary
+                else:
+                    existing[0] = min(existing[0], summary[0])
+                    existing[1] = max(existing[1], summary[1])
+                    existing[2] += summary[2]
+                    existing[3] += summary[3]
+
+        return counters, summaries
+
+    def save_snapshot(self, path: str) -> int:
+        """
+        Write the values recorded since the last collection to a snapshot
+        file, e.g. on shutdown, so they can be restored with
+        :meth:`restore_snapshot` by the next process. The recorded values
+        are not reset. The snapshot uses a compact binary format with a
+        version and a checksum, and the file is replaced atomically.
+        :param path: The path of the snapshot file.
+        :return: The number of series in the snapshot.
+        """
+        counters, summaries = self._collect_raw(reset=False)
+        write_snapshot(path, counters, summaries)
+        return len(counters) + len(summaries)
+
+    def restore_snapshot(self, path: str) -> int:
+        """
+        Add the values of a snapshot written by :meth:`save_snapshot` to
+        the values recorded since the last collection. The file is
+        memory-mapped and not modified.
+        :param path: The path of the snapshot file.
+        :return: The number of series in the snapshot.
+        :raises SnapshotError: If the snapshot is truncated, corrupted or
+         has an unsupported version.
+        :raises OSError: If the file cannot be read.
+        """
+        counters, summaries = read_snapshot(path)
+        restored = len(counters) + len(summaries)
+        table = self._table()
+        with table.lock:
+            # typically the snapshot is restored on startup, before anything
+            # is recorded, so the tables can be replaced.
+            if not table.counters:
+                table.counters, counters = counters, {}
+            if not table.summaries:
+                table.summaries, summaries = summaries, {}
+
+            table_counters = table.counters
+            for key, value in counters.items():
+                table_counters[key] = table_counters.get(key, 0) + value
+
+            table_summaries = table.summaries
+            for key, summary in summaries.items():
+                existing = table_summaries.get(key)
+                if existing is None:
+                    table_summaries[key] = summary
+                else:
+                    existing[0] = min(existing[0], summary[0])
+                    existing[1] = max(existing[1], summary[1])
+                    existing[2] += summary[2]
+                    existing[3] += summary[3]
+        return restored
+
+    def collect(self, timestamp: Optional[float] = None) -> List[Metric]:
+        """
+        Create metrics from the values recorded since the last collection
+        and reset all series. Counters are exported as delta counters,
+        summaries as summary metrics.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds)
+         for all metrics.
+        :return: A list of :class:`Metric` objects.
+        """
+        counters, summaries = self._collect_raw()
+        factory = self.__factory
+
+        metrics = []
+        for (metric_name, dimensions), value in counters.items():
+            if isinstance(value, int):
+                metrics.append(factory.create_int_counter_delta(
+                    metric_name, value, dimensions, timestamp))
+            else:
+                metrics.append(factory.create_float_counter_delta(
+                    metric_name, value, dimensions, timestamp))
+
+        for (metric_name, dimensions), (minimum, maximum, total, count) \
+                in summaries.items():
+            metrics.append(factory.create_float_summary(
+                metric_name, minimum, maximum, total, count, dimensions,
+                timestamp))
+        return metrics
+
+
+class RecorderCounter:
+    """
+    A counter of one series in a :class:`ThreadLocalRecorder`.
+    """
+    __slots__ = ("__recorder", "__key")
+
+    def __init__(self, recorder: ThreadLocalRecorder, key: SeriesKey) -> None:
+        self.__recorder = recorder
+        self.__key = key
+
+    def add(self, value: Number = 1) -> None:
+        if type(value) is not int:
+            _raise_if_nan_or_inf(value)
+        self.__recorder._add(self.__key, value)
+
+
+class RecorderSummary:
+    """
+    A summary of one series in a :class:`ThreadLocalRecorder`.
+    """
+    __slots__ = ("__recorder", "__key")
+
+    def __init__(self, recorder: ThreadLocalRecorder, key: SeriesKey) -> None:
+        self.__recorder = recorder
+        self.__key = key
+
+    def record(self, value: Number) -> None:
+        if type(value) is not int:
+            _raise_if_nan_or_inf(value)
+        self.__recorder._record(self.__key, value)
@@ -0,0 +1,182 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Mapping, Optional, Tuple, TypeVar
+
+from ._metric import Metric
+from .dynatrace_metrics_factory import DynatraceMetricsFactory
+from .thread_local_recorder import ThreadLocalRecorder, _series_key
+
+F = TypeVar("F", bound=Callable)
+
+# the start times of the Timed context managers entered in the current
+# context, as (start, outer starts) pairs. Every asyncio task has its own
+# copy, so tasks that interleave do not exit each other's scopes.
+_starts: "ContextVar[Optional[Tuple[int, object]]]" = ContextVar(
+    "dynatrace_metric_utils_timed_starts", default=None)
+
+
+class TimingRegistry:
+    """
+    Accumulates the durations recorded with :meth:`timed` per series (metric
+    name and dimensions) in a :class:`ThreadLocalRecorder`, and turns them
+    into summary metrics on collection. Recording a duration only updates a
+    summary of the current thread; no :class:`Metric` is created and nothing
+    is serialized until :meth:`collect` is called.
+    """
+    __default: Optional["TimingRegistry"] = None
+    __default_lock = threading.Lock()
+
+    def __init__(self,
+                 factory: Optional[DynatraceMetricsFactory] = None,
+                 ) -> None:
+        """
+        :param factory: An optional factory used to create the metrics.
+        """
+        self.__factory = factory if factory else DynatraceMetricsFactory()
+        self._recorder = ThreadLocalRecorder(self.__factory)
+
+    @classmethod
+    def get_default(cls) -> "TimingRegistry":
+        """
+        Get the registry used by the module-level :func:`timed`.
+        """
+        if cls.__default is None:
+            with cls.__default_lock:
+                if cls.__default is None:
+                    cls.__default = cls()
+        return cls.__default
+
+    def timed(self,
+              metric_name: str,
+              dimensions: Optional[Mapping[str, str]] = None,
+              ) -> "Timed":
+        """
+        Create a decorator and context manager that records durations into
+        this registry.
+        :param metric_name: The name of the metric.
+        :param dimensions: An optional dictionary or :class:`DimensionSet` of
+         dimensions.
+        """
+        return Timed(self, metric_name, dimensions)
+
+    def collect(self, timestamp: Optional[float] = None) -> List[Metric]:
+        """
+        Create one summary metric per series from the durations recorded
+        since the last collection, in milliseconds, and reset all series.
+        :param timestamp: An optional timestamp (Unix time, in milliseconds)
+         for all metrics.
+        :return: A list of :class:`Metric` objects.
+        """
+        _, summaries = self._recorder._collect_raw()
+        factory = self.__factory
+        return [
+            factory.create_float_summary(
+                metric_name, minimum / 1e6, maximum / 1e6, total / 1e6,
+                count, dimensions, timestamp)
+            for (metric_name, dimensions), (minimum, maximum, total, count)
+            in summaries.items()
+        ]
+
+
+class Timed:
+    """
+    Records the duration of a function call or a block of code, measured
+    with time.perf_counter_ns(). Use it as a decorator or as a context
+    manager; one instance can be shared by all threads. Decorated coroutine
+    functions (async def) record the time until the coroutine finished,
+    including the time it was suspended. The metric name and
+    the dimensions are normalized once, when the instance is created.
+
+    As a context manager, it has to be exited in the thread or asyncio task
+    that entered it. Nesting is supported.
+    """
+    __slots__ = ("__registry", "__key")
+
+    def __init__(self,
+                 registry: TimingRegistry,
+                 metric_name: str,
+                 dimensions: Optional[Mapping[str, str]] = None,
+                 ) -> None:
+        self.__registry = registry
+        self.__key = _series_key(metric_name, dimensions)
+
+    def __call__(self, func: F) -> F:
+        # durations are always valid summary values, so they are recorded
+        # without validation.
+        record = self.__registry._recorder._record
+        key = self.__key
+        perf_counter_ns = time.perf_counter_ns
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def coroutine_wrapper(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(key, perf_counter_ns() - start)
+
+            return coroutine_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(key, perf_counter_ns() - start)
+
+        return wrapper
+
+    def __enter__(self) -> "Timed":
+        _starts.set((time.perf_counter_ns(), _starts.get()))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        end = time.perf_counter_ns()
+        start, outer = _starts.get()
+        _starts.set(outer)
+        self.__registry._recorder._record(self.__key, end - start)
+
+
+def timed(metric_name: str,
+          dimensions: Optional[Mapping[str, str]] = None,
+          registry: Optional[TimingRegistry] = None,
+          ) -> Timed:
+    """
+    Create a decorator and context manager that records durations as
+    summaries of the given series:
+
+        @timed("db.query.duration", {"query": "select_items"})
+        def select_items(): ...
+
+        with timed("cache.refresh.duration"):
+            refresh()
+
+    :param metric_name: The name of the metric.
+    :param dimensions: An optional dictionary or :class:`DimensionSet` of
+     dimensions.
+    :param registry: The registry to record into. Defaults to
+     TimingRegistry.get_default(); collect its metrics periodically with
+     :meth:`TimingRegistry.collect`.
+    """
+    if registry is None:
+        registry = TimingRegistry.get_default()
+    return Timed(registry, metric_name, dimensions)
@@ -0,0 +1,125 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import threading
+from unittest import TestCase
+
+from dynatrace.metric.utils import AmbientDimensions, DimensionSet, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer, FanOutSerializer, \
+    current_ambient_dimensions
+
+
+class TestAmbientDimensions(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    def setUp(self) -> None:
+        self.serializer = DynatraceMetricsSerializer(
+            None, "prefix", {"default": "default", "overwritten": "default"},
+            enrich_with_dynatrace_metadata=False, metrics_source="src")
+
+    def test_no_scope(self):
+        self.assertIsNone(current_ambient_dimensions())
+        self.assertEqual(
+            "prefix.metric,default=default,overwritten=default,"
+            "dt.metrics.source=src gauge,1",
+            self.serializer.serialize(
+                self.factory.create_int_gauge("metric", 1)))
+
+    def test_precedence(self):
+        # default < ambient < metric < static.
+        with AmbientDimensions({"overwritten": "ambient", "ambient": "a",
+                                "metric": "ambient",
+                                "dt.metrics.source": "ambient"}):
+            for dimensions in ({"metric": "metric"},
+                               DimensionSet({"metric": "metric"})):
+                metric = self.factory.create_int_gauge("metric", 1,
+                                                       dimensions)
+                self.assertEqual(
+                    "prefix.metric,default=default,overwritten=ambient,"
+                    "ambient=a,metric=metric,dt.metrics.source=src gauge,1",
+                    self.serializer.serialize(metric))
+
+    def test_normalized_and_escaped(self):
+        with AmbientDimensions({"Tenant ID": "a,b"}):
+            self.assertEqual(
+                "prefix.metric,default=default,overwritten=default,"
+                "tenant_id=a\\,b,dt.metrics.source=src gauge,1",
+                self.serializer.serialize(
+                    self.factory.create_int_gauge("metric", 1)))
+
+    def test_nested_scopes(self):
+        with AmbientDimensions({"tenant": "a", "route": "/"}) as outer:
+            with AmbientDimensions({"route": "/items"}) as inner:
+                self.assertEqual({"tenant": "a", "route": "/items"},
+                                 dict(inner))
+                self.assertIs(inner, current_ambient_dimensions())
+            self.assertIs(outer, current_ambient_dimensions())
+            with AmbientDimensions({}):
+                self.assertIs(outer, current_ambient_dimensions())
+        self.assertIsNone(current_ambient_dimensions())
+
+    def test_scope_cannot_be_entered_twice(self):
+        scope = AmbientDimensions({"tenant": "a"})
+        with scope:
+            with self.assertRaises(RuntimeError):
+                scope.__enter__()
+
+        # but it can be entered again after it was exited.
+        with scope as dimensions:
+            self.assertEqual({"tenant": "a"}, dict(dimensions))
+
+    def test_threads_are_isolated(self):
+        seen = []
+        with AmbientDimensions({"tenant": "a"}):
+            thread = threading.Thread(
+                target=lambda: seen.append(current_ambient_dimensions()))
+            thread.start()
+            thread.join()
+        self.assertEqual([None], seen)
+
+    def test_async_tasks_are_isolated(self):
+        serializer = self.serializer
+        metric = self.factory.create_int_gauge("metric", 1)
+
+        async def handle(tenant):
+            with AmbientDimensions({"tenant": tenant}):
+                await asyncio.sleep(0)
+                return serializer.serialize(metric)
+
+        async def main():
+            return await asyncio.gather(handle("a"), handle("b"))
+
+        first, second = asyncio.run(main())
+        self.assertIn(",tenant=a,", first)
+        self.assertIn(",tenant=b,", second)
+
+    def test_fan_out(self):
+        other = DynatraceMetricsSerializer(
+            None, None, None, enrich_with_dynatrace_metadata=False)
+        fan_out = FanOutSerializer([self.serializer, other])
+        metrics = [
+            self.factory.create_int_gauge("metric", 1, {"metric": "a"}),
+            self.factory.create_int_gauge("metric", 1, {"tenant": "metric"}),
+            self.factory.create_int_gauge("metric", 1,
+                                          DimensionSet({"metric": "a"})),
+        ]
+        with AmbientDimensions({"tenant": "a", "overwritten": "ambient"}):
+            for metric in metrics:
+                self.assertEqual([self.serializer.serialize(metric),
+                                  other.serialize(metric)],
+                                 fan_out.serialize(metric))
@@ -0,0 +1,167 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, cli
+
+CSV = """\
+name,value,type,timestamp,host
+cpu,0.5,,1616416882000,a
+requests,3,count,,b
+invalid,x,,,
+"""
+
+SUMMARY_CSV = """\
+name,min,max,sum,count,type
+latency,1,3,6,3,summary
+latency,0.5,1.5,2,2,summary
+"""
+
+JSONL = """\
+{"name": "cpu", "value": 1.5, "dimensions": {"host": "a"}}
+
+{"name": "requests", "type": "count", "value": 2}
+[1]
+"""
+
+
+class TestCli(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name: str, content: str = "") -> str:
+        path = os.path.join(self.directory.name, name)
+        if content:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        return path
+
+    def run_cli(self, *args: str) -> str:
+        output = self.path("output.txt")
+        with self.assertLogs(cli.__name__, "WARNING"):
+            self.assertEqual(0, cli.main(list(args) + ["-o", output]))
+        with open(output, encoding="utf-8") as f:
+            return f.read()
+
+    def test_csv_and_jsonl(self):
+        self.assertEqual(
+            "prefix.cpu,env=prod,host=a gauge,0.5 1616416882000\n"
+            "prefix.requests,env=prod,host=b count,delta=3\n"
+            "prefix.latency,env=prod gauge,min=1,max=3,sum=6,count=3\n"
+            "prefix.latency,env=prod gauge,min=0.5,max=1.5,sum=2,count=2\n"
+            "prefix.cpu,env=prod,host=a gauge,1.5\n"
+            "prefix.requests,env=prod count,delta=2\n",
+            self.run_cli(self.path("a.csv", CSV),
+                         self.path("b.csv", SUMMARY_CSV),
+                         self.path("c.jsonl", JSONL),
+                         "--prefix", "prefix", "--dimension", "env=prod"))
+
+    def test_jsonl_dimensions(self):
+        converter = cli._RecordConverter(
+            DynatraceMetricsSerializer(enrich_with_dynatrace_metadata=False),
+            "gauge")
+        records = [
+            '{"name": "a", "value": 1, "dimensions": ["host"]}',
+            '{"name": "b", "value": 1, "dimensions": "host=a"}',
+            '{"name": "c", "value": 1, "dimensions": {"host": {"a": 1}}}',
+            '{"name": "d", "value": 1, "dimensions": null}',
+            '{"name": "e", "value": 1, '
+            '"dimensions": {"core": 1, "load": 0.5, "up": true}}',
+        ]
+
+        lines, invalid = converter.convert((None, records))
+        self.assertEqual(
+            ["d gauge,1", "e,core=1,load=0.5,up=true gauge,1"], lines)
+        self.assertEqual(3, invalid)
+
+    def assert_error(self, *args: str) -> None:
+        with self.assertRaises(SystemExit) as context, \
+                mock.patch("sys.stderr"):
+            cli.main(list(args) + ["-o", self.path("output.txt")])
+        self.assertEqual(2, context.exception.code)
+
+    def test_errors(self):
+        path = self.path("a.csv", CSV)
+        for lines_per_payload in ("0", "-1", "x"):
+            self.assert_error(path, "--lines-per-payload", lines_per_payload)
+        self.assert_error(self.path("missing.csv"))
+        # exceeds the field size limit of the csv module.
+        self.assert_error(self.path(
+            "large.csv", "name,value,host\ncpu,1,{}\n".format("x" * 200_000)))
+        latin1 = self.path("latin1.csv")
+        with open(latin1, "w", encoding="latin-1") as f:
+            f.write("name,value,host\ncpu,1,\xe9\n")
+        self.assert_error(latin1)
+        with self.assertRaises(SystemExit) as context, \
+                mock.patch("sys.stderr"):
+            cli.main([path, "--endpoint", "not a url"])
+        self.assertEqual(2, context.exception.code)
+
+    def test_default_type(self):
+        self.assertEqual(
+            "requests,host=a count,delta=1\n",
+            self.run_cli(
+                self.path("a.csv", "name,value,host\nrequests,1,a\n,1,\n"),
+                "--type", "count"))
+
+    def test_payloads(self):
+        lines = "".join("metric{},{}\n".format(i, i) for i in range(25))
+        output_dir = self.path("payloads")
+        self.assertEqual(0, cli.main([
+            self.path("a.csv", "name,value\n" + lines),
+            "--lines-per-payload", "10", "--output-dir", output_dir]))
+
+        files = sorted(os.listdir(output_dir))
+        self.assertEqual(["payload-00000000.txt", "payload-00000001.txt",
+                          "payload-00000002.txt"], files)
+        with open(os.path.join(output_dir, files[2]),
+                  encoding="utf-8") as f:
+            self.assertEqual(["metric{} gauge,{}".format(i, i)
+                              for i in range(20, 25)], f.read().splitlines())
+
+    def test_endpoint(self):
+        payloads = []
+
+        def post_payload(endpoint, payload, api_token, timeout):
+            payloads.append((endpoint, payload, api_token))
+            return 202 if len(payloads) == 1 else 400
+
+        path = self.path("a.csv", "name,value\na,1\nb,2\nc,3\n")
+        with mock.patch.object(cli, "post_payload", post_payload), \
+                self.assertLogs(cli.__name__, "ERROR"):
+            self.assertEqual(1, cli.main([
+                path, "--endpoint", "http://localhost:14499/metrics/ingest",
+                "--api-token", "token", "--lines-per-payload", "2"]))
+        self.assertEqual([
+            ("http://localhost:14499/metrics/ingest", "a gauge,1\nb gauge,2",
+             "token"),
+            ("http://localhost:14499/metrics/ingest", "c gauge,3", "token"),
+        ], payloads)
+
+    def test_workers(self):
+        lines = "".join("metric,{},h{}\n".format(i, i % 3)
+                        for i in range(25_000))
+        path = self.path("a.csv", "name,value,host\n" + lines)
+        output = self.path("output.txt")
+        self.assertEqual(0, cli.main([path, "--workers", "2", "-o", output]))
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(["metric,host=h{} gauge,{}".format(i % 3, i)
+                              for i in range(25_000)],
+                             f.read().splitlines())
@@ -0,0 +1,112 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest import TestCase
+
+from dynatrace.metric.utils import CumulativeToDeltaConverter, \
+    DimensionSet, DynatraceMetricsSerializer, MetricError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCumulativeToDeltaConverter(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.converter = CumulativeToDeltaConverter(series_timeout=60,
+                                                    clock=self.clock)
+
+    def convert(self, *args, **kwargs):
+        metric = self.converter.convert(*args, **kwargs)
+        return self.serializer.serialize(metric) if metric else None
+
+    def test_first_value_initializes_series(self):
+        self.assertIsNone(self.convert("bytes", 100))
+        self.assertEqual("bytes count,delta=50", self.convert("bytes", 150))
+        self.assertEqual("bytes count,delta=0", self.convert("bytes", 150))
+        self.assertEqual(1, len(self.converter))
+
+    def test_float_values(self):
+        self.assertIsNone(self.convert("seconds", 1.5))
+        self.assertEqual("seconds count,delta=1.25",
+                         self.convert("seconds", 2.75))
+        # int values after float values are still exported as deltas.
+        self.assertEqual("seconds count,delta=0.25", self.convert("seconds", 3))
+
+    def test_reset(self):
+        self.convert("bytes", 100)
+        self.assertEqual("bytes count,delta=20", self.convert("bytes", 20))
+        self.assertEqual("bytes count,delta=5", self.convert("bytes", 25))
+
+    def test_series_by_name_and_dimensions(self):
+        self.convert("bytes", 100, {"dev": "eth0"})
+        self.convert("bytes", 1000, {"dev": "eth1"})
+        self.convert("bytes", 10)
+        self.convert("packets", 1, {"dev": "eth0"})
+
+        self.assertEqual("bytes,dev=eth0 count,delta=10",
+                         self.convert("bytes", 110, {"dev": "eth0"}))
+        # dimensions are identified after normalization.
+        self.assertEqual("bytes,dev=eth1 count,delta=1",
+                         self.convert("bytes", 1001, {"DEV": "eth1"}))
+        self.assertEqual("bytes,dev=eth1 count,delta=1",
+                         self.convert("bytes", 1002,
+                                      DimensionSet({"dev": "eth1"})))
+        self.assertEqual("bytes count,delta=5", self.convert("bytes", 15))
+        self.assertEqual(4, len(self.converter))
+
+    def test_timestamp(self):
+        self.convert("bytes", 1)
+        self.assertEqual("bytes count,delta=1 1620000000000",
+                         self.convert("bytes", 2, timestamp=1620000000000))
+
+    def test_idle_series_expire(self):
+        self.convert("idle", 1)
+        self.convert("active", 1)
+        for _ in range(6):
+            self.clock.now += 10
+            self.assertEqual("active count,delta=1",
+                             self.convert("active", 2 + _))
+        self.assertEqual(2, len(self.converter))
+
+        # idle for more than the timeout.
+        self.clock.now += 10
+        self.convert("active", 10)
+        self.assertEqual(1, len(self.converter))
+        self.assertIsNone(self.convert("idle", 2))
+
+    def test_long_pause_expires_all_series(self):
+        for i in range(1000):
+            self.convert("series", i, {"id": str(i)})
+        self.clock.now += 3600
+        self.assertIsNone(self.convert("series", 1, {"id": "1"}))
+        self.assertEqual(1, len(self.converter))
+
+    def test_invalid_values(self):
+        with self.assertRaises(MetricError):
+            self.converter.convert("nan", float("nan"))
+        with self.assertRaises(MetricError):
+            self.converter.convert("inf", float("inf"))
+        self.assertEqual(0, len(self.converter))
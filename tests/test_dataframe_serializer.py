@@ -0,0 +1,166 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import datetime
+import unittest
+from unittest import TestCase
+
+from dynatrace.metric.utils import DataFrameSerializer, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+DATA = {
+    "region": ["eu", "us", "eu", None],
+    "route": ["/a", "/b b", "/a", "/c"],
+    "latency": [1.5, 2.0, float("nan"), 4.25],
+    "requests": [10, 20, 30, 40],
+    "time": [1616416882000, 1616416883000, 1616416884000, 1616416885000],
+}
+
+
+class TestDataFrameSerializer(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    def setUp(self) -> None:
+        self.serializer = DynatraceMetricsSerializer(
+            None, "prefix", {"default": "dim"},
+            enrich_with_dynatrace_metadata=False)
+        self.dataframe_serializer = DataFrameSerializer(self.serializer)
+
+    def serialize(self, data, *args, **kwargs):
+        return list(self.dataframe_serializer.serialize_lines(
+            data, *args, **kwargs))
+
+    def test_same_lines_as_serializer(self):
+        lines = self.serialize(DATA, ["latency"], name="latency",
+                               dimension_columns=["region", "route"],
+                               timestamp_column="time")
+        expected = [
+            self.serializer.serialize(self.factory.create_float_gauge(
+                "latency", value, dimensions, timestamp))
+            for value, dimensions, timestamp in (
+                (1.5, {"region": "eu", "route": "/a"}, 1616416882000),
+                (2.0, {"region": "us", "route": "/b b"}, 1616416883000),
+                # the NaN value is dropped.
+                (4.25, {"route": "/c"}, 1616416885000))
+        ]
+        self.assertEqual(expected, lines)
+        self.assertEqual("prefix.latency,default=dim,region=us,route=/b\\ b "
+                         "gauge,2 1616416883000", lines[1])
+
+    def test_several_value_columns(self):
+        self.assertEqual([
+            "prefix.http.latency,default=dim gauge,1.5",
+            "prefix.http.requests,default=dim gauge,10",
+            "prefix.http.latency,default=dim gauge,2",
+            "prefix.http.requests,default=dim gauge,20",
+        ], self.serialize(DATA, ["latency", "requests"], name="http")[:4])
+
+    def test_name_from_columns(self):
+        data = {"name": ["a", "b", None], "value": [1, 2, 3]}
+        self.assertEqual([
+            "prefix.a,default=dim count,delta=1",
+            "prefix.b,default=dim count,delta=2",
+        ], self.serialize(data, ["value"], name_column="name",
+                          metric_type="count"))
+        self.assertEqual("prefix.value,default=dim gauge,1",
+                         self.serialize(data, ["value"])[0])
+
+    def test_invalid_values_and_timestamps(self):
+        data = {
+            "value": [1, "2", None, True, float("inf"), 6, 7],
+            "time": [1616416882000, 1616416882000, 1616416882000,
+                     1616416882000, 1616416882000, 0, 1616416882.5],
+        }
+        self.assertEqual(["prefix.value,default=dim gauge,1 1616416882000"],
+                         self.serialize(data, ["value"],
+                                        timestamp_column="time"))
+
+    def test_datetime_timestamps(self):
+        time = datetime.datetime(2021, 3, 22, 12, 41, 22,
+                                 tzinfo=datetime.timezone.utc)
+        self.assertEqual(["prefix.value,default=dim gauge,1 1616416882000"],
+                         self.serialize({"value": [1], "time": [time]},
+                                        ["value"], timestamp_column="time"))
+
+    def test_invalid_metric_name(self):
+        serializer = DataFrameSerializer(DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False))
+        self.assertEqual(["b gauge,2"], list(serializer.serialize_lines(
+            {"name": [" ", "b"], "value": [1, 2]}, ["value"],
+            name_column="name")))
+
+    def test_long_lines(self):
+        serializer = DataFrameSerializer(DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False,
+            drop_dimensions_to_fit=True))
+        data = {"dim{}".format(i): ["x" * 250] for i in range(210)}
+        data["value"] = [1]
+        lines = list(serializer.serialize_lines(data, ["value"],
+                                                dimension_columns=list(data)
+                                                [:-1]))
+        self.assertEqual(1, len(lines))
+        self.assertLessEqual(
+            len(lines[0]), DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH)
+
+    def test_payloads(self):
+        data = {"value": list(range(25))}
+        payloads = list(self.dataframe_serializer.serialize_payloads(
+            data, ["value"], lines_limit=10))
+        self.assertEqual([10, 10, 5],
+                         [len(payload.split("\n")) for payload in payloads])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.serialize(DATA, ["latency"], metric_type="summary")
+        with self.assertRaises(ValueError):
+            self.serialize(DATA, [])
+        with self.assertRaises(ValueError):
+            self.serialize(DATA, ["latency"], name="a", name_column="route")
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy_arrays(self):
+        data = {key: numpy.array(value) for key, value in DATA.items()
+                if key != "region"}
+        data["time"] = data["time"].astype("datetime64[ms]")
+        self.assertEqual(
+            self.serialize(DATA, ["latency", "requests"], name="http",
+                           dimension_columns=["route"],
+                           timestamp_column="time"),
+            self.serialize(data, ["latency", "requests"], name="http",
+                           dimension_columns=["route"],
+                           timestamp_column="time"))
+
+    @unittest.skipUnless(pandas, "pandas is not installed")
+    def test_dataframe(self):
+        frame = pandas.DataFrame(DATA)
+        frame["time"] = pandas.to_datetime(frame["time"], unit="ms")
+        self.assertEqual(
+            self.serialize(DATA, ["latency"], dimension_columns=["region"],
+                           timestamp_column="time"),
+            self.serialize(frame, ["latency"], dimension_columns=["region"],
+                           timestamp_column="time"))
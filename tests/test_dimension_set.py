@@ -0,0 +1,110 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pickle
+from unittest import TestCase
+
+from dynatrace.metric.utils import AmbientDimensions, DimensionSet, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer, MetricError
+
+
+class TestDimensionSet(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    def test_normalized_on_creation(self):
+        dimension_set = DimensionSet({"Dim~1": "val\u0000ue", "dim2": "a b"})
+        self.assertEqual({"dim_1": "val_ue", "dim2": "a b"},
+                         dict(dimension_set))
+        self.assertEqual("dim_1=val_ue,dim2=a\\ b", dimension_set.serialized)
+        self.assertEqual((("dim_1", "val_ue"), ("dim2", "a b")),
+                         dimension_set.items_tuple)
+
+    def test_interned(self):
+        first = DimensionSet({"dim1": "val1", "dim2": "val2"})
+        self.assertIs(first, DimensionSet({"dim1": "val1", "dim2": "val2"}))
+        # different input, same normalized dimensions.
+        self.assertIs(first, DimensionSet({"DIM1": "val1", "dim2": "val2"}))
+        self.assertIs(first, DimensionSet(first))
+        self.assertIs(DimensionSet(), DimensionSet({}))
+
+    def test_equality_and_hash(self):
+        first = DimensionSet({"a": "1", "b": "2"})
+        reordered = DimensionSet({"b": "2", "a": "1"})
+        self.assertEqual(first, reordered)
+        self.assertEqual(hash(first), hash(reordered))
+        self.assertEqual({"a": "1", "b": "2"}, first)
+        self.assertNotEqual(first, DimensionSet({"a": "1"}))
+        self.assertEqual(1, len({first: 1, reordered: 2}))
+        # interned by the order of the dimensions, which is kept.
+        self.assertIsNot(first, reordered)
+        self.assertEqual("b=2,a=1", reordered.serialized)
+
+    def test_immutable(self):
+        dimension_set = DimensionSet({"a": "1"})
+        with self.assertRaises(TypeError):
+            dimension_set["b"] = "2"
+        with self.assertRaises(AttributeError):
+            dimension_set.other = 1
+
+    def test_invalid(self):
+        with self.assertRaises(MetricError):
+            DimensionSet({"a": 1})
+        with self.assertRaises(MetricError):
+            DimensionSet({"a": ["unhashable"]})
+
+    def test_pickle(self):
+        dimension_set = DimensionSet({"a": "1", "b": "x=y"})
+        self.assertIs(dimension_set,
+                      pickle.loads(pickle.dumps(dimension_set)))
+
+    def test_serializer(self):
+        dims = {"dim~1": "\\=\" ==", "default": "metric", "x": "y"}
+        serializers = [
+            DynatraceMetricsSerializer(
+                enrich_with_dynatrace_metadata=False),
+            DynatraceMetricsSerializer(
+                default_dimensions={"default": "dim", "other": "x"},
+                enrich_with_dynatrace_metadata=False,
+                metrics_source="src"),
+        ]
+        for serializer in serializers:
+            for _ in range(2):
+                self.assertEqual(
+                    serializer.serialize(
+                        self.factory.create_int_gauge("metric", 1, dims)),
+                    serializer.serialize(self.factory.create_int_gauge(
+                        "metric", 1, DimensionSet(dims))))
+
+    def test_serializer_keeps_order(self):
+        serializer = DynatraceMetricsSerializer(
+            default_dimensions={"d": "1"},
+            enrich_with_dynatrace_metadata=False)
+        ordered = DimensionSet({"a": "1", "b": "2"})
+        reordered = DimensionSet({"b": "2", "a": "1"})
+        for _ in range(2):
+            self.assertEqual("m,d=1,a=1,b=2 gauge,1", serializer.serialize(
+                self.factory.create_int_gauge("m", 1, ordered)))
+            self.assertEqual("m,d=1,b=2,a=1 gauge,1", serializer.serialize(
+                self.factory.create_int_gauge("m", 1, reordered)))
+
+        for scope, expected in (({"x": "1", "y": "2"}, "x=1,y=2"),
+                                ({"y": "2", "x": "1"}, "y=2,x=1")):
+            with AmbientDimensions(scope):
+                self.assertEqual(
+                    "m,d=1,{},b=2,a=1 gauge,1".format(expected),
+                    serializer.serialize(
+                        self.factory.create_int_gauge("m", 1, reordered)))
@@ -14,8 +14,9 @@
 
 from unittest import TestCase
 
-from dynatrace.metric.utils import DynatraceMetricsFactory, \
+from dynatrace.metric.utils import DimensionSet, DynatraceMetricsFactory, \
     DynatraceMetricsSerializer, MetricError
+from dynatrace.metric.utils._normalize import Normalize
 
 
 class TestDynatraceMetricSerializer(TestCase):
@@ -256,3 +257,147 @@ class TestDynatraceMetricSerializer(TestCase):
         self.assertEqual(
             "Metric line exceeds maximum length of 50000 characters. Metric name: metric",
             str(context.exception))
+
+    def test_serialized_line_too_long_rejected_early(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        # 300 dimensions with 250 character values exceed the limit after
+        # about 200 dimensions. The invalid value at the end is never
+        # normalized.
+        test_dims = {f"dim{i}": "x" * 250 for i in range(300)}
+        test_dims["invalid"] = 1
+
+        with self.assertRaises(MetricError) as context:
+            serializer.serialize(
+                self.factory.create_int_gauge("metric", 100, test_dims))
+        self.assertEqual("line_too_long", context.exception.reason)
+
+    def test_line_at_maximum_length(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        # "metric" + " gauge,1" are 14 characters, each dimension
+        # ",dNNN=" + 244 x's is 250 characters.
+        test_dims = {f"d{i:03}": "x" * 244 for i in range(199)}
+        test_dims["last"] = "x" * (50_000 - 14 - 199 * 250 - 6)
+
+        line = serializer.serialize(
+            self.factory.create_int_gauge("metric", 1, test_dims))
+        self.assertEqual(DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH,
+                         len(line))
+
+        test_dims["last"] += "x"
+        with self.assertRaises(MetricError):
+            serializer.serialize(
+                self.factory.create_int_gauge("metric", 1, test_dims))
+
+    def test_drop_dimensions_to_fit(self):
+        serializer = DynatraceMetricsSerializer(
+            default_dimensions={"default1": "d1", "shared": "default",
+                                "default2": "x" * 250},
+            enrich_with_dynatrace_metadata=False,
+            metrics_source="src",
+            drop_dimensions_to_fit=True)
+
+        # dimensions fitting into the line are not dropped.
+        self.assertEqual(
+            "metric,default1=d1,shared=metric,default2={},"
+            "dim=val,dt.metrics.source=src gauge,1".format("x" * 250),
+            serializer.serialize(self.factory.create_int_gauge(
+                "metric", 1, {"shared": "metric", "dim": "val"})))
+
+        test_dims = {"shared": "metric"}
+        test_dims.update({f"dim{i:03}": "x" * 250 for i in range(300)})
+        line = serializer.serialize(
+            self.factory.create_int_gauge("metric", 1, test_dims))
+        self.assertLessEqual(
+            len(line), DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH)
+        # the static dimensions are kept, the metric dimensions in their
+        # order until the line is full, and short default dimensions fill
+        # up the remaining space.
+        self.assertTrue(line.startswith(
+            "metric,default1=d1,shared=metric,dim000="))
+        self.assertIn(",dim192=", line)
+        self.assertNotIn(",dim193=", line)
+        self.assertNotIn("default2", line)
+        self.assertTrue(line.endswith(",dt.metrics.source=src gauge,1"))
+
+    def test_dropped_dimension_does_not_restore_default(self):
+        serializer = DynatraceMetricsSerializer(
+            default_dimensions={"region": "default", "short": "d"},
+            enrich_with_dynatrace_metadata=False,
+            drop_dimensions_to_fit=True)
+        test_dims = {f"dim{i:03}": "x" * 250 for i in range(250)}
+        test_dims["region"] = "eu-west"
+
+        line = serializer.serialize(
+            self.factory.create_int_gauge("metric", 1, test_dims))
+        self.assertLessEqual(
+            len(line), DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH)
+        # the metric dimension was dropped, and the default dimension it
+        # overwrites is not reported instead.
+        self.assertNotIn("region=", line)
+        self.assertIn(",short=d", line)
+
+    def test_drop_dimensions_to_fit_keeps_order_of_static_dimensions(self):
+        for drop_dimensions_to_fit in (False, True):
+            serializer = DynatraceMetricsSerializer(
+                default_dimensions={"default": "d"},
+                enrich_with_dynatrace_metadata=False,
+                metrics_source="src",
+                drop_dimensions_to_fit=drop_dimensions_to_fit)
+            self.assertEqual(
+                "metric,default=d,dt.metrics.source=src,dim=val gauge,1",
+                serializer.serialize(self.factory.create_int_gauge(
+                    "metric", 1, {"dt.metrics.source": "metric",
+                                  "dim": "val"})))
+
+    def test_drop_dimensions_to_fit_dimension_set(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False,
+            drop_dimensions_to_fit=True)
+        test_dims = {f"dim{i:03}": "x" * 250 for i in range(300)}
+
+        self.assertEqual(
+            serializer.serialize(
+                self.factory.create_int_gauge("metric", 1, test_dims)),
+            serializer.serialize(self.factory.create_int_gauge(
+                "metric", 1, DimensionSet(test_dims))))
+
+    def test_with_prefix_same_as_normalizing_whole_key(self):
+        normalize = Normalize()
+        prefixes = ["prefix", "prefix.", "pre.fix", "~pre..fix~", "1prefix",
+                    "a" * 248, "a" * 249, "a" * 250, "a" * 300,
+                    "a.b" * 100, " .prefix"]
+        names = ["metric", "1metric", ".metric..name.", "~~~", "m.~.n",
+                 "b" * 300, "b.c" * 100, "metricäname", ".", "_"]
+
+        for prefix in prefixes:
+            serializer = DynatraceMetricsSerializer(
+                metric_key_prefix=prefix,
+                enrich_with_dynatrace_metadata=False)
+            for name in names:
+                expected = normalize.normalize_metric_key(
+                    "{}.{}".format(prefix, name))
+                metric = self.factory.create_int_gauge(name, 1)
+                # serialize twice to also use the cached key.
+                for _ in range(2):
+                    if expected:
+                        self.assertEqual(expected + " gauge,1",
+                                         serializer.serialize(metric))
+                    else:
+                        with self.assertRaises(MetricError):
+                            serializer.serialize(metric)
+
+    def test_prefixed_metric_key_for_oversized_names(self):
+        serializer = DynatraceMetricsSerializer(
+            metric_key_prefix="prefix",
+            enrich_with_dynatrace_metadata=False)
+        # the names are truncated before their keys are cached, so names
+        # that only differ after the maximum length get the same key.
+        for suffix in ("a", "b"):
+            metric = self.factory.create_int_gauge(
+                "m" * 100_000 + suffix, 1)
+            self.assertEqual(
+                Normalize().normalize_metric_key("prefix." + "m" * 300)
+                + " gauge,1",
+                serializer.serialize(metric))
@@ -0,0 +1,97 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pickle
+from unittest import TestCase, mock
+
+from dynatrace.metric.utils import AmbientDimensions, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer, \
+    DynatraceMetricsBatchSerializer, DynatraceMetricsApiConstants
+
+
+class TestDynatraceMetricsBatchSerializer(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        factory = DynatraceMetricsFactory()
+        cls.serializer = DynatraceMetricsSerializer(
+            metric_key_prefix="prefix",
+            default_dimensions={"default": "dim", "shared": "default"},
+            enrich_with_dynatrace_metadata=False,
+            metrics_source="batch-test",
+        )
+        cls.metrics = []
+        for i in range(2500):
+            cls.metrics.append(factory.create_int_gauge(
+                "gauge", i, {"shared": "metric", "idx": str(i % 7)},
+                1609455600000 + i))
+            cls.metrics.append(factory.create_float_summary(
+                "summary", 0.5, 1.5 + i, 10.25, i))
+        # an invalid metric, which exceeds the maximum line length.
+        cls.metrics.append(factory.create_int_gauge(
+            "too.long", 1, {"d{}".format(i): "x" * 250 for i in range(250)}))
+        cls.expected = [cls.serializer.serialize(m) for m in cls.metrics[:-1]]
+
+    def test_metrics_are_picklable(self):
+        for metric in self.metrics[:2]:
+            restored = pickle.loads(pickle.dumps(metric))
+            self.assertEqual(self.serializer.serialize(metric),
+                             self.serializer.serialize(restored))
+
+    def test_in_process(self):
+        batch_serializer = DynatraceMetricsBatchSerializer(self.serializer)
+        self.assertEqual(self.expected,
+                         batch_serializer.serialize_lines(self.metrics))
+
+    def test_unknown_cpu_count(self):
+        # os.cpu_count() returns None if the number cannot be determined.
+        with mock.patch("os.cpu_count", return_value=None):
+            batch_serializer = DynatraceMetricsBatchSerializer(
+                self.serializer, parallel_threshold=0)
+        self.assertEqual(self.expected,
+                         batch_serializer.serialize_lines(self.metrics))
+
+    def test_parallel(self):
+        with DynatraceMetricsBatchSerializer(
+                self.serializer, max_workers=2,
+                parallel_threshold=0) as batch_serializer:
+            self.assertEqual(self.expected,
+                             batch_serializer.serialize_lines(self.metrics))
+            # the pool is reused for subsequent batches.
+            self.assertEqual(self.expected[:10],
+                             batch_serializer.serialize_lines(
+                                 self.metrics[:10]))
+
+    def test_parallel_ambient_dimensions(self):
+        metrics = self.metrics[:10]
+        with AmbientDimensions({"tenant": "a"}):
+            expected = [self.serializer.serialize(m) for m in metrics]
+            with DynatraceMetricsBatchSerializer(
+                    self.serializer, max_workers=2,
+                    parallel_threshold=0) as batch_serializer:
+                self.assertEqual(expected,
+                                 batch_serializer.serialize_lines(metrics))
+        self.assertIn(",tenant=a,", expected[0])
+
+    def test_payloads(self):
+        limit = DynatraceMetricsApiConstants.payload_lines_limit()
+        with DynatraceMetricsBatchSerializer(
+                self.serializer, max_workers=2,
+                parallel_threshold=0) as batch_serializer:
+            payloads = batch_serializer.serialize_batch(self.metrics)
+
+        self.assertEqual(5, len(payloads))
+        for payload in payloads:
+            self.assertLessEqual(len(payload.split("\n")), limit)
+        self.assertEqual(self.expected, "\n".join(payloads).split("\n"))
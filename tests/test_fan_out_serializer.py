@@ -0,0 +1,132 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest import TestCase
+
+from dynatrace.metric.utils import DimensionSet, DynatraceMetricsFactory, \
+    DynatraceMetricsSerializer, FanOutSerializer, SelfMonitoring, \
+    SerializerConfig
+
+
+class TestFanOutSerializer(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    def setUp(self) -> None:
+        config = SerializerConfig(enrich_with_dynatrace_metadata=False,
+                                  metrics_source="src")
+        self.serializers = [
+            config.serializer(),
+            config.serializer("tenant1", {"tenant": "one"}),
+            config.serializer("tenant2", {"dim": "default",
+                                          "dt.metrics.source": "default"}),
+            DynatraceMetricsSerializer(
+                None, "..tenant3", {"Tenant": "three"},
+                enrich_with_dynatrace_metadata=False),
+            DynatraceMetricsSerializer(None, "tenant4", None, False, "other"),
+        ]
+        self.fan_out = FanOutSerializer(self.serializers)
+
+    def assert_same_lines(self, metric):
+        expected = []
+        for serializer in self.serializers:
+            try:
+                expected.append(serializer.serialize(metric))
+            except Exception:
+                expected.append(None)
+        self.assertEqual(expected, self.fan_out.serialize(metric))
+
+    def test_same_lines_as_serializers(self):
+        factory = self.factory
+        metrics = [
+            factory.create_int_gauge("metric", 1),
+            factory.create_float_counter_delta("my.metric", 1.5,
+                                               {"dim": "a b", "x": "y"},
+                                               1616416882000),
+            # dimensions overwriting default and static dimensions.
+            factory.create_int_summary("metric", 1, 3, 6, 3, {
+                "tenant": "overwritten", "dim": "metric",
+                "dt.metrics.source": "metric"}),
+            factory.create_int_gauge("metric", 1, {"": "empty key",
+                                                   "Dim": "a=b,c"}),
+            factory.create_int_gauge("~.invalid..name", 1),
+            factory.create_int_gauge("metric", 1, DimensionSet({"dim": "a"})),
+            factory.create_int_gauge("metric", 1, DimensionSet()),
+        ]
+        for metric in metrics:
+            self.assert_same_lines(metric)
+
+    def test_per_serializer_errors(self):
+        # the metric name is empty after normalization, which is only an
+        # error for the serializer without a prefix.
+        metric = self.factory.create_int_gauge(" ", 1)
+        lines = self.fan_out.serialize(metric)
+        self.assertIsNone(lines[0])
+        self.assertEqual("tenant1._,tenant=one,dt.metrics.source=src gauge,1",
+                         lines[1])
+        self.assert_same_lines(metric)
+
+    def test_invalid_dimensions(self):
+        metric = self.factory.create_int_gauge("metric", 1, {"dim": 1})
+        self.assertEqual([None] * 5, self.fan_out.serialize(metric))
+
+    def test_line_too_long(self):
+        dimensions = {"dim{}".format(i): "x" * 250 for i in range(210)}
+        metric = self.factory.create_int_gauge("metric", 1, dimensions)
+        self_monitoring = SelfMonitoring()
+        serializers = [
+            DynatraceMetricsSerializer(None, "tenant1",
+                                       enrich_with_dynatrace_metadata=False,
+                                       self_monitoring=self_monitoring),
+            DynatraceMetricsSerializer(None, "tenant2",
+                                       enrich_with_dynatrace_metadata=False,
+                                       drop_dimensions_to_fit=True),
+        ]
+        rejected, dropped = FanOutSerializer(serializers).serialize(metric)
+        self.assertIsNone(rejected)
+        self.assertEqual(serializers[1].serialize(metric), dropped)
+        self.assertLessEqual(
+            len(dropped), DynatraceMetricsSerializer.METRIC_LINE_MAX_LENGTH)
+
+        snapshot = self_monitoring.snapshot()
+        self.assertEqual(1, snapshot["lines_dropped_too_long"])
+        self.assertEqual(0, snapshot["lines_serialized"])
+
+    def test_self_monitoring(self):
+        self_monitoring = SelfMonitoring()
+        serializer = DynatraceMetricsSerializer(
+            None, "tenant", enrich_with_dynatrace_metadata=False,
+            self_monitoring=self_monitoring)
+        fan_out = FanOutSerializer([serializer])
+
+        fan_out.serialize(self.factory.create_int_gauge("metric", 1))
+        self.assertEqual(1, self_monitoring.snapshot()["lines_serialized"])
+
+    def test_serialize_lines(self):
+        metrics = [self.factory.create_int_gauge(" ", 1),
+                   self.factory.create_int_gauge("metric", 2)]
+        lines = self.fan_out.serialize_lines(metrics)
+
+        self.assertEqual(5, len(lines))
+        self.assertEqual(["metric,dt.metrics.source=src gauge,2"], lines[0])
+        self.assertEqual([
+            "tenant4._,dt.metrics.source=other gauge,1",
+            "tenant4.metric,dt.metrics.source=other gauge,2",
+        ], lines[4])
+
+    def test_no_serializers(self):
+        with self.assertRaises(ValueError):
+            FanOutSerializer([])
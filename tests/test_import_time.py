@@ -0,0 +1,83 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import platform
+import subprocess
+import sys
+import unittest
+from unittest import TestCase
+
+# the cumulative time for importing the package itself, in microseconds. The
+# package only defines the lazy imports, so this is far below the budget on
+# any machine.
+PACKAGE_IMPORT_BUDGET_US = 20_000
+
+
+def run_python(code, *args):
+    return subprocess.run([sys.executable, *args, "-c", code],
+                          check=True, capture_output=True, text=True)
+
+
+def newly_imported(code):
+    result = run_python(
+        "import json, sys\n"
+        "before = set(sys.modules)\n"
+        + code +
+        "\nprint(json.dumps(sorted(set(sys.modules) - before)))")
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+class TestImportTime(TestCase):
+
+    def test_package_import_is_lazy(self):
+        modules = newly_imported("import dynatrace.metric.utils")
+        self.assertEqual(
+            [], [m for m in modules if m.startswith("dynatrace.metric.utils.")])
+        self.assertNotIn("typing", modules)
+
+    def test_attribute_access_imports_submodule(self):
+        modules = newly_imported(
+            "from dynatrace.metric.utils import MetricError")
+        self.assertIn("dynatrace.metric.utils.metric_error", modules)
+        self.assertNotIn("dynatrace.metric.utils.dynatrace_metrics_serializer",
+                         modules)
+
+    def test_serialization_does_not_import_optional_modules(self):
+        modules = newly_imported(
+            "from dynatrace.metric.utils import DynatraceMetricsFactory, "
+            "DynatraceMetricsSerializer, DynatraceMetricsBatchSerializer\n"
+            "serializer = DynatraceMetricsSerializer("
+            "enrich_with_dynatrace_metadata=False)\n"
+            "DynatraceMetricsBatchSerializer(serializer).serialize_batch([\n"
+            "    DynatraceMetricsFactory().create_int_gauge("
+            "'metric', 1, {'dim': 'value'})])")
+        # only needed for control characters in dimension values and for
+        # parallel serialization.
+        self.assertNotIn("unicodedata", modules)
+        self.assertNotIn("concurrent.futures", modules)
+        self.assertNotIn("multiprocessing", modules)
+
+    @unittest.skipUnless(platform.python_implementation() == "CPython",
+                         "-X importtime is only supported by CPython")
+    def test_package_import_time_budget(self):
+        result = run_python("import dynatrace.metric.utils", "-X",
+                            "importtime")
+        cumulative = [
+            int(line.split("|")[1])
+            for line in result.stderr.splitlines()
+            if line.split("|")[-1].strip() == "dynatrace.metric.utils"
+        ]
+        self.assertEqual(1, len(cumulative))
+        self.assertLess(cumulative[0], PACKAGE_IMPORT_BUDGET_US)
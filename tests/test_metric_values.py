@@ -12,6 +12,8 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import math
+import random
+import struct
 import sys
 from unittest import TestCase
 
@@ -105,7 +107,72 @@ class TestSummaryValue(TestCase):
             SummaryValue(1.2, 3.4, 5.6, -3)
 
 
+def _reference_format_number(value):
+    # the implementation of _format_number before fast paths were added.
+    if abs(value) > 1e15:
+        as_string = "{:.8e}".format(value)
+    elif 0 < abs(value) < 1e-15:
+        as_string = "{:.8e}".format(value)
+    else:
+        as_string = str(value)
+
+    if "0e" in as_string:
+        start, end = as_string.split("e")
+        start = str(start).rstrip("0")
+        if start.endswith("."):
+            start = start + "0"
+        return start + "e" + end
+
+    if as_string.endswith(".0"):
+        no_trailing_zero = as_string[0:len(as_string) - 2]
+        if no_trailing_zero == "-0":
+            return "0"
+        return no_trailing_zero
+
+    return as_string
+
+
+def _random_corpus(rng, size):
+    boundaries = [0, 1, -1, 1023, 1024, -1024, 10 ** 15, -10 ** 15,
+                  10 ** 15 + 1, -10 ** 15 - 1, 0.0, -0.0, 1e15, -1e15,
+                  1e-15, -1e-15, 1e15 * (1 + 2 ** -52), 1e-15 * (1 - 2 ** -53),
+                  1e16, 1e-4, -1e-4, 1e-4 * (1 - 2 ** -53), 1e-5, 0.1,
+                  5e-324, -5e-324,
+                  sys.float_info.max, sys.float_info.min, True, False]
+    values = list(boundaries)
+    while len(values) < size:
+        kind = rng.randrange(6)
+        if kind == 0:
+            # integers of all magnitudes
+            values.append(rng.randint(-10 ** 20, 10 ** 20)
+                          // 10 ** rng.randrange(21))
+        elif kind == 1:
+            # integral floats
+            values.append(float(rng.randint(-10 ** 17, 10 ** 17)
+                                // 10 ** rng.randrange(18)))
+        elif kind == 2:
+            # floats of all magnitudes with few digits
+            values.append(round(rng.uniform(-10, 10), rng.randrange(6))
+                          * 10.0 ** rng.randrange(-20, 21))
+        elif kind == 3:
+            # floats with many digits
+            values.append(rng.uniform(-1, 1) * 10.0 ** rng.randrange(-20, 21))
+        else:
+            # arbitrary bit patterns, skipping NaN and infinity
+            value = struct.unpack("<d", struct.pack(
+                "<Q", rng.getrandbits(64)))[0]
+            if not math.isnan(value) and not math.isinf(value):
+                values.append(value)
+    return values
+
+
 class TestFloatFormatting(TestCase):
+    def test_fast_paths_match_reference(self):
+        rng = random.Random(1609455600)
+        for value in _random_corpus(rng, 200_000):
+            self.assertEqual(_reference_format_number(value),
+                             _format_number(value), repr(value))
+
     def test__format_number(self):
         self.assertEqual("0", _format_number(0))
         self.assertEqual("0", _format_number(-0))
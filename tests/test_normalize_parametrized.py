@@ -206,10 +206,27 @@ cases_escape_dimension_values = [
     ("leave an even number of trailing slashes", ("a" * 247) + "\\\\\\",
      ("a" * 247) + "\\\\"),
     # 260 backslashes will be transformed into 125 escaped backslashes
-    ("only backslashes", "\\" * 260, "\\\\" * 125)
+    ("only backslashes", "\\" * 260, "\\\\" * 125),
+    ("long run of backslashes after one char", "a" + "\\" * 100_000,
+     "a" + "\\\\" * 124),
+    ("odd backslashes at truncation", "a" * 248 + "\\" * 3, "a" * 248 + "\\\\"),
+    ("long value with special chars", "a=" * 1_000_000, "a\\=" * 83 + "a"),
 ]
 
 
+def test_caches_do_not_keep_oversized_inputs():
+    normalize = Normalize()
+    for _ in range(2):
+        normalize.normalize_dimension_key("k" * 100_000 + "_")
+        normalize.normalize_and_escape_dimension_value("v" * 100_000 + "_")
+    # the oversized inputs are truncated before they are cached, so inputs
+    # that only differ after the maximum length share one entry.
+    normalize.normalize_dimension_key("k" * 100_000 + "-")
+    normalize.normalize_and_escape_dimension_value("v" * 100_000 + "-")
+
+    assert normalize.cache_statistics() == (4, 2)
+
+
 @pytest.mark.parametrize("msg,inp,exp", cases_escape_dimension_values,
                          ids=[x[0] for x in cases_escape_dimension_values])
 def test_parametrized_escape_dimension_value(msg, inp, exp):
@@ -251,3 +268,20 @@ def test_parametrized_invalid_metric_key_type(msg, inp):
         normalizer.normalize_metric_key(inp)
 
     assert str(ex.value) == f"Unexpected metric key type: {type(inp)}"
+
+
+@pytest.mark.parametrize("msg,inp,exp", cases_dimension_values,
+                         ids=[x[0] for x in cases_dimension_values])
+def test_parametrized_normalize_and_escape_dimension_value(msg, inp, exp):
+    expected = normalizer.escape_dimension_value(exp)
+    assert normalizer.normalize_and_escape_dimension_value(inp) == expected
+    # second call is answered from the cache
+    assert normalizer.normalize_and_escape_dimension_value(inp) == expected
+
+
+@pytest.mark.parametrize("msg,inp,exp", cases_escape_dimension_values,
+                         ids=[x[0] for x in cases_escape_dimension_values])
+def test_parametrized_normalize_and_escape_escaping(msg, inp, exp):
+    assert normalizer.normalize_and_escape_dimension_value(inp) == \
+        normalizer.escape_dimension_value(normalizer.normalize_dimension_value(
+            inp))
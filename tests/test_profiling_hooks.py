@@ -0,0 +1,154 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest import TestCase
+
+from dynatrace.metric.utils import AmbientDimensions, DimensionSet, \
+    DynatraceMetricsFactory, DynatraceMetricsSerializer, SelfMonitoring, \
+    SerializerConfig
+from dynatrace.metric.utils._normalize import Normalize
+
+
+class RecordingHook:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, stage, start, end):
+        self.calls.append((stage, start, end))
+
+    def stages(self):
+        return [stage for stage, _, _ in self.calls]
+
+
+class TestProfilingHooks(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+        cls.metric = cls.factory.create_int_gauge("metric", 1,
+                                                  {"dim": "val"})
+
+    def test_no_hooks_no_instrumentation(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        hook = RecordingHook()
+        serializer.add_profiling_hook(hook)
+        serializer.remove_profiling_hook(hook)
+
+        # all timed wrappers have been removed again.
+        self.assertEqual({}, {
+            k: v for k, v in vars(serializer).items() if callable(v)})
+        serializer.serialize(self.metric)
+        self.assertEqual([], hook.calls)
+
+    def test_serializer_stages(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        hook = RecordingHook()
+        serializer.add_profiling_hook(hook)
+
+        self.assertEqual("metric,dim=val gauge,1",
+                         serializer.serialize(self.metric))
+        self.assertEqual([
+            "normalize_metric_key",
+            "format_value",
+            "normalize_dimension_key",
+            "normalize_and_escape_dimension_value",
+            "merge_dimensions",
+            "serialize_dimensions",
+            "serialize",
+        ], hook.stages())
+
+        for _, start, end in hook.calls:
+            self.assertLessEqual(start, end)
+        # the serialize stage contains all other stages.
+        _, serialize_start, serialize_end = hook.calls[-1]
+        for _, start, end in hook.calls:
+            self.assertLessEqual(serialize_start, start)
+            self.assertLessEqual(end, serialize_end)
+
+    def test_documented_stages(self):
+        # the stages listed in the README.
+        documented = {
+            "normalize_metric_key", "normalize_metric_key_suffix",
+            "normalize_dimension_key", "normalize_and_escape_dimension_value",
+            "escape_dimension_value", "merge_dimensions",
+            "serialize_dimensions", "format_value", "serialize"}
+        hook = RecordingHook()
+        for kwargs in ({}, {"metric_key_prefix": "prefix",
+                            "default_dimensions": {"default": "dim"}}):
+            serializer = DynatraceMetricsSerializer(
+                enrich_with_dynatrace_metadata=False, **kwargs)
+            serializer.add_profiling_hook(hook)
+            for dimensions in ({"dim": "val"}, DimensionSet({"set": "val"})):
+                serializer.serialize(self.factory.create_int_gauge(
+                    "metric", 1, dimensions))
+            with AmbientDimensions({"ambient": "val"}):
+                serializer.serialize(self.metric)
+
+        self.assertEqual(documented, set(hook.stages()))
+
+    def test_multiple_hooks(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        first, second = RecordingHook(), RecordingHook()
+        serializer.add_profiling_hook(first)
+        serializer.add_profiling_hook(second)
+        serializer.serialize(self.metric)
+        serializer.remove_profiling_hook(first)
+        serializer.serialize(self.metric)
+
+        self.assertEqual(7, len(first.calls))
+        self.assertEqual(14, len(second.calls))
+
+    def test_with_self_monitoring(self):
+        self_monitoring = SelfMonitoring()
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False,
+            self_monitoring=self_monitoring)
+        hook = RecordingHook()
+        serializer.add_profiling_hook(hook)
+        serializer.serialize(self.metric)
+        serializer.remove_profiling_hook(hook)
+        serializer.serialize(self.metric)
+
+        self.assertEqual("serialize", hook.stages()[-1])
+        self.assertEqual(2, self_monitoring.snapshot()["lines_serialized"])
+
+    def test_hooks_of_serializers_sharing_a_config(self):
+        config = SerializerConfig(enrich_with_dynatrace_metadata=False)
+        profiled, other = config.serializer(), config.serializer()
+        hook = RecordingHook()
+        profiled.add_profiling_hook(hook)
+        other.serialize(self.metric)
+        self.assertEqual([], hook.calls)
+
+        profiled.serialize(self.metric)
+        self.assertIn("normalize_metric_key", hook.stages())
+        # the shared normalizer is never instrumented.
+        self.assertEqual({}, {
+            k: v for k, v in vars(config._normalize).items()
+            if callable(v)})
+
+    def test_normalize_hooks(self):
+        normalize = Normalize()
+        hook = RecordingHook()
+        normalize.add_profiling_hook(hook)
+        self.assertEqual("a.b", normalize.normalize_metric_key("a..b"))
+        self.assertEqual("\\ ", normalize.escape_dimension_value(" "))
+        normalize.remove_profiling_hook(hook)
+        normalize.normalize_metric_key("a")
+
+        self.assertEqual(["normalize_metric_key", "escape_dimension_value"],
+                         hook.stages())
@@ -0,0 +1,160 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import io
+from unittest import TestCase
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, \
+    PrometheusConverter
+
+SCRAPE = '''\
+# HELP http_requests_total The total number of HTTP requests.
+# TYPE http_requests_total counter
+http_requests_total{method="post",code="200"} {requests_200}
+http_requests_total{method="post",code="400"} 3 1616416882000
+# TYPE temperature gauge
+temperature{room="a \\"b\\""} 21.5
+temperature{room="c"} NaN
+process_open_fds 12
+# TYPE request_duration_seconds histogram
+request_duration_seconds_bucket{le="0.1"} {bucket_1}
+request_duration_seconds_bucket{le="0.5"} {bucket_5}
+request_duration_seconds_bucket{le="1"} {bucket_10}
+request_duration_seconds_bucket{le="+Inf"} {count}
+request_duration_seconds_sum {sum}
+request_duration_seconds_count {count}
+# TYPE rpc_duration_seconds summary
+rpc_duration_seconds{service="a",quantile="0.5"} 0.2
+rpc_duration_seconds{service="a",quantile="0.99"} 0.9
+rpc_duration_seconds_sum{service="a"} {sum}
+rpc_duration_seconds_count{service="a"} {count}
+'''
+
+
+def scrape(requests_200=1000, bucket_1=0, bucket_5=0, bucket_10=0, count=0,
+           total=0.0):
+    text = SCRAPE
+    for name, value in (("requests_200", requests_200),
+                        ("bucket_1", bucket_1), ("bucket_5", bucket_5),
+                        ("bucket_10", bucket_10), ("count", count),
+                        ("sum", total)):
+        text = text.replace("{" + name + "}", str(value))
+    return io.StringIO(text)
+
+
+class TestPrometheusConverter(TestCase):
+
+    def setUp(self) -> None:
+        self.converter = PrometheusConverter(DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False))
+
+    def convert(self, lines, timestamp=None):
+        return list(self.converter.convert_lines(lines, timestamp))
+
+    def test_first_scrape(self):
+        # counters, histograms and summaries are only initialized.
+        self.assertEqual([
+            'temperature,room=a\\ \\"b\\" gauge,21.5',
+            "process_open_fds gauge,12",
+        ], self.convert(scrape()))
+
+    def test_second_scrape(self):
+        self.convert(scrape())
+        lines = self.convert(scrape(requests_200=1010, bucket_1=2, bucket_5=5,
+                                    bucket_10=6, count=7, total=4.2))
+        self.assertEqual([
+            "http_requests_total,method=post,code=200 count,delta=10",
+            "http_requests_total,method=post,code=400 count,delta=0 "
+            "1616416882000",
+            'temperature,room=a\\ \\"b\\" gauge,21.5',
+            "process_open_fds gauge,12",
+            # the lowest bucket starts at 0 and the largest value is in the
+            # +Inf bucket, above the largest finite bound.
+            "request_duration_seconds gauge,min=0,max=1,sum=4.2,count=7",
+            "rpc_duration_seconds,service=a gauge,min=0.2,max=0.9,sum=4.2,"
+            "count=7",
+        ], lines)
+
+    def test_histogram_bounds(self):
+        self.convert(scrape(bucket_1=10, bucket_5=10, bucket_10=10, count=10,
+                            total=0.5))
+        lines = self.convert(scrape(bucket_1=10, bucket_5=12, bucket_10=14,
+                                    count=14, total=2.1))
+        self.assertIn("request_duration_seconds gauge,min=0.1,max=1,sum=1.6,"
+                      "count=4", lines)
+
+    def test_histogram_reset(self):
+        self.convert(scrape(bucket_1=10, bucket_5=10, bucket_10=10, count=10,
+                            total=0.5))
+        lines = self.convert(scrape(bucket_1=1, bucket_5=1, bucket_10=1,
+                                    count=1, total=0.05))
+        self.assertIn("request_duration_seconds gauge,min=0,max=0.1,"
+                      "sum=0.05,count=1", lines)
+
+    def test_no_observations(self):
+        self.convert(scrape(count=3, bucket_1=3, total=0.1))
+        lines = self.convert(scrape(count=3, bucket_1=3, total=0.1))
+        self.assertFalse([line for line in lines
+                          if "duration_seconds" in line])
+
+    def test_openmetrics(self):
+        text = [
+            "# TYPE jobs counter",
+            "jobs_total 5",
+            "jobs_created 1616416800.5",
+            "# TYPE queue gauge",
+            "queue 3 1616416882.5",
+            "# EOF",
+        ]
+        self.convert(text)
+        self.assertEqual([
+            "jobs_total count,delta=2",
+            "queue gauge,3 1616416882500",
+        ], self.convert([line.replace("5", "7", 1) if line == "jobs_total 5"
+                         else line for line in text]))
+
+    def test_bytes_and_default_timestamp(self):
+        self.assertEqual(["up gauge,1 1616416882000"],
+                         self.convert([b"up 1\n"], 1616416882000))
+
+    def test_invalid_lines(self):
+        lines = self.convert([
+            "no_value",
+            "too many fields 1 2",
+            'broken{label="x" 1',
+            'invalid{label=x} 1',
+            "not_a_number abc",
+            "valid 1",
+        ])
+        self.assertEqual(["valid gauge,1"], lines)
+
+    def test_series_timeout(self):
+        class FakeClock:
+            now = 1000.0
+
+            def __call__(self):
+                return self.now
+
+        clock = FakeClock()
+        converter = PrometheusConverter(
+            DynatraceMetricsSerializer(enrich_with_dynatrace_metadata=False),
+            series_timeout=60, clock=clock)
+        list(converter.convert_lines(scrape(count=1, bucket_1=1, total=0.1)))
+        clock.now += 120
+        lines = list(converter.convert_lines(scrape(count=2, bucket_1=2,
+                                                    total=0.2)))
+        # the histogram was forgotten and is initialized again.
+        self.assertFalse([line for line in lines
+                          if line.startswith("request_duration")])
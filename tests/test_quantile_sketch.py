@@ -0,0 +1,209 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import random
+from unittest import TestCase
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, MetricError, \
+    QuantileSketch, QuantileSketchAggregator
+
+QUANTILES = (0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+
+def exact_quantile(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+class TestQuantileSketch(TestCase):
+
+    def assert_accurate(self, sketch, values, relative_accuracy=0.01):
+        values = sorted(values)
+        for q, estimate in zip(QUANTILES, sketch.quantiles(QUANTILES)):
+            expected = exact_quantile(values, q)
+            self.assertLessEqual(
+                abs(estimate - expected),
+                relative_accuracy * abs(expected) + 1e-12,
+                "quantile {}".format(q))
+
+    def test_empty(self):
+        sketch = QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertIsNone(sketch.min)
+        self.assertIsNone(sketch.max)
+        self.assertEqual(0, sketch.count)
+
+    def test_relative_accuracy(self):
+        rng = random.Random(42)
+        distributions = {
+            "lognormal": [rng.lognormvariate(0, 2) for _ in range(20_000)],
+            "uniform": [rng.uniform(-1000, 1000) for _ in range(20_000)],
+            "integers": [rng.randrange(0, 10) for _ in range(20_000)],
+            "negative": [-rng.expovariate(0.1) for _ in range(20_000)],
+        }
+        for name, values in distributions.items():
+            with self.subTest(name):
+                sketch = QuantileSketch()
+                for value in values:
+                    sketch.add(value)
+                self.assert_accurate(sketch, values)
+                self.assertEqual(len(values), sketch.count)
+                self.assertAlmostEqual(sum(values), sketch.sum, places=3)
+                self.assertEqual(min(values), sketch.min)
+                self.assertEqual(max(values), sketch.max)
+
+    def test_single_value(self):
+        sketch = QuantileSketch()
+        sketch.add(12.5)
+        self.assertEqual([12.5] * len(QUANTILES),
+                         sketch.quantiles(QUANTILES))
+
+    def test_merge(self):
+        rng = random.Random(1)
+        values = [rng.expovariate(1) for _ in range(10_000)]
+        first, second = QuantileSketch(), QuantileSketch()
+        for value in values[:3000]:
+            first.add(value)
+        for value in values[3000:]:
+            second.add(value)
+        first.merge(second)
+        first.merge(QuantileSketch())
+
+        self.assertEqual(len(values), first.count)
+        self.assert_accurate(first, values)
+
+        with self.assertRaises(ValueError):
+            first.merge(QuantileSketch(relative_accuracy=0.02))
+
+    def test_bounded_bins_keep_high_quantiles(self):
+        sketch = QuantileSketch(max_bins=64)
+        values = [1.1 ** i for i in range(-500, 500)]
+        for value in values:
+            sketch.add(value)
+
+        values.sort()
+        for q in (0.95, 0.99, 1.0):
+            expected = exact_quantile(values, q)
+            self.assertLessEqual(abs(sketch.quantile(q) - expected),
+                                 0.01 * expected)
+        # the collapsed lowest quantiles are less accurate, but bounded.
+        self.assertGreaterEqual(sketch.quantile(0.0), values[0])
+        self.assertLess(len(sketch.to_bytes()), 64 * 2 * 16 + 100)
+
+    def test_merge_into_collapsed_sketch(self):
+        for sign in (1, -1):
+            collapsed = QuantileSketch(max_bins=8)
+            for i in range(20, 40):
+                collapsed.add(sign * 2 ** i)
+            small = QuantileSketch()
+            for value in (1, 2, 3, -1, -2):
+                small.add(value)
+
+            # sketches with more bins, which take over the collapsed bins.
+            merged, direct = QuantileSketch(), QuantileSketch()
+            merged.merge(collapsed)
+            direct.merge(collapsed)
+            merged.merge(small)
+            for value in (1, 2, 3, -1, -2):
+                direct.add(value)
+
+            # the bins of the merged sketch beyond the collapsed bins are
+            # collapsed, like the values that are added directly.
+            self.assertEqual(len(direct.to_bytes()), len(merged.to_bytes()))
+            qs = [i / 20 for i in range(21)]
+            self.assertEqual(direct.quantiles(qs), merged.quantiles(qs))
+
+    def test_bytes_round_trip(self):
+        rng = random.Random(7)
+        sketch = QuantileSketch(max_bins=100)
+        for _ in range(5000):
+            sketch.add(rng.uniform(-10, 1e6))
+        sketch.add(0)
+
+        restored = QuantileSketch.from_bytes(sketch.to_bytes())
+        self.assertEqual(sketch.quantiles(QUANTILES),
+                         restored.quantiles(QUANTILES))
+        self.assertEqual((sketch.count, sketch.sum, sketch.min, sketch.max),
+                         (restored.count, restored.sum, restored.min,
+                          restored.max))
+        self.assertEqual(sketch.to_bytes(), restored.to_bytes())
+
+        empty = QuantileSketch.from_bytes(QuantileSketch().to_bytes())
+        self.assertEqual(0, empty.count)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(relative_accuracy=0)
+        with self.assertRaises(ValueError):
+            QuantileSketch(max_bins=0)
+        with self.assertRaises(MetricError):
+            QuantileSketch().add(float("nan"))
+        with self.assertRaises(ValueError):
+            QuantileSketch().quantile(1.5)
+        with self.assertRaises(ValueError):
+            QuantileSketch.from_bytes(b"DTQS")
+        with self.assertRaises(ValueError):
+            QuantileSketch.from_bytes(QuantileSketch().to_bytes() + b"\0")
+
+
+class TestQuantileSketchAggregator(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+
+    def test_collect(self):
+        aggregator = QuantileSketchAggregator(percentiles=(0.5, 0.999))
+        for value in range(1, 101):
+            aggregator.record("latency", value, {"route": "/a"})
+        aggregator.record("latency", 5, {"route": "/b"})
+
+        lines = [self.serializer.serialize(metric)
+                 for metric in aggregator.collect()]
+        self.assertEqual([
+            "latency,route=/a gauge,min=1,max=100,sum=5050,count=100",
+            "latency,route=/b gauge,min=5,max=5,sum=5,count=1",
+            "latency.p50,route=/b gauge,5",
+            "latency.p99_9,route=/b gauge,5",
+        ], [lines[0]] + lines[3:])
+
+        p50_name, p50 = lines[1].split(" gauge,")
+        self.assertEqual("latency.p50,route=/a", p50_name)
+        self.assertAlmostEqual(50, float(p50), delta=0.5)
+        p999_name, p999 = lines[2].split(" gauge,")
+        self.assertEqual("latency.p99_9,route=/a", p999_name)
+        self.assertAlmostEqual(99, float(p999), delta=0.99)
+
+        # series are reset after collection.
+        self.assertEqual([], aggregator.collect())
+
+    def test_merge_and_timestamp(self):
+        aggregator = QuantileSketchAggregator(percentiles=(0.5,))
+        sketch = QuantileSketch()
+        sketch.add(2)
+        aggregator.merge("latency", QuantileSketch.from_bytes(
+            sketch.to_bytes()))
+        aggregator.record("latency", 2)
+
+        self.assertEqual([
+            "latency gauge,min=2,max=2,sum=4,count=2 1620000000000",
+            "latency.p50 gauge,2 1620000000000",
+        ], [self.serializer.serialize(metric)
+            for metric in aggregator.collect(1620000000000)])
+
+    def test_invalid_value_creates_no_series(self):
+        aggregator = QuantileSketchAggregator()
+        with self.assertRaises(MetricError):
+            aggregator.record("latency", float("inf"))
+        self.assertEqual([], aggregator.collect())
@@ -0,0 +1,128 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest import TestCase
+
+from dynatrace.metric.utils import DynatraceMetricsFactory, \
+    DynatraceMetricsSerializer, MetricError, SelfMonitoring
+
+
+class TestSelfMonitoring(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    def setUp(self) -> None:
+        self.self_monitoring = SelfMonitoring()
+        self.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False,
+            self_monitoring=self.self_monitoring)
+
+    def test_disabled_by_default(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+        # no instance attribute shadows the serialize method.
+        self.assertNotIn("serialize", vars(serializer))
+
+    def test_counts_lines_and_bytes(self):
+        lines = [
+            self.serializer.serialize(
+                self.factory.create_int_gauge("metric", 1, {"dim": "val"})),
+            self.serializer.serialize(
+                self.factory.create_int_gauge("metric", 2, {"dim": "väl"})),
+        ]
+
+        snapshot = self.self_monitoring.snapshot()
+        self.assertEqual(2, snapshot["lines_serialized"])
+        self.assertEqual(sum(len(line.encode("utf-8")) for line in lines),
+                         snapshot["bytes_produced"])
+        self.assertEqual(
+            2, sum(snapshot["serialization_time_histogram_ns"].values()))
+        self.assertEqual({}, snapshot["errors"])
+
+    def test_counts_cache_hits(self):
+        for _ in range(3):
+            self.serializer.serialize(
+                self.factory.create_int_gauge("metric", 1, {"dim": "val"}))
+
+        # one dimension key and one dimension value.
+        snapshot = self.self_monitoring.snapshot()
+        self.assertEqual(2, snapshot["normalization_cache_misses"])
+        self.assertEqual(4, snapshot["normalization_cache_hits"])
+
+    def test_counts_errors_by_reason(self):
+        too_long = self.factory.create_int_gauge(
+            "metric", 1,
+            {"dim{}".format(i): "x" * 250 for i in range(250)})
+        with self.assertRaises(MetricError) as ctx:
+            self.serializer.serialize(too_long)
+        self.assertEqual("line_too_long", ctx.exception.reason)
+
+        with self.assertRaises(MetricError):
+            self.serializer.serialize(
+                self.factory.create_int_gauge("~~~", 1, {1: "val"}))
+
+        snapshot = self.self_monitoring.snapshot()
+        self.assertEqual({"line_too_long": 1, "invalid_type": 1},
+                         snapshot["errors"])
+        self.assertEqual(1, snapshot["lines_dropped_too_long"])
+        self.assertEqual(0, snapshot["lines_serialized"])
+
+    def test_collect_metrics_exports_deltas(self):
+        self.serializer.serialize(self.factory.create_int_gauge("metric", 1))
+        self.serializer.serialize(self.factory.create_int_gauge("metric", 2))
+
+        lines = {
+            line.split(" ")[0]: line.split(" ")[1]
+            for line in map(self.serializer.serialize,
+                            self.self_monitoring.collect_metrics())
+        }
+        self.assertEqual("count,delta=2", lines["dt.sdk.serializer.lines"])
+        self.assertTrue(
+            lines["dt.sdk.serializer.duration"].endswith(",count=2"))
+
+        # the self-monitoring lines serialized above are counted as well.
+        lines = {
+            line.split(" ")[0]: line.split(" ")[1]
+            for line in map(self.serializer.serialize,
+                            self.self_monitoring.collect_metrics())
+        }
+        self.assertEqual("count,delta=3", lines["dt.sdk.serializer.lines"])
+
+    def test_collect_metrics_errors_have_reason_dimension(self):
+        with self.assertRaises(MetricError):
+            self.serializer.serialize(
+                self.factory.create_int_gauge("metric", 1, {"dim": 1}))
+
+        lines = [self.serializer.serialize(metric) for metric in
+                 self.self_monitoring.collect_metrics()]
+        self.assertIn(
+            "dt.sdk.serializer.errors,reason=invalid_type count,delta=1",
+            lines)
+
+    def test_counts_dimensions_dropped_to_fit(self):
+        serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False,
+            self_monitoring=self.self_monitoring,
+            drop_dimensions_to_fit=True)
+        serializer.serialize(self.factory.create_int_gauge(
+            "metric", 1,
+            {"dim{:03}".format(i): "x" * 250 for i in range(250)}))
+
+        # each dimension takes 258 characters, so 193 of them fit.
+        snapshot = self.self_monitoring.snapshot()
+        self.assertEqual(250 - 193, snapshot["dimensions_dropped_to_fit"])
+        self.assertEqual(1, snapshot["lines_serialized"])
+        self.assertEqual({}, snapshot["errors"])
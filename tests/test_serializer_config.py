@@ -0,0 +1,96 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pickle
+from unittest import TestCase
+from unittest.mock import patch
+
+from dynatrace.metric.utils import DynatraceMetricsFactory, \
+    DynatraceMetricsSerializer, SelfMonitoring, SerializerConfig
+
+METADATA = ('dynatrace.metric.utils._dynatrace_metadata_enricher.'
+            'DynatraceMetadataEnricher.get_dynatrace_metadata')
+
+
+class TestSerializerConfig(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.factory = DynatraceMetricsFactory()
+
+    @patch(METADATA)
+    def test_metadata_read_once(self, get_metadata):
+        get_metadata.return_value = {"dt.entity.host": "HOST-1"}
+        config = SerializerConfig(metrics_source="src")
+        serializers = [config.serializer(metric_key_prefix="tenant{}".format(i))
+                       for i in range(100)]
+
+        self.assertEqual(1, get_metadata.call_count)
+        self.assertEqual({"dt.entity.host": "HOST-1",
+                          "dt.metrics.source": "src"},
+                         dict(config.static_dimensions))
+        self.assertEqual(
+            "tenant42.metric,dt.entity.host=HOST-1,dt.metrics.source=src "
+            "gauge,1",
+            serializers[42].serialize(
+                self.factory.create_int_gauge("metric", 1)))
+        for serializer in serializers:
+            self.assertIs(config, serializer.config)
+
+    @patch(METADATA)
+    def test_same_output_as_standalone_serializer(self, get_metadata):
+        get_metadata.return_value = {"dt.entity.host": "HOST-1"}
+        config = SerializerConfig(metrics_source="src")
+        view = config.serializer("prefix", {"Default": "value",
+                                            "dim": "overwritten"})
+        standalone = DynatraceMetricsSerializer(
+            None, "prefix", {"Default": "value", "dim": "overwritten"},
+            metrics_source="src")
+
+        metric = self.factory.create_float_gauge(
+            "metric", 1.5, {"dim": "a b", "dt.metrics.source": "x"})
+        self.assertEqual(standalone.serialize(metric), view.serialize(metric))
+
+    def test_views_share_normalization_cache(self):
+        config = SerializerConfig(enrich_with_dynatrace_metadata=False)
+        self_monitoring = SelfMonitoring()
+        first = config.serializer("first", self_monitoring=self_monitoring)
+        second = config.serializer("second", self_monitoring=self_monitoring)
+
+        metric = self.factory.create_int_gauge("metric", 1, {"dim": "value"})
+        first.serialize(metric)
+        second.serialize(metric)
+
+        # the second serializer hits the cache filled by the first one.
+        snapshot = self_monitoring.snapshot()
+        self.assertEqual(2, snapshot["normalization_cache_misses"])
+        self.assertEqual(2, snapshot["normalization_cache_hits"])
+
+    def test_immutable_static_dimensions(self):
+        config = SerializerConfig(enrich_with_dynatrace_metadata=False,
+                                  metrics_source="src")
+        with self.assertRaises(TypeError):
+            config.static_dimensions["key"] = "value"
+
+    def test_pickle(self):
+        config = SerializerConfig(enrich_with_dynatrace_metadata=False,
+                                  metrics_source="a=b")
+        restored = pickle.loads(pickle.dumps(config))
+        self.assertEqual({"dt.metrics.source": "a\\=b"},
+                         dict(restored.static_dimensions))
+
+        self.assertEqual(
+            "metric,dt.metrics.source=a\\=b gauge,1",
+            restored.serializer().serialize(
+                self.factory.create_int_gauge("metric", 1)))
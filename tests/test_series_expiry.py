@@ -0,0 +1,152 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import random
+from unittest import TestCase
+
+from dynatrace.metric.utils import CumulativeToDeltaConverter, \
+    PrometheusConverter, SeriesExpiry
+from dynatrace.metric.utils._timing_wheel import HierarchicalTimingWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHierarchicalTimingWheel(TestCase):
+
+    def test_items_are_due_at_their_deadline(self):
+        rng = random.Random(4)
+        wheel = HierarchicalTimingWheel(100)
+        deadlines = {}
+        for item in range(2000):
+            # deadlines on all levels and in the overflow list.
+            deadline = 100 + int(rng.choice((1, 64, 4096, 2 ** 24, 2 ** 26))
+                                 * rng.random()) + 1
+            deadlines[item] = deadline
+            wheel.schedule(item, deadline)
+        self.assertEqual(2000, len(wheel))
+
+        due = {}
+        tick = 100
+        while len(due) < len(deadlines):
+            # small steps, and jumps that skip the stepping.
+            tick += rng.choice((1, 7, 63, 64, 65, 5000, 2 ** 20))
+            wheel.advance(tick, lambda item: due.setdefault(item, tick))
+
+        for item, deadline in deadlines.items():
+            self.assertLessEqual(deadline, due[item])
+            # due in the first advance that reached the deadline.
+            self.assertGreater(deadline, due[item] - 2 ** 20)
+        self.assertEqual(0, len(wheel))
+
+    def test_step_by_step(self):
+        wheel = HierarchicalTimingWheel()
+        for deadline in (1, 63, 64, 65, 4095, 4096, 4097, 300_000):
+            wheel.schedule(deadline, deadline)
+        due = []
+        for tick in range(1, 300_001):
+            wheel.advance(tick, lambda item: due.append((item, tick)))
+        self.assertEqual([(d, d) for d in (1, 63, 64, 65, 4095, 4096, 4097,
+                                           300_000)], due)
+
+    def test_past_deadlines_are_due_in_the_next_tick(self):
+        wheel = HierarchicalTimingWheel(10)
+        wheel.schedule("item", 5)
+        due = []
+        wheel.advance(11, due.append)
+        self.assertEqual(["item"], due)
+
+
+class TestSeriesExpiry(TestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.expiry = SeriesExpiry(clock=self.clock)
+
+    def test_idle_series_expire(self):
+        tracker = self.expiry.tracker(60)
+        tracker.touch("idle")
+        tracker.touch("active")
+        for _ in range(6):
+            self.clock.now += 10
+            self.assertEqual([], tracker.expired())
+            tracker.touch("active")
+        self.assertEqual(2, len(tracker))
+
+        self.clock.now += 10
+        self.assertEqual(["idle"], tracker.expired())
+        self.assertEqual(1, len(tracker))
+
+    def test_discard(self):
+        tracker = self.expiry.tracker(60)
+        tracker.touch("series")
+        tracker.discard("series")
+        self.assertEqual(0, len(tracker))
+        self.clock.now += 120
+        self.assertEqual([], tracker.expired())
+
+    def test_shared_between_trackers(self):
+        short = self.expiry.tracker(10)
+        long = self.expiry.tracker(100)
+        short.touch("a")
+        long.touch("a")
+        self.clock.now += 20
+        # only the tracker that expires a series advances the wheel.
+        self.assertEqual([], long.expired())
+        self.assertEqual(["a"], short.expired())
+        self.clock.now += 100
+        self.assertEqual(["a"], long.expired())
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        tracker = self.expiry.tracker(30)
+        last_touched = {}
+        for _ in range(3000):
+            self.clock.now += rng.choice((0.1, 1, 5, 29, 31, 10_000))
+            expired = set(tracker.expired())
+            tick = int(self.clock.now)
+            expected = {key for key, touched in last_touched.items()
+                        if touched + 31 <= tick}
+            self.assertEqual(expected, expired)
+            for key in expired:
+                del last_touched[key]
+
+            for key in rng.sample(range(200), 10):
+                tracker.touch(key)
+                last_touched[key] = tick
+            self.assertEqual(len(last_touched), len(tracker))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            SeriesExpiry(0)
+        with self.assertRaises(ValueError):
+            self.expiry.tracker(-1)
+
+    def test_converters_share_expiry(self):
+        converter = CumulativeToDeltaConverter(series_timeout=60,
+                                               expiry=self.expiry)
+        prometheus = PrometheusConverter(series_timeout=60,
+                                         expiry=self.expiry)
+        converter.convert("bytes", 1)
+        list(prometheus.convert(["# TYPE requests counter",
+                                 'requests{code="200"} 1']))
+        self.clock.now += 120
+        self.assertIsNone(converter.convert("bytes", 2))
+        self.assertEqual(1, len(converter))
@@ -0,0 +1,234 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import TestCase, mock
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, \
+    MetricError, SidecarClient, SidecarDaemon
+from dynatrace.metric.utils import _sidecar_protocol as protocol
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"),
+                     "Unix domain sockets are not available")
+class TestSidecar(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix="dt")
+        self.path = os.path.join(self.directory, "sidecar.sock")
+        self.payloads = []
+        self.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False, metrics_source="sidecar")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def daemon(self, datagram: bool = False) -> SidecarDaemon:
+        return SidecarDaemon(self.path, self.serializer,
+                             export=self.payloads.append,
+                             flush_interval=3600, datagram=datagram)
+
+    def wait_for_records(self, daemon: SidecarDaemon, count: int) -> None:
+        for _ in range(500):
+            if daemon.snapshot()["records_received"] >= count:
+                return
+            threading.Event().wait(0.01)
+        self.fail("Records were not received: {}".format(daemon.snapshot()))
+
+    def exported_lines(self):
+        return sorted(line for payload in self.payloads
+                      for line in payload.split("\n"))
+
+    def check_aggregation(self, datagram: bool) -> None:
+        with self.daemon(datagram).start() as daemon:
+            with SidecarClient(self.path, datagram=datagram) as client:
+                for i in range(3):
+                    client.add("requests", 1, {"route": "/items"})
+                    client.add("requests", 2, {"route": "/other"})
+                    client.gauge("queue.size", 10 + i)
+                    client.record("duration", 0.5 * i, {"route": "/items"},
+                                  timestamp=1616416882000)
+                client.add("bytes", 1.5)
+            self.wait_for_records(daemon, 13)
+            self.assertEqual(5, daemon.flush())
+
+        self.assertEqual([
+            "bytes,dt.metrics.source=sidecar count,delta=1.5",
+            "duration,route=/items,dt.metrics.source=sidecar "
+            "gauge,min=0,max=1,sum=1.5,count=3 1616416882000",
+            "queue.size,dt.metrics.source=sidecar gauge,12",
+            "requests,route=/items,dt.metrics.source=sidecar count,delta=3",
+            "requests,route=/other,dt.metrics.source=sidecar count,delta=6",
+        ], self.exported_lines())
+
+    def test_stream(self):
+        self.check_aggregation(datagram=False)
+
+    def test_datagram(self):
+        self.check_aggregation(datagram=True)
+
+    def test_small_datagrams(self):
+        # every datagram defines the series it uses.
+        with self.daemon(datagram=True).start() as daemon:
+            with SidecarClient(self.path, datagram=True,
+                               buffer_size=64) as client:
+                for i in range(100):
+                    client.add("requests", 1, {"shard": str(i % 3)})
+            self.wait_for_records(daemon, 100)
+            daemon.flush()
+            self.assertEqual(0, daemon.snapshot()["records_invalid"])
+
+        self.assertEqual([
+            "requests,shard=0,dt.metrics.source=sidecar count,delta=34",
+            "requests,shard=1,dt.metrics.source=sidecar count,delta=33",
+            "requests,shard=2,dt.metrics.source=sidecar count,delta=33",
+        ], self.exported_lines())
+
+    def check_series_ids_are_reused(self, datagram: bool) -> None:
+        with self.daemon(datagram).start() as daemon:
+            with SidecarClient(self.path, datagram=datagram,
+                               max_series=2) as client:
+                for i in range(10):
+                    client.add("requests", 1, {"shard": str(i % 5)})
+            self.wait_for_records(daemon, 10)
+            daemon.flush()
+            self.assertEqual(0, daemon.snapshot()["records_invalid"])
+
+        self.assertEqual([
+            "requests,shard={},dt.metrics.source=sidecar count,delta=2"
+            .format(i) for i in range(5)], self.exported_lines())
+
+    def test_series_ids_are_reused(self):
+        self.check_series_ids_are_reused(datagram=False)
+
+    def test_series_ids_are_reused_in_datagrams(self):
+        self.check_series_ids_are_reused(datagram=True)
+
+    def test_oversized_series(self):
+        with SidecarClient(self.path, datagram=True) as client:
+            with self.assertRaises(MetricError):
+                client.add("requests", 1, {"key": "x" * 2048})
+            with self.assertRaises(MetricError):
+                client.add("requests", 1,
+                           {str(i): "" for i in range(0x10000)})
+
+    def test_unknown_series_are_invalid(self):
+        with self.daemon().start() as daemon:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            sock.sendall(protocol.INT_VALUE.pack(
+                protocol.VALUE_RECORD_LENGTH, protocol.VALUE_RECORD, 7,
+                protocol.COUNTER_INT, 1, 0))
+            self.wait_for_records(daemon, 1)
+            self.assertEqual(1, daemon.snapshot()["records_invalid"])
+
+            # series ids are bounded, so the connection is closed.
+            sock.sendall(protocol.encode_series(0x10000, "requests", None))
+            sock.settimeout(5)
+            self.assertEqual(b"", sock.recv(1))
+            sock.close()
+
+    def test_oversized_record_closes_connection(self):
+        with self.daemon().start():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            # only the header is sent, the record is rejected right away.
+            sock.sendall(protocol.RECORD_LENGTH.pack(0xFFFFFFFF) + b"\x01")
+            sock.settimeout(5)
+            self.assertEqual(b"", sock.recv(1))
+            sock.close()
+
+        with self.assertRaises(MetricError):
+            protocol.encode_series(0, "requests", {"key": "x" * 16383,
+                                                   **{str(i): "x" * 16383
+                                                      for i in range(64)}})
+
+    def test_datagram_receive_errors(self):
+        daemon = self.daemon(datagram=True)
+        try:
+            with mock.patch.object(socket.socket, "recv",
+                                   side_effect=OSError("No buffer space")), \
+                    self.assertLogs(level="WARNING"):
+                daemon._SidecarDaemon__receive_datagram()
+        finally:
+            daemon.close()
+
+    def test_invalid_values_are_dropped(self):
+        with self.daemon().start() as daemon:
+            with SidecarClient(self.path) as client:
+                client.gauge("gauge", float("nan"))
+                client.gauge("~", 1)
+                client.gauge(" ", 1)
+                client.add("big", 2 ** 70)
+            self.wait_for_records(daemon, 4)
+            self.assertEqual(2, daemon.snapshot()["records_invalid"])
+
+        self.assertEqual([
+            "_,dt.metrics.source=sidecar gauge,1",
+            "big,dt.metrics.source=sidecar count,delta=1.18059162e+21",
+        ], self.exported_lines())
+
+    def test_reconnect(self):
+        client = SidecarClient(self.path)
+        # no daemon is running, the records are dropped.
+        client.add("requests")
+        client.flush()
+        self.assertEqual(1, client.dropped_records)
+
+        with self.daemon().start() as daemon:
+            client.add("requests")
+            client.close()
+            self.wait_for_records(daemon, 1)
+
+        self.assertEqual(
+            ["requests,dt.metrics.source=sidecar count,delta=1"],
+            self.exported_lines())
+
+    def test_protocol_error_closes_connection(self):
+        with self.daemon().start() as daemon:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            sock.sendall(b"\x05\x00\x00\x00\x09garbage")
+            sock.settimeout(5)
+            self.assertEqual(b"", sock.recv(1))
+            sock.close()
+
+            with SidecarClient(self.path) as client:
+                client.add("requests")
+            self.wait_for_records(daemon, 1)
+
+    def test_flush_interval(self):
+        daemon = SidecarDaemon(self.path, self.serializer,
+                               export=self.payloads.append,
+                               flush_interval=0.05).start()
+        try:
+            with SidecarClient(self.path) as client:
+                client.add("requests")
+            for _ in range(500):
+                if self.payloads:
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            daemon.close()
+
+        self.assertEqual(
+            ["requests,dt.metrics.source=sidecar count,delta=1"],
+            self.exported_lines())
+        self.assertFalse(os.path.exists(self.path))
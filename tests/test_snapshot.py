@@ -0,0 +1,145 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import os
+import struct
+import tempfile
+import threading
+from unittest import TestCase
+
+from dynatrace.metric.utils import CumulativeToDeltaConverter, \
+    DynatraceMetricsSerializer, SnapshotError, ThreadLocalRecorder
+
+
+class TestSnapshot(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.snapshot")
+
+    def lines(self, recorder: ThreadLocalRecorder):
+        return sorted(self.serializer.serialize(metric)
+                      for metric in recorder.collect())
+
+    def record(self, recorder: ThreadLocalRecorder) -> None:
+        recorder.add("requests", 3, {"route": "/a b", "method": "GET"})
+        recorder.add("requests", 2, {"route": "/a b", "method": "GET"})
+        recorder.add("bytes", 1.5, {"route": "/a b"})
+        recorder.add("huge", 2 ** 70)
+        recorder.add("unicode.😀", 1, {"ключ": "значение"})
+        recorder.record("latency", 10, {"route": "/a b"})
+        recorder.record("latency", 30, {"route": "/a b"})
+        recorder.record("duration", 0.25)
+        recorder.record("duration", 1.75)
+
+    def test_save_and_restore(self):
+        recorder = ThreadLocalRecorder()
+        self.record(recorder)
+        self.assertEqual(6, recorder.save_snapshot(self.path))
+
+        restored = ThreadLocalRecorder()
+        self.assertEqual(6, restored.restore_snapshot(self.path))
+        # saving does not reset the recorded values.
+        self.assertEqual(self.lines(recorder), self.lines(restored))
+
+    def test_restore_merges_with_recorded_values(self):
+        recorder = ThreadLocalRecorder()
+        self.record(recorder)
+        recorder.save_snapshot(self.path)
+
+        restored = ThreadLocalRecorder()
+        # recorded in another thread, so the tables are merged on collect.
+        thread = threading.Thread(target=self.record, args=(restored,))
+        thread.start()
+        thread.join()
+        restored.restore_snapshot(self.path)
+        restored.restore_snapshot(self.path)
+        self.record(recorder)
+        self.record(recorder)
+        self.assertEqual(self.lines(recorder), self.lines(restored))
+
+    def test_dimension_order(self):
+        recorder = ThreadLocalRecorder()
+        recorder.add("first", 1, {"a": "1", "b": "2"})
+        recorder.add("second", 1, {"b": "2", "a": "1"})
+        recorder.save_snapshot(self.path)
+
+        restored = ThreadLocalRecorder()
+        restored.restore_snapshot(self.path)
+        self.assertEqual(["first,a=1,b=2 count,delta=1",
+                          "second,b=2,a=1 count,delta=1"],
+                         self.lines(restored))
+
+    def test_empty_snapshot(self):
+        self.assertEqual(0, ThreadLocalRecorder().save_snapshot(self.path))
+        recorder = ThreadLocalRecorder()
+        self.assertEqual(0, recorder.restore_snapshot(self.path))
+        self.assertEqual([], recorder.collect())
+
+    def test_cumulative_to_delta_converter(self):
+        converter = CumulativeToDeltaConverter()
+        converter.convert("bytes", 100, {"host": "a"})
+        converter.convert("seconds", 1.5)
+        self.assertEqual(2, converter.save_snapshot(self.path))
+
+        restored = CumulativeToDeltaConverter()
+        self.assertEqual(2, restored.restore_snapshot(self.path))
+        self.assertEqual(2, len(restored))
+        self.assertEqual("bytes,host=a count,delta=50",
+                         self.serializer.serialize(
+                             restored.convert("bytes", 150, {"host": "a"})))
+        self.assertEqual("seconds count,delta=1",
+                         self.serializer.serialize(
+                             restored.convert("seconds", 2.5)))
+
+    def write_corrupted(self, corrupt) -> None:
+        recorder = ThreadLocalRecorder()
+        self.record(recorder)
+        recorder.save_snapshot(self.path)
+        with open(self.path, "rb") as f:
+            data = bytearray(f.read())
+        with open(self.path, "wb") as f:
+            f.write(corrupt(data))
+
+    def assert_invalid(self, corrupt, message: str) -> None:
+        self.write_corrupted(corrupt)
+        with self.assertRaisesRegex(SnapshotError, message):
+            ThreadLocalRecorder().restore_snapshot(self.path)
+
+    def test_invalid_snapshots(self):
+        def flip_last_byte(data):
+            data[-1] ^= 0xff
+            return data
+
+        def set_version(data):
+            struct.pack_into("<H", data, 4, 99)
+            return data
+
+        self.assert_invalid(flip_last_byte, "checksum")
+        self.assert_invalid(lambda data: data[:-1], "truncated")
+        self.assert_invalid(lambda data: data[:10], "truncated")
+        self.assert_invalid(lambda data: b"", "truncated")
+        self.assert_invalid(lambda data: b"X" + data[1:], "Not a snapshot")
+        self.assert_invalid(set_version, "version 99")
+
+    def test_missing_file(self):
+        with self.assertRaises(OSError):
+            ThreadLocalRecorder().restore_snapshot(self.path)
@@ -0,0 +1,164 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import socket
+import threading
+from unittest import TestCase
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, \
+    StatsdListener
+
+
+class TestStatsdListener(TestCase):
+
+    def setUp(self) -> None:
+        self.payloads = []
+        self.listener = StatsdListener(
+            port=0,
+            serializer=DynatraceMetricsSerializer(
+                enrich_with_dynatrace_metadata=False),
+            export=self.payloads.append, flush_interval=3600).start()
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self) -> None:
+        self.listener.close()
+        self.sender.close()
+
+    def send(self, *packets: str) -> None:
+        for packet in packets:
+            self.sender.sendto(packet.encode("utf-8"), self.listener.address)
+
+    def lines(self, metric_count: int):
+        for _ in range(500):
+            if self.listener.snapshot()["metrics_received"] >= metric_count:
+                break
+            threading.Event().wait(0.01)
+        self.listener.flush()
+        return sorted(line for payload in self.payloads
+                      for line in payload.split("\n"))
+
+    def test_counters(self):
+        self.send("requests:1|c", "requests:2|c|#route:/items",
+                  "requests:1|c|@0.5|#route:/items",
+                  "bytes:1.5|c\nbytes:1|c")
+        self.assertEqual([
+            "bytes count,delta=2.5",
+            "requests count,delta=1",
+            "requests,route=/items count,delta=4",
+        ], self.lines(5))
+
+    def test_gauges(self):
+        self.send("queue:10|g", "queue:+5|g", "queue:-3|g",
+                  "load:0.5|g|#host:a")
+        self.assertEqual([
+            "load,host=a gauge,0.5",
+            "queue gauge,12",
+        ], self.lines(4))
+
+    def test_relative_gauges_across_flushes(self):
+        self.send("queue:10|g", "other:1|g")
+        self.assertEqual(["other gauge,1", "queue gauge,10"], self.lines(2))
+        self.payloads.clear()
+
+        # the last value is kept for relative updates, but only updated
+        # gauges are exported.
+        self.send("queue:+5|g")
+        self.assertEqual(["queue gauge,15"], self.lines(3))
+
+    def test_idle_gauges_expire(self):
+        now = [0.0]
+        listener = StatsdListener(
+            port=0,
+            serializer=DynatraceMetricsSerializer(
+                enrich_with_dynatrace_metadata=False),
+            export=self.payloads.append, flush_interval=3600,
+            gauge_timeout=60, clock=lambda: now[0]).start()
+        self.addCleanup(listener.close)
+        self.listener.close()
+        self.listener = listener
+
+        self.send("queue:10|g")
+        self.assertEqual(["queue gauge,10"], self.lines(1))
+        self.payloads.clear()
+
+        now[0] = 120.0
+        self.listener.flush()
+        self.send("queue:+5|g")
+        self.assertEqual(["queue gauge,5"], self.lines(2))
+
+    def test_timers(self):
+        self.send("duration:10|ms\nduration:30|ms\nduration:20|ms",
+                  "latency:2|h|@0.5", "latency:4.5|d|@0.5")
+        self.assertEqual([
+            "duration gauge,min=10,max=30,sum=60,count=3",
+            "latency gauge,min=2,max=4.5,sum=13,count=4",
+        ], self.lines(5))
+
+    def test_sets(self):
+        self.send("users:alice|s", "users:bob|s", "users:alice|s")
+        self.assertEqual(["users gauge,2"], self.lines(3))
+
+    def test_tags(self):
+        # the same series regardless of the order of the tags, tags without
+        # a value are ignored.
+        self.send("requests:1|c|#b:2,a:1", "requests:1|c|#a:1,b:2,flag",
+                  "requests:1|c|@1|#Invalid Key:x")
+        self.assertEqual([
+            "requests,b=2,a=1 count,delta=2",
+            "requests,invalid_key=x count,delta=1",
+        ], self.lines(3))
+
+    def test_invalid_lines(self):
+        self.send("no_type:1", "no_value|c", "bad:x|c", "bad:1|unknown",
+                  "bad:1|c|@2", "nan:nan|g", ":1|c", "valid:1|c")
+        self.assertEqual(["valid count,delta=1"], self.lines(8))
+        self.assertEqual(7, self.listener.snapshot()["metrics_invalid"])
+
+    def test_receives_during_export(self):
+        exporting = threading.Event()
+        release = threading.Event()
+
+        def slow_export(payload):
+            exporting.set()
+            release.wait(30)
+            self.payloads.append(payload)
+
+        listener = StatsdListener(
+            port=0,
+            serializer=DynatraceMetricsSerializer(
+                enrich_with_dynatrace_metadata=False),
+            export=slow_export, flush_interval=0.01).start()
+        self.listener.close()
+        self.listener = listener
+
+        self.send("requests:1|c")
+        self.assertTrue(exporting.wait(5))
+        # packets are received while the export is in flight.
+        self.send("requests:2|c")
+        try:
+            for _ in range(200):
+                if listener.snapshot()["metrics_received"] >= 2:
+                    break
+                threading.Event().wait(0.01)
+            self.assertEqual(2, listener.snapshot()["metrics_received"])
+        finally:
+            release.set()
+
+    def test_flushes_reset(self):
+        self.send("requests:1|c")
+        self.assertEqual(["requests count,delta=1"], self.lines(1))
+        self.payloads.clear()
+        self.assertEqual(0, self.listener.flush())
+        self.assertEqual([], self.payloads)
@@ -0,0 +1,118 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+from unittest import TestCase
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, MetricError, \
+    ThreadLocalRecorder
+
+
+class TestThreadLocalRecorder(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+
+    def setUp(self) -> None:
+        self.recorder = ThreadLocalRecorder()
+
+    def collect_lines(self):
+        return sorted(self.serializer.serialize(metric)
+                      for metric in self.recorder.collect())
+
+    def test_counters_and_summaries(self):
+        self.recorder.add("requests", 1, {"code": "200"})
+        self.recorder.add("requests", 2, {"code": "200"})
+        self.recorder.add("bytes", 1.5)
+        counter = self.recorder.counter("requests", {"code": "500"})
+        counter.add()
+        counter.add()
+        summary = self.recorder.summary("size")
+        for value in (3, 1, 2):
+            summary.record(value)
+        self.recorder.record("size", 10)
+
+        self.assertEqual([
+            "bytes count,delta=1.5",
+            "requests,code=200 count,delta=3",
+            "requests,code=500 count,delta=2",
+            "size gauge,min=1,max=10,sum=16,count=4",
+        ], self.collect_lines())
+        self.assertEqual([], self.recorder.collect())
+
+    def test_series_are_normalized(self):
+        self.recorder.add("Requests~", 1, {"Code": "200"})
+        self.recorder.counter("Requests~", {"code": "200"}).add(1)
+        self.assertEqual(["Requests_,code=200 count,delta=2"],
+                         self.collect_lines())
+
+    def test_oversized_metric_names(self):
+        # names that only differ after the maximum length are one series.
+        self.recorder.add("m" * 100_000 + "a", 1)
+        self.recorder.add("m" * 100_000 + "b", 1)
+        self.assertEqual(["m" * 250 + " count,delta=2"],
+                         self.collect_lines())
+
+    def test_threads(self):
+        counter = self.recorder.counter("ops")
+        summary = self.recorder.summary("latency")
+        recorded = threading.Barrier(9)
+        collected = threading.Event()
+
+        def run(offset):
+            for i in range(1000):
+                counter.add()
+                summary.record(offset + i)
+            recorded.wait()
+            collected.wait()
+
+        threads = [threading.Thread(target=run, args=(i * 1000,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        recorded.wait()
+
+        # all threads are still alive and keep their tables.
+        self.assertEqual([
+            "latency gauge,min=0,max=7999,sum=31996000,count=8000",
+            "ops count,delta=8000",
+        ], self.collect_lines())
+
+        collected.set()
+        for thread in threads:
+            thread.join()
+        counter.add(5)
+        self.assertEqual(["ops count,delta=5"], self.collect_lines())
+
+    def test_exited_threads_are_collected_once(self):
+        thread = threading.Thread(
+            target=lambda: self.recorder.add("ops", 1))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(["ops count,delta=1"], self.collect_lines())
+        self.assertEqual([], self.collect_lines())
+
+    def test_invalid(self):
+        with self.assertRaises(MetricError):
+            self.recorder.add("ops", float("nan"))
+        with self.assertRaises(MetricError):
+            self.recorder.summary("latency").record(float("inf"))
+        with self.assertRaises(MetricError):
+            self.recorder.counter("")
+        with self.assertRaises(MetricError):
+            self.recorder.add(None, 1)
+        self.assertEqual([], self.recorder.collect())
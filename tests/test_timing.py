@@ -0,0 +1,181 @@
+#  Copyright 2021 Dynatrace LLC
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import threading
+from unittest import TestCase, mock
+
+from dynatrace.metric.utils import DynatraceMetricsSerializer, MetricError, \
+    TimingRegistry, timed
+
+
+class FakePerfCounter:
+    def __init__(self, step_ns):
+        self.now = 0
+        self.step_ns = step_ns
+
+    def __call__(self):
+        self.now += self.step_ns
+        return self.now
+
+
+class TestTiming(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.serializer = DynatraceMetricsSerializer(
+            enrich_with_dynatrace_metadata=False)
+
+    def setUp(self) -> None:
+        self.registry = TimingRegistry()
+
+    def collect_lines(self):
+        return sorted(self.serializer.serialize(metric)
+                      for metric in self.registry.collect())
+
+    def test_decorator(self):
+        @timed("Func~Duration", {"Dim": "val"}, registry=self.registry)
+        def func(value):
+            """Documentation."""
+            return value * 2
+
+        with mock.patch("time.perf_counter_ns", FakePerfCounter(1_500_000)):
+            # the decorator binds perf_counter_ns when it is applied.
+            @timed("other", registry=self.registry)
+            def other():
+                pass
+
+            other()
+            other()
+
+        self.assertEqual(4, func(2))
+        self.assertEqual("func", func.__name__)
+        self.assertEqual("Documentation.", func.__doc__)
+
+        lines = self.collect_lines()
+        self.assertTrue(lines[0].startswith(
+            "Func_Duration,dim=val gauge,min="))
+        self.assertTrue(lines[0].endswith(",count=1"))
+        self.assertEqual(
+            "other gauge,min=1.5,max=1.5,sum=3,count=2", lines[1])
+        self.assertEqual([], self.registry.collect())
+
+    def test_decorator_records_exceptions(self):
+        @timed("failing", registry=self.registry)
+        def failing():
+            raise KeyError()
+
+        with self.assertRaises(KeyError):
+            failing()
+        self.assertEqual(1, len(self.registry.collect()))
+
+    def test_context_manager(self):
+        timer = timed("block", registry=self.registry)
+        with mock.patch("time.perf_counter_ns", FakePerfCounter(1_000_000)):
+            with timer:
+                # nested use of the same instance.
+                with timer:
+                    pass
+
+        self.assertEqual(["block gauge,min=1,max=3,sum=4,count=2"],
+                         self.collect_lines())
+
+    def test_threads(self):
+        timer = self.registry.timed("work")
+
+        @timer
+        def work():
+            pass
+
+        def run():
+            for _ in range(1000):
+                work()
+                with timer:
+                    pass
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # the timings of exited threads are collected once.
+        lines = self.collect_lines()
+        self.assertEqual(1, len(lines))
+        self.assertTrue(lines[0].endswith(",count=16000"))
+        self.assertEqual([], self.registry.collect())
+
+    def test_coroutine_function(self):
+        perf_counter = FakePerfCounter(0)
+
+        with mock.patch("time.perf_counter_ns", perf_counter):
+            @timed("coroutine", registry=self.registry)
+            async def coroutine(value):
+                await asyncio.sleep(0)
+                perf_counter.now += 2_000_000
+                return value * 2
+
+            self.assertTrue(asyncio.iscoroutinefunction(coroutine))
+            self.assertEqual(4, asyncio.run(coroutine(2)))
+
+        # the awaited body is timed, not only creating the coroutine.
+        self.assertEqual(["coroutine gauge,min=2,max=2,sum=2,count=1"],
+                         self.collect_lines())
+
+    def test_interleaved_tasks(self):
+        perf_counter = FakePerfCounter(0)
+
+        async def first(entered, other_entered, exited):
+            with timed("first", registry=self.registry):
+                entered.set()
+                await other_entered.wait()
+                perf_counter.now = 3_000_000
+            exited.set()
+
+        async def second(other_entered, entered, other_exited):
+            await other_entered.wait()
+            perf_counter.now = 1_000_000
+            with timed("second", registry=self.registry):
+                entered.set()
+                await other_exited.wait()
+                perf_counter.now = 5_000_000
+
+        async def main():
+            events = asyncio.Event(), asyncio.Event(), asyncio.Event()
+            await asyncio.gather(first(*events), second(*events))
+
+        # the first task exits before the second one, which entered later.
+        with mock.patch("time.perf_counter_ns", perf_counter):
+            asyncio.run(main())
+
+        self.assertEqual([
+            "first gauge,min=3,max=3,sum=3,count=1",
+            "second gauge,min=4,max=4,sum=4,count=1",
+        ], self.collect_lines())
+
+    def test_default_registry(self):
+        self.assertIs(TimingRegistry.get_default(),
+                      TimingRegistry.get_default())
+
+        with timed("default.registry.test"):
+            pass
+        self.assertIn("default.registry.test", [
+            metric.get_metric_name()
+            for metric in TimingRegistry.get_default().collect()])
+
+    def test_invalid_name(self):
+        with self.assertRaises(MetricError):
+            timed("", registry=self.registry)
+        with self.assertRaises(MetricError):
+            timed("name", {"dim": 1}, registry=self.registry)